@@ -0,0 +1,185 @@
+"""gzip compression of responses
+
+WSGI middleware compressing text responses with zlib for clients that
+accept gzip. waitress sends whatever the app returns as is, so rendered
+lists, procedures and tables used to go over the wire uncompressed.
+
+* responses smaller than `MIN_SIZE` are sent as they are, compressing
+  them costs more than it saves
+* only text like content types are compressed, object store packs and
+  anything already encoded are left alone
+* event streams and responses marked `Cache-Control: no-transform` are
+  passed through untouched. Their chunks have to reach the client as
+  soon as they are produced, which holding back the start of the body
+  and flushing every `FLUSH_SIZE` bytes would prevent.
+* streamed responses stay streamed. Their output is compressed as it is
+  produced and flushed every `FLUSH_SIZE` bytes so template streams
+  yielding many tiny pieces do not cost a flush each.
+"""
+
+import itertools
+import zlib
+
+from werkzeug.wsgi import ClosingIterator
+
+MIN_SIZE = 1024
+
+# Input collected between flushes of a streamed response
+FLUSH_SIZE = 16 * 1024
+
+COMPRESS_LEVEL = 6
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Text whose every chunk has to be sent as soon as it is produced
+UNBUFFERED_TYPES = ("text/event-stream",)
+
+
+def quality(params):
+    """q-value of an Accept-Encoding entry, malformed values count as 0"""
+    for param in params.split(";"):
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "q":
+            try:
+                q = float(value.strip())
+            except ValueError:
+                return 0.0
+            return q if 0 <= q <= 1 else 0.0
+    return 1.0
+
+
+def accepts_gzip(environ):
+    """True if the client accepts gzip, an explicit `gzip` overriding `*`"""
+    qualities = {}
+    for coding in environ.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        name, _, params = coding.partition(";")
+        qualities[name.strip().lower()] = quality(params)
+
+    q = qualities.get("gzip", qualities.get("*", 0.0))
+    return q > 0
+
+
+def header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def is_compressible(status, headers):
+    if int(status.split(" ", 1)[0]) in (204, 206, 304):
+        return False
+    if header(headers, "Content-Encoding") is not None:
+        return False
+    if "no-transform" in (header(headers, "Cache-Control") or ""):
+        return False
+    content_type = header(headers, "Content-Type") or ""
+    if content_type.startswith(UNBUFFERED_TYPES):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compressed_headers(headers):
+    """Headers of a response once gzip encoded"""
+    result = []
+    for key, value in headers:
+        name = key.lower()
+        if name == "content-length":
+            continue
+        if name == "etag" and not value.startswith("W/"):
+            # the encoded body is no longer byte for byte the tagged one
+            value = f"W/{value}"
+        if name == "vary":
+            continue
+        result.append((key, value))
+
+    vary = header(headers, "Vary")
+    if vary and "accept-encoding" not in vary.lower():
+        vary = f"{vary}, Accept-Encoding"
+    result.append(("Vary", vary or "Accept-Encoding"))
+    result.append(("Content-Encoding", "gzip"))
+    return result
+
+
+class GzipMiddleware:
+    def __init__(self, app, min_size=MIN_SIZE, level=COMPRESS_LEVEL):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    def __call__(self, environ, start_response):
+        if environ.get("REQUEST_METHOD") == "HEAD" or not accepts_gzip(environ):
+            return self.app(environ, start_response)
+
+        response = []
+        head = []
+
+        def capture(status, headers, exc_info=None):
+            if exc_info is not None and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response[:] = [status, headers]
+            # the write() callable of legacy apps, written before the body
+            return head.append
+
+        body = self.app(environ, capture)
+        chunks = iter(body)
+        try:
+            if not response:
+                # started when the body is first iterated
+                head.extend(itertools.islice(chunks, 1))
+            status, headers = response
+            if not is_compressible(status, headers):
+                start_response(status, headers)
+                return ClosingIterator(itertools.chain(head, chunks), close(body))
+
+            # without a length, read until the body is known to be big enough
+            length = header(headers, "Content-Length")
+            if length is None:
+                size = sum(len(chunk) for chunk in head)
+                for chunk in chunks:
+                    head.append(chunk)
+                    size += len(chunk)
+                    if size >= self.min_size:
+                        break
+            else:
+                size = int(length)
+
+            if size < self.min_size:
+                start_response(status, headers)
+                return ClosingIterator(itertools.chain(head, chunks), close(body))
+
+            start_response(status, compressed_headers(headers))
+            return ClosingIterator(self.compress(head, chunks), close(body))
+        except BaseException:
+            close(body)()
+            raise
+
+    def compress(self, head, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        data = compressor.compress(b"".join(head))
+        pending = sum(len(chunk) for chunk in head)
+        for chunk in chunks:
+            data += compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= FLUSH_SIZE:
+                data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                pending = 0
+            if data:
+                yield data
+                data = b""
+        yield data + compressor.flush()
+
+
+def close(body):
+    """Callback closing the app's response, as WSGI requires"""
+    return getattr(body, "close", lambda: None)
+
+
+__all__ = ["GzipMiddleware", "MIN_SIZE"]
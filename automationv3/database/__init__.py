@@ -1,4 +1,5 @@
-from .db import get_db, db
+from .db import get_db, close_db, add_server_timing, db
 from .base import ModelBase
+from .pool import ConnectionPool
 
-__all__ = [get_db, db, ModelBase]
+__all__ = [get_db, close_db, add_server_timing, db, ModelBase, ConnectionPool]
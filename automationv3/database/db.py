@@ -46,9 +46,40 @@ db = DatabaseHelper()
 
 
 def get_db():
+    """The request's sqlite connection
+
+    Borrowed from the app's `DB_POOL` when one is configured and handed
+    back by `close_db` at the end of the request.
+    """
     if g:
         if "sqlite_db" not in g:
-            g.sqlite_db = sqlite3.connect(db.get_connection_str())
+            pool = current_app.config.get("DB_POOL")
+            if pool is not None:
+                g.sqlite_db, g.db_acquire_time = pool.acquire()
+            else:
+                g.sqlite_db = sqlite3.connect(db.get_connection_str())
         return g.sqlite_db
     else:
         return sqlite3.connect(db.get_connection_str())
+
+
+def close_db():
+    """Returns the request's connection to the pool, or closes it"""
+    conn = g.pop("sqlite_db", None)
+    if conn is None:
+        return
+
+    pool = current_app.config.get("DB_POOL")
+    if pool is not None:
+        pool.release(conn)
+    else:
+        conn.close()
+
+
+def add_server_timing(response):
+    """Reports the time spent waiting for a pooled connection"""
+    if "db_acquire_time" in g:
+        response.headers.add(
+            "Server-Timing", f"db-acquire;dur={g.db_acquire_time * 1000:.2f}"
+        )
+    return response
@@ -0,0 +1,32 @@
+"""Add worker capacity
+
+Revision ID: 3f0c9a7d2b61
+Revises: cdb419136752
+Create Date: 2026-10-19 09:12:41.208314
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3f0c9a7d2b61"
+down_revision = "cdb419136752"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("Worker") as batch_op:
+        batch_op.add_column(
+            sa.Column("capacity", sa.Integer(), nullable=False, server_default="1")
+        )
+        batch_op.add_column(
+            sa.Column("free_slots", sa.Integer(), nullable=False, server_default="1")
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("Worker") as batch_op:
+        batch_op.drop_column("free_slots")
+        batch_op.drop_column("capacity")
@@ -0,0 +1,55 @@
+"""Add requirement search
+
+Revision ID: 5b7e2f0a8c14
+Revises: e3b1a6c4d9f2
+Create Date: 2026-10-19 15:41:08.277630
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b7e2f0a8c14"
+down_revision = "e3b1a6c4d9f2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_Requirement_subsystem_id", "Requirement", ["subsystem", "id"])
+
+    op.execute("""
+        CREATE VIRTUAL TABLE requirement_fts
+        USING fts5(id, text, content='Requirement', content_rowid='rowid')
+        """)
+    op.execute("""
+        CREATE TRIGGER requirement_fts_insert AFTER INSERT ON "Requirement" BEGIN
+            INSERT INTO requirement_fts(rowid, id, text)
+            VALUES (new.rowid, new.id, new.text);
+        END
+        """)
+    op.execute("""
+        CREATE TRIGGER requirement_fts_delete AFTER DELETE ON "Requirement" BEGIN
+            INSERT INTO requirement_fts(requirement_fts, rowid, id, text)
+            VALUES ('delete', old.rowid, old.id, old.text);
+        END
+        """)
+    op.execute("""
+        CREATE TRIGGER requirement_fts_update AFTER UPDATE OF id, text
+        ON "Requirement" BEGIN
+            INSERT INTO requirement_fts(requirement_fts, rowid, id, text)
+            VALUES ('delete', old.rowid, old.id, old.text);
+            INSERT INTO requirement_fts(rowid, id, text)
+            VALUES (new.rowid, new.id, new.text);
+        END
+        """)
+    # index the requirements already there
+    op.execute("INSERT INTO requirement_fts(requirement_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER requirement_fts_update")
+    op.execute("DROP TRIGGER requirement_fts_delete")
+    op.execute("DROP TRIGGER requirement_fts_insert")
+    op.execute("DROP TABLE requirement_fts")
+    op.drop_index("ix_Requirement_subsystem_id", table_name="Requirement")
@@ -0,0 +1,30 @@
+"""Add queue leases
+
+Revision ID: 8a41d6e0c5f2
+Revises: 3f0c9a7d2b61
+Create Date: 2026-10-19 10:03:17.554120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8a41d6e0c5f2"
+down_revision = "3f0c9a7d2b61"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("Queue") as batch_op:
+        batch_op.add_column(sa.Column("worker", sa.String(), nullable=True))
+        batch_op.add_column(sa.Column("heartbeat_time", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("result", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("Queue") as batch_op:
+        batch_op.drop_column("result")
+        batch_op.drop_column("heartbeat_time")
+        batch_op.drop_column("worker")
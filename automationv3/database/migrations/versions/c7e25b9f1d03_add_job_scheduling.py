@@ -0,0 +1,34 @@
+"""Add job scheduling
+
+Revision ID: c7e25b9f1d03
+Revises: 8a41d6e0c5f2
+Create Date: 2026-10-19 11:26:52.140937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c7e25b9f1d03"
+down_revision = "8a41d6e0c5f2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("Worker") as batch_op:
+        batch_op.add_column(sa.Column("capabilities", sa.Text(), nullable=True))
+
+    with op.batch_alter_table("Queue") as batch_op:
+        batch_op.add_column(sa.Column("requires", sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column("tree", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("Queue") as batch_op:
+        batch_op.drop_column("tree")
+        batch_op.drop_column("requires")
+
+    with op.batch_alter_table("Worker") as batch_op:
+        batch_op.drop_column("capabilities")
@@ -0,0 +1,28 @@
+"""Add requirement version
+
+Revision ID: e3b1a6c4d9f2
+Revises: c7e25b9f1d03
+Create Date: 2026-10-19 14:03:27.519204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e3b1a6c4d9f2"
+down_revision = "c7e25b9f1d03"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("Requirement") as batch_op:
+        batch_op.add_column(
+            sa.Column("version", sa.BigInteger(), nullable=False, server_default="0")
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("Requirement") as batch_op:
+        batch_op.drop_column("version")
@@ -0,0 +1,163 @@
+"""Pool of raw sqlite3 connections
+
+Opening a connection is cheap but everything that comes with it is not:
+the pragmas, sqlite's page cache and the compiled statement cache all
+start out empty. Requests borrow a connection from the pool instead and
+give it back when they finish.
+
+Connections have thread affinity. A thread gets back the connection it
+used last when it is idle, so with waitress' fixed set of threads every
+thread ends up with a warm connection of its own. The pool never opens
+more than `size` connections, a thread that finds them all borrowed
+waits for one to be released.
+
+A released connection is reset: an unfinished transaction is rolled
+back and settings changed by the borrower (isolation level, row
+factory) are restored.
+"""
+
+import sqlite3
+import threading
+import time
+
+# Applied to every connection, raw or SQLAlchemy, on the database file
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64_000,
+}
+
+# Matches waitress' thread count
+DEFAULT_SIZE = 8
+
+# Compiled statements kept per connection
+CACHED_STATEMENTS = 256
+
+# Seconds a connection waits on a locked database
+BUSY_TIMEOUT = 5.0
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def configure_connection(conn, pragmas=PRAGMAS):
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        path,
+        size=DEFAULT_SIZE,
+        cached_statements=CACHED_STATEMENTS,
+        pragmas=PRAGMAS,
+        busy_timeout=BUSY_TIMEOUT,
+    ):
+        self.path = str(path)
+        self.size = size
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+        self.busy_timeout = busy_timeout
+
+        self.condition = threading.Condition()
+        # (thread that used it last, connection), least recently released first
+        self.idle = []
+        self.opened = 0
+        self.closed = False
+
+        # totals since the pool was created
+        self.acquired = 0
+        self.waited = 0.0
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        configure_connection(conn, self.pragmas)
+        return conn
+
+    def acquire(self, timeout=None):
+        """Borrows a connection. Returns (connection, seconds waited)"""
+        start = time.perf_counter()
+        thread = threading.get_ident()
+        with self.condition:
+            while True:
+                if self.idle:
+                    owners = [owner for owner, _ in self.idle]
+                    index = owners.index(thread) if thread in owners else 0
+                    _, conn = self.idle.pop(index)
+                    break
+                if self.opened < self.size:
+                    self.opened += 1
+                    conn = None
+                    break
+
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (time.perf_counter() - start)
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No connection to {self.path} available")
+                self.condition.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self.condition:
+                    self.opened -= 1
+                    self.condition.notify()
+                raise
+
+        waited = time.perf_counter() - start
+        with self.condition:
+            self.acquired += 1
+            self.waited += waited
+        return conn, waited
+
+    def release(self, conn):
+        """Resets a borrowed connection and returns it to the pool"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.isolation_level = ""
+            conn.row_factory = None
+            reusable = not self.closed
+        except sqlite3.Error:
+            # unusable, make room for a new one
+            reusable = False
+
+        with self.condition:
+            if reusable:
+                self.idle.append((threading.get_ident(), conn))
+            else:
+                conn.close()
+                self.opened -= 1
+            self.condition.notify()
+
+    def close(self):
+        """Closes idle connections, borrowed ones are closed on release"""
+        with self.condition:
+            self.closed = True
+            for _, conn in self.idle:
+                conn.close()
+            self.opened -= len(self.idle)
+            self.idle.clear()
+
+    def stats(self):
+        with self.condition:
+            return {
+                "size": self.size,
+                "opened": self.opened,
+                "idle": len(self.idle),
+                "acquired": self.acquired,
+                "waited": self.waited,
+            }
+
+
+__all__ = ["ConnectionPool", "PoolTimeout", "configure_connection", "PRAGMAS"]
@@ -1,9 +1,10 @@
 from flask import Flask, g, redirect, url_for
 import mimetypes
 
+from ..database import close_db, add_server_timing
 from ..jobqueue import jobqueue
 from ..requirements.views import requirements
-from .views import editor, workspace, commitlog
+from .views import editor, workspace, commitlog, coverage
 from .workspace import get_workspaces
 
 
@@ -17,6 +18,7 @@ app.register_blueprint(workspace, url_prefix="/workspace")
 app.register_blueprint(editor, url_prefix="/editor")
 app.register_blueprint(jobqueue, url_prefix="/runner")
 app.register_blueprint(commitlog, url_prefix="/commitlog")
+app.register_blueprint(coverage, url_prefix="/coverage")
 
 
 @app.route("/")
@@ -32,12 +34,14 @@ def serve_static(filename):
     return app.send_static_file(filename)
 
 
+app.after_request(add_server_timing)
+
+
 # cleanup database connection
 @app.teardown_appcontext
-def close_db(error):
-    """Closes the database again at the end of the request."""
-    if hasattr(g, "sqlite_db"):
-        g.sqlite_db.close()
+def teardown_db(error):
+    """Releases the database again at the end of the request."""
+    close_db()
 
     if hasattr(g, "session"):
         g.session.close()
@@ -6,7 +6,12 @@ Usage:
     automation-v3 server [--port PORT] [--dbpath PATH]
                          [--workspace-path PATH] [--debug]
     automation-v3 worker [--port PORT] [--dbpath PATH]
-                         [--central-server URL] [--debug]
+                         [--central-server URL] [--slots N]
+                         [--pool TYPE] [--tags LIST]
+                         [--simulators LIST] [--tree-cache PATH]
+                         [--tree-cache-size MB] [--debug]
+    automation-v3 import-requirements <file> [--dbpath PATH]
+                         [--format FORMAT] [--dry-run]
     automation-v3 (-h | --help)
 
 Options:
@@ -16,7 +21,21 @@ Options:
                            [default: ./automationv3.db]
     --workspace-path=PATH  path to git repo [default: ./]
     --central-server=URL   url to central server
+    --slots=N              number of jobs a worker runs concurrently
+                           [default: 0] (0 = one per cpu)
+    --pool=TYPE            worker executor type, thread or process
+                           [default: thread]
+    --tags=LIST            comma separated tags the worker advertises
+    --simulators=LIST      comma separated simulator stand-ins available
+                           on the worker
+    --tree-cache=PATH      directory the worker caches test filesystem
+                           trees in [default: ./tree-cache]
+    --tree-cache-size=MB   size bound of the tree cache [default: 2048]
     --debug                enables autoload [default: false]
+    --format=FORMAT        requirements file format, csv, edn or text
+                           (default: by file suffix)
+    --dry-run              report what an import would change without
+                           writing it
 
 """
 __version__ = "3.0.0"
@@ -36,6 +55,7 @@ __banner__ = (
 )
 
 import os
+import socket
 import sqlite3
 from pathlib import Path
 from contextlib import closing
@@ -43,9 +63,16 @@ from contextlib import closing
 from docopt import docopt
 from schema import Schema, And, Or, Use, SchemaError
 from waitress import serve
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
+from ..compression import GzipMiddleware
+from ..database.pool import ConnectionPool, configure_connection
+
+# Waitress threads serving ordinary requests. The editor server adds one
+# per event stream it allows (see `views.workspace.MAX_EVENT_STREAMS`).
+REQUEST_THREADS = 8
+
 
 def main():
     args = docopt(__doc__, version=__version__)
@@ -63,8 +90,32 @@ def main():
                 os.path.exists, error="--workspace-path=PATH should exists"
             ),
             "--central-server": Or(str, None),
+            "--slots": And(
+                Use(int), lambda n: n >= 0, error="--slots=N should be integer >= 0"
+            ),
+            "--pool": And(
+                str,
+                lambda p: p in ("thread", "process"),
+                error="--pool=TYPE should be thread or process",
+            ),
+            "--tags": Or(None, Use(lambda t: [x.strip() for x in t.split(",")])),
+            "--simulators": Or(
+                None, Use(lambda t: [x.strip() for x in t.split(",")])
+            ),
+            "--tree-cache": str,
+            "--tree-cache-size": And(
+                Use(int), lambda n: n > 0, error="--tree-cache-size=MB should be > 0"
+            ),
+            "<file>": Or(None, And(os.path.exists, error="<file> should exist")),
+            "--format": Or(
+                None,
+                lambda f: f in ("csv", "edn", "text"),
+                error="--format=FORMAT should be csv, edn or text",
+            ),
             "server": bool,
             "worker": bool,
+            "import-requirements": bool,
+            "--dry-run": bool,
             "--debug": bool,
             "--help": bool,
         }
@@ -79,30 +130,86 @@ def main():
 
     if args["server"]:
         start_server(args)
+    elif args["import-requirements"]:
+        start_import(args)
     else:
         start_worker(args)
 
 
 def setup_db_config(app, args):
     engine = create_engine(f"sqlite:///{app.config['DB_PATH']}")
+    # same pragmas as the raw sqlite connections
+    event.listen(engine, "connect", lambda conn, record: configure_connection(conn))
     app.config["DB_ENGINE"] = engine
     app.config["DB_SESSION_MAKER"] = sessionmaker(engine)
 
+    # One connection per request thread, event streams hold none
+    app.config["DB_POOL"] = ConnectionPool(
+        app.config["DB_PATH"], size=REQUEST_THREADS
+    )
+
     # Create DB and enable WAL
     with closing(sqlite3.connect(app.config["DB_PATH"])) as conn:
-        conn.execute("PRAGMA journal_mode=WAL")
+        configure_connection(conn)
+
+
+def start_import(args):
+    from ..requirements.importer import ImportFileError, import_file
+
+    def progress(stats):
+        print(f"\r   {stats}", end="", flush=True)
+
+    # connecting would create an empty database the import then fails on
+    dbpath = Path(args["--dbpath"])
+    if not dbpath.exists():
+        exit(f"{dbpath} does not exist, create it with `alembic upgrade head`")
+
+    with closing(sqlite3.connect(dbpath)) as conn:
+        configure_connection(conn)
+        try:
+            stats = import_file(
+                conn,
+                args["<file>"],
+                format=args["--format"],
+                dry_run=args["--dry-run"],
+                progress=progress,
+            )
+        except ImportFileError as e:
+            exit(f"\n{e}")
+    print()
+
+    for line, message in stats.errors:
+        print(f"   line {line}: {message}")
+    if args["--dry-run"]:
+        print("   Dry run, nothing written")
 
 
 def start_worker(args):
-    from ..jobqueue.worker import app, register_worker
+    from ..jobqueue.worker import (
+        app,
+        register_worker,
+        init_pool,
+        init_tree_cache,
+        start_puller,
+    )
 
     app.config["DB_PATH"] = Path(args["--dbpath"]).resolve()
     app.config["CENTRAL_SERVER_URL"] = args["--central-server"]
     app.config["WORKER_URL"] = f"http://{args['--central-server']}/runner/workers"
+    app.config["JOBS_URL"] = f"http://{args['--central-server']}/runner/jobs"
+    app.config["OBJECTS_URL"] = f"http://{args['--central-server']}/runner/objects"
+    app.config["SELF_URL"] = f"http://{socket.gethostname()}:{args['--port']}"
+    app.config["TAGS"] = args["--tags"] or []
+    app.config["SIMULATORS"] = args["--simulators"] or []
 
     setup_db_config(app, args)
 
+    tree_cache = init_tree_cache(
+        Path(args["--tree-cache"]).resolve(), args["--tree-cache-size"] * 1024**2
+    )
+    init_pool(args["--slots"] or None, args["--pool"], tree_cache)
     register_worker()
+    start_puller()
     if args["--debug"]:
         app.run(port=args["--port"], debug=True)
     else:
@@ -113,18 +220,26 @@ def start_worker(args):
 def start_server(args):
     from . import app
     from .workspace import Workspace
+    from .gitlog import CommitCache
+    from .coverage import Coverage
+    from .views.workspace import MAX_EVENT_STREAMS
 
     app.config["DB_PATH"] = Path(args["--dbpath"]).resolve()
     app.config["WORKSPACE_PATH"] = Path(args["--workspace-path"]).resolve()
+    app.config["WATCH_WORKSPACES"] = True
+    app.config["BUFFER_DRAFTS"] = True
 
     setup_db_config(app, args)
+    app.wsgi_app = GzipMiddleware(app.wsgi_app)
 
     # Initialize/Create DBs
     with closing(sqlite3.connect(app.config["DB_PATH"])) as conn:
         Workspace.ensure_db(conn)
+        CommitCache.ensure_db(conn)
+        Coverage.ensure_db(conn)
 
     if args["--debug"]:
         app.run(port=args["--port"], debug=True)
     else:
         print(f'   Server started: http://localhost:{args["--port"]}/')
-        serve(app, port=args["--port"], threads=8)
+        serve(app, port=args["--port"], threads=REQUEST_THREADS + MAX_EVENT_STREAMS)
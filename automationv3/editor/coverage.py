@@ -0,0 +1,390 @@
+"""Requirement coverage of workspace procedures
+
+Every procedure (`.rvt` file) of a workspace references the requirements
+it covers with `:req:` roles. The references are extracted the way the
+procedure's fields are (`rst.TestCaseTranslator`) and stored as a sparse
+requirement x procedure matrix, one row per reference, so reports are
+plain queries joined with the `Requirement` table.
+
+Procedures are only parsed again when they changed. A refresh stats the
+workspace and re-reads files whose size or mtime differ from the stored
+ones, and only extracts references if the content hash differs too.
+Deleted procedures drop their references.
+
+Watched workspaces are walked by their first refresh only. Later ones
+stat just the paths the workspace's watcher reported changed since.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from ..database import get_db
+from ..framework.edn import ReadError
+from ..framework.testcase import EdnTestCase
+from .watcher import IGNORED, get_watcher
+
+PROCEDURE_SUFFIX = ".rvt"
+
+# Procedures referencing a requirement before it counts as over-covered
+OVER_COVERED = 5
+
+
+def table_exists(conn, table_name):
+    cursor = conn.execute(
+        """
+        SELECT name
+        FROM sqlite_master
+        WHERE type='table' AND name= ?
+    """,
+        (table_name,),
+    )
+    return len(cursor.fetchall()) != 0
+
+
+def requirement_ids(text):
+    """Ids of the requirements a procedure references"""
+    testcase = EdnTestCase(None, text)
+    try:
+        # read strictly first, the rendering behind `requirements` skips
+        # text it can not read
+        testcase.spans
+        requirements = testcase.requirements
+    except ReadError:
+        # not a procedure after all, it covers nothing
+        return []
+    return sorted({requirement.id for requirement in requirements})
+
+
+class Coverage:
+    @staticmethod
+    def ensure_db(conn):
+        if not table_exists(conn, "coverage_procedures"):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS coverage_procedures(
+                    workspace TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    sha1 TEXT NOT NULL,
+                    PRIMARY KEY (workspace, path)
+                )
+            """)
+            conn.commit()
+        if not table_exists(conn, "coverage_references"):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS coverage_references(
+                    workspace TEXT NOT NULL,
+                    requirement_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    PRIMARY KEY (workspace, requirement_id, path)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE INDEX coverage_references_path
+                ON coverage_references(workspace, path)
+            """)
+            conn.commit()
+
+    def __init__(self, conn, workspace, root):
+        self.conn = conn
+        self.workspace = workspace
+        self.root = Path(root)
+
+    def procedures_on_disk(self, top=""):
+        """(size, mtime_ns) of every procedure, by path relative to the root
+
+        Only procedures at or below `top`, a path relative to the root.
+        """
+        procedures = {}
+        if (self.root / top).is_file():
+            try:
+                st = (self.root / top).stat()
+            except FileNotFoundError:
+                return procedures
+            if top.endswith(PROCEDURE_SUFFIX):
+                procedures[top] = (st.st_size, st.st_mtime_ns)
+            return procedures
+
+        for dirpath, dirnames, filenames in os.walk(self.root / top):
+            dirnames[:] = [name for name in dirnames if name not in IGNORED]
+            for name in filenames:
+                if not name.endswith(PROCEDURE_SUFFIX):
+                    continue
+                path = Path(dirpath) / name
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue
+                rel = path.relative_to(self.root).as_posix()
+                procedures[rel] = (st.st_size, st.st_mtime_ns)
+        return procedures
+
+    def stored_procedures(self):
+        cursor = self.conn.execute(
+            """
+            SELECT path, size, mtime_ns, sha1
+            FROM coverage_procedures
+            WHERE workspace = ?
+        """,
+            (self.workspace,),
+        )
+        return {path: (size, mtime_ns, sha1) for path, size, mtime_ns, sha1 in cursor}
+
+    def refresh(self, paths=None):
+        """Updates the references of procedures changed since the last refresh
+
+        Walks the whole workspace, or only the files and directories in
+        `paths` (relative to the root). Returns the number of procedures
+        parsed.
+        """
+        stored = self.stored_procedures()
+        if paths is None:
+            on_disk = self.procedures_on_disk()
+        else:
+            on_disk = {}
+            for path in paths:
+                on_disk.update(self.procedures_on_disk(path))
+            stored = {
+                path: procedure
+                for path, procedure in stored.items()
+                if any(path == top or path.startswith(top + "/") for top in paths)
+            }
+
+        procedures = []
+        references = {}
+        for path, (size, mtime_ns) in on_disk.items():
+            if path in stored and stored[path][:2] == (size, mtime_ns):
+                continue
+            try:
+                content = (self.root / path).read_bytes()
+            except FileNotFoundError:
+                continue
+
+            sha1 = hashlib.sha1(content).hexdigest()
+            procedures.append((self.workspace, path, size, mtime_ns, sha1))
+            # touched but not changed
+            if path in stored and stored[path][2] == sha1:
+                continue
+            text = content.decode("utf-8", errors="replace")
+            references[path] = requirement_ids(text)
+
+        removed = [path for path in stored if path not in on_disk]
+        if not procedures and not removed:
+            return 0
+
+        with self.conn:
+            self.conn.executemany(
+                """
+                DELETE FROM coverage_references
+                WHERE workspace = ? AND path = ?
+            """,
+                [(self.workspace, path) for path in removed + list(references)],
+            )
+            self.conn.executemany(
+                """
+                DELETE FROM coverage_procedures
+                WHERE workspace = ? AND path = ?
+            """,
+                [(self.workspace, path) for path in removed],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO coverage_procedures VALUES (?, ?, ?, ?, ?)",
+                procedures,
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO coverage_references VALUES (?, ?, ?)",
+                [
+                    (self.workspace, id, path)
+                    for path, ids in references.items()
+                    for id in ids
+                ],
+            )
+        return len(references)
+
+    def matrix(self):
+        """Paths of the procedures covering each referenced requirement"""
+        cursor = self.conn.execute(
+            """
+            SELECT requirement_id, path
+            FROM coverage_references
+            WHERE workspace = ?
+            ORDER BY requirement_id, path
+        """,
+            (self.workspace,),
+        )
+        matrix = {}
+        for id, path in cursor:
+            matrix.setdefault(id, []).append(path)
+        return matrix
+
+    def procedures_for(self, requirement_id):
+        cursor = self.conn.execute(
+            """
+            SELECT path
+            FROM coverage_references
+            WHERE workspace = ? AND requirement_id = ?
+            ORDER BY path
+        """,
+            (self.workspace, requirement_id),
+        )
+        return [path for path, in cursor]
+
+    def requirements_for(self, path):
+        cursor = self.conn.execute(
+            """
+            SELECT requirement_id
+            FROM coverage_references
+            WHERE workspace = ? AND path = ?
+            ORDER BY requirement_id
+        """,
+            (self.workspace, path),
+        )
+        return [id for id, in cursor]
+
+    def uncovered(self, subsystem=None):
+        """(id, text, subsystem) of requirements no procedure references"""
+        cursor = self.conn.execute(
+            """
+            SELECT id, text, subsystem
+            FROM Requirement
+            WHERE (? IS NULL OR subsystem = ?) AND id NOT IN (
+                SELECT requirement_id
+                FROM coverage_references
+                WHERE workspace = ?
+            )
+            ORDER BY id
+        """,
+            (subsystem, subsystem, self.workspace),
+        )
+        return cursor.fetchall()
+
+    def over_covered(self, threshold=OVER_COVERED):
+        """(id, procedure count) of requirements referenced more than `threshold`"""
+        cursor = self.conn.execute(
+            """
+            SELECT requirement_id, COUNT(*) AS procedures
+            FROM coverage_references
+            WHERE workspace = ?
+            GROUP BY requirement_id
+            HAVING procedures > ?
+            ORDER BY procedures DESC, requirement_id
+        """,
+            (self.workspace, threshold),
+        )
+        return cursor.fetchall()
+
+    def unknown(self):
+        """(id, procedure count) of references to requirements that do not exist"""
+        cursor = self.conn.execute(
+            """
+            SELECT requirement_id, COUNT(*)
+            FROM coverage_references
+            WHERE workspace = ? AND requirement_id NOT IN (
+                SELECT id FROM Requirement
+            )
+            GROUP BY requirement_id
+            ORDER BY requirement_id
+        """,
+            (self.workspace,),
+        )
+        return cursor.fetchall()
+
+    def subsystems(self):
+        """(subsystem, requirements, covered) of every subsystem"""
+        cursor = self.conn.execute(
+            """
+            SELECT r.subsystem, COUNT(*), COUNT(c.requirement_id)
+            FROM Requirement r
+            LEFT JOIN (
+                SELECT DISTINCT requirement_id
+                FROM coverage_references
+                WHERE workspace = ?
+            ) c ON c.requirement_id = r.id
+            GROUP BY r.subsystem
+            ORDER BY r.subsystem
+        """,
+            (self.workspace,),
+        )
+        return cursor.fetchall()
+
+    def procedure_count(self):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM coverage_procedures WHERE workspace = ?",
+            (self.workspace,),
+        ).fetchone()[0]
+
+
+def get_coverage(workspace):
+    return Coverage(get_db(), workspace.id, workspace.root)
+
+
+class ChangedPaths:
+    """Watcher subscriber collecting the paths changed between refreshes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # held while refreshing so changes are taken in order
+        self.refresh_lock = threading.Lock()
+        # None until the first refresh has walked the workspace
+        self.paths = None
+
+    def put_nowait(self, event):
+        with self.lock:
+            if self.paths is not None:
+                self.paths.add(event["path"])
+
+    def take(self):
+        with self.lock:
+            paths, self.paths = self.paths, set()
+        return paths
+
+    def put_back(self, paths):
+        """Returns paths taken by a refresh that failed"""
+        with self.lock:
+            if paths is None:
+                self.paths = None
+            elif self.paths is not None:
+                self.paths |= paths
+
+
+# (workspace id, watcher) -> ChangedPaths
+_changes = {}
+_changes_lock = threading.Lock()
+
+
+def refresh_coverage(workspace):
+    """A workspace's coverage, refreshed
+
+    Workspaces without a watcher are walked every time.
+    """
+    coverage = get_coverage(workspace)
+    watcher = get_watcher(workspace.root)
+    if watcher is None:
+        coverage.refresh()
+        return coverage
+
+    with _changes_lock:
+        changes = _changes.get((workspace.id, watcher))
+        if changes is None:
+            changes = _changes[(workspace.id, watcher)] = ChangedPaths()
+            watcher.subscribe(changes)
+
+    with changes.refresh_lock:
+        paths = changes.take()
+        try:
+            coverage.refresh(paths)
+        except BaseException:
+            changes.put_back(paths)
+            raise
+    return coverage
+
+
+__all__ = [
+    "ChangedPaths",
+    "Coverage",
+    "get_coverage",
+    "refresh_coverage",
+    "requirement_ids",
+]
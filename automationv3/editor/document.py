@@ -1,11 +1,26 @@
 from contextlib import closing
 import hashlib
 import json
+import logging
 from pathlib import Path
-import mimetypes
 
-from ..framework import edn
+from flask import g, has_app_context
+
 from ..database import get_db
+from .drafts import get_draft_buffer
+from .largefile import is_large
+from .mime import guess_mime
+from .patches import (
+    COMPACT_AFTER,
+    UNDO_DEPTH,
+    PatchConflict,
+    apply_patch,
+    apply_patches,
+    record_patch,
+)
+from .watcher import watcher_for
+
+log = logging.getLogger(__name__)
 
 
 def table_exists(conn, table_name):
@@ -20,37 +35,22 @@ def table_exists(conn, table_name):
     return len(cursor.fetchall()) != 0
 
 
-def is_binary(path, sample_length=8000):
-    """Simplistic Git method. Basically read checking for NUL"""
-    try:
-        with path.open(mode="r") as f:
-            f.read(sample_length)
-        return False
-    except UnicodeDecodeError:
-        pass
-    return True
-
-
-def guess_mime(path):
-    # TODO: Improve
-    if is_binary(path):
-        mime = "application/octet-stream"
-    elif path.suffix == ".rvt":
-        content = path.read_text()
-        try:
-            parsed_content = edn.read(content)
-            if isinstance(parsed_content, (str, edn.List)):
-                mime = "application/rvt+edn"
-            else:
-                mime = "application/rvt"
-        except Exception:
-            mime = "application/rvt"
-    else:
-        mime = mimetypes.guess_type(path)[0]
-    return mime
+def loaded_documents():
+    """Documents already loaded during this request, by id
+
+    Acts as an identity map so a document is read at most once per
+    request however many places ask for it. Outside of an app context
+    nothing is shared.
+    """
+    if not has_app_context():
+        return {}
+    return g.setdefault("loaded_documents", {})
 
 
 class Document:
+    # Persisted fields in the order `from_row` expects them
+    COLUMNS = "id, path, draft, mime, st_mtime, meta, patches"
+
     @staticmethod
     def ensure_db(conn):
         if not table_exists(conn, "documents"):
@@ -62,12 +62,36 @@ class Document:
                     draft TEXT,
                     mime TEXT NOT NULL,
                     st_mtime REAL,
-                    meta TEXT NOT NULL
+                    meta TEXT NOT NULL,
+                    patches INTEGER NOT NULL DEFAULT 0
                 )
             """
             )
             conn.commit()
 
+        # Databases created before drafts were patched
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+        if "patches" not in columns:
+            conn.execute(
+                "ALTER TABLE documents ADD COLUMN patches INTEGER NOT NULL DEFAULT 0"
+            )
+            conn.commit()
+
+        if not table_exists(conn, "document_patches"):
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS document_patches(
+                    document_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    statement INTEGER NOT NULL,
+                    old_hash TEXT,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (document_id, seq)
+                ) WITHOUT ROWID
+            """
+            )
+            conn.commit()
+
     @staticmethod
     def open(conn, path):
         """Opens a file is not already opened. Otherwised returns opened document"""
@@ -85,7 +109,7 @@ class Document:
         )
         exists = cursor.fetchone()[0] > 0
         if exists:
-            return Document(conn, id)
+            return Document.get(conn, id)
 
         # Otherwise open document
         st_mtime = path.stat().st_mtime
@@ -102,17 +126,37 @@ class Document:
             )
             conn.commit()
 
-        return Document(conn, id)
+        return Document.get(conn, id)
+
+    @staticmethod
+    def get(conn, id):
+        """The request's instance of a document, created if not loaded yet"""
+        documents = loaded_documents()
+        if id not in documents:
+            documents[id] = Document(conn, id)
+        return documents[id]
+
+    @staticmethod
+    def from_row(conn, row):
+        """A document hydrated from a `COLUMNS` row
+
+        Reuses the request's instance if there is one so fields already
+        read (or changed) in this request are kept.
+        """
+        document = Document.get(conn, row[0])
+        if not document._read:
+            document.hydrate(row[1:])
+        return document
 
     @staticmethod
     def all(conn):
         cursor = conn.execute(
-            """
-            SELECT id
+            f"""
+            SELECT {Document.COLUMNS}
             FROM documents
         """
         )
-        return [Document(conn, row[0]) for row in cursor.fetchall()]
+        return [Document.from_row(conn, row) for row in cursor.fetchall()]
 
     def __init__(self, conn, id):
         self.id = id
@@ -125,6 +169,10 @@ class Document:
         self._mime = None
         self._draft = None
         self._meta = None
+        self._patches = 0
+
+        # Draft with the patch log replayed
+        self._patched = None
 
     def read_db(self):
         if self._read:
@@ -132,25 +180,29 @@ class Document:
 
         cursor = self.conn.execute(
             """
-            SELECT path, draft, mime, st_mtime, meta
+            SELECT path, draft, mime, st_mtime, meta, patches
             FROM documents
             WHERE id = ?
         """,
             (self.id,),
         )
-        row = cursor.fetchone()
-        if row is not None:
-            self._path, self._draft, self._mime, self._st_mtime, self._meta = row
-        else:
-            self._path, self._draft, self._mime, self._st_mtime, self._meta = (
-                None,
-                None,
-                None,
-                None,
-                "[]",
-            )
+        self.hydrate(cursor.fetchone())
+
+    def hydrate(self, row):
+        """Sets persisted fields from a `COLUMNS` row without the id"""
+        if row is None:
+            row = (None, None, None, None, "[]", 0)
+        (
+            self._path,
+            self._draft,
+            self._mime,
+            self._st_mtime,
+            self._meta,
+            self._patches,
+        ) = row
 
         self._meta = json.loads(self._meta)
+        self._patched = None
         self._read = True
 
     @property
@@ -165,9 +217,188 @@ class Document:
 
     @property
     def draft(self):
+        buffer = get_draft_buffer()
+        if buffer is not None and buffer.has(self.id):
+            return buffer.get(self.id)
         self.read_db()
+        if self._patches:
+            if self._patched is None:
+                self._patched = self.replay()
+            return self._patched
         return self._draft
 
+    @property
+    def base(self):
+        """Text the patch log applies to
+
+        The first patch stores it as the draft. Only logs recorded before
+        that apply to the file on disk.
+        """
+        self.read_db()
+        if self._draft is not None:
+            return self._draft
+        return self.path.read_text()
+
+    def replay(self):
+        """The base with the patch log applied
+
+        A log that no longer applies, e.g. to a file changed on disk, is
+        dropped. The text as of the last patch that applied is kept.
+        """
+        text = self.base
+        patches = self.patches()
+        for applied, patch in enumerate(patches):
+            try:
+                text = apply_patch(text, *patch)
+            except PatchConflict as e:
+                log.warning(
+                    "Dropping %d patches of %s: %s",
+                    len(patches) - applied,
+                    self.path,
+                    e,
+                )
+                draft = text if applied else self._draft
+                with self.conn:
+                    self.clear_patches()
+                    self.conn.execute(
+                        "UPDATE documents SET draft = ? WHERE id = ?", (draft, self.id)
+                    )
+                self._draft = draft
+                return draft
+        return text
+
+    def patches(self):
+        """(statement, old hash, value) of logged patches, oldest first"""
+        cursor = self.conn.execute(
+            """
+            SELECT statement, old_hash, value
+            FROM document_patches
+            WHERE document_id = ?
+            ORDER BY seq
+        """,
+            (self.id,),
+        )
+        return [tuple(row) for row in cursor.fetchall()]
+
+    @property
+    def patch_count(self):
+        self.read_db()
+        return self._patches
+
+    def save_patch(self, index, old_hash, value, patched):
+        """Logs an edit of statement `index` instead of storing a new draft
+
+        `patched` is the text with the edit applied.
+        """
+        # a full draft still waiting to be written is the base
+        buffer = get_draft_buffer()
+        if buffer is not None and buffer.has(self.id):
+            buffer.flush()
+            self._read = False
+        record_patch(self.content, index, old_hash, value, patched)
+
+        # the first patch stores the text it applies to, so the log still
+        # applies when the file changes on disk
+        base = None if self.patch_count else self.base
+
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO document_patches
+                    (document_id, seq, statement, old_hash, value)
+                SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ?
+                FROM document_patches
+                WHERE document_id = ?
+            """,
+                (self.id, index, old_hash, value, self.id),
+            )
+            self.conn.execute(
+                """
+                UPDATE documents
+                SET patches = patches + 1, draft = COALESCE(draft, ?)
+                WHERE id = ?
+            """,
+                (base, self.id),
+            )
+        if self._draft is None:
+            self._draft = base
+        self._patches += 1
+        self._patched = patched
+
+        if self._patches > COMPACT_AFTER:
+            self.compact()
+
+    def compact(self, keep=UNDO_DEPTH):
+        """Folds all but the newest `keep` patches into the base"""
+        patches = self.patches()
+        if len(patches) <= keep:
+            return
+
+        folded = len(patches) - keep
+        base = apply_patches(self.base, patches[:folded])
+        with self.conn:
+            self.conn.execute(
+                """
+                DELETE FROM document_patches
+                WHERE document_id = ? AND seq IN (
+                    SELECT seq
+                    FROM document_patches
+                    WHERE document_id = ?
+                    ORDER BY seq
+                    LIMIT ?
+                )
+            """,
+                (self.id, self.id, folded),
+            )
+            self.conn.execute(
+                "UPDATE documents SET draft = ?, patches = ? WHERE id = ?",
+                (base, keep, self.id),
+            )
+        self._draft = base
+        self._patches = keep
+
+    def undo(self):
+        """Drops the newest patch. False if there is nothing to undo"""
+        if not self.patch_count:
+            return False
+
+        with self.conn:
+            self.conn.execute(
+                """
+                DELETE FROM document_patches
+                WHERE document_id = ? AND seq = (
+                    SELECT MAX(seq) FROM document_patches WHERE document_id = ?
+                )
+            """,
+                (self.id, self.id),
+            )
+            self.conn.execute(
+                "UPDATE documents SET patches = patches - 1 WHERE id = ?", (self.id,)
+            )
+        self._patches -= 1
+        self._patched = None
+
+        # undone back to the text on disk, nothing is modified anymore
+        if (
+            not self._patches
+            and self.path.exists()
+            and self._draft == self.path.read_text()
+        ):
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE documents SET draft = NULL WHERE id = ?", (self.id,)
+                )
+            self._draft = None
+        return True
+
+    def clear_patches(self):
+        self.conn.execute(
+            "DELETE FROM document_patches WHERE document_id = ?", (self.id,)
+        )
+        self.conn.execute("UPDATE documents SET patches = 0 WHERE id = ?", (self.id,))
+        self._patches = 0
+        self._patched = None
+
     @property
     def path(self):
         self.read_db()
@@ -201,6 +432,12 @@ class Document:
             self.path.write_text(self.content)
 
         st_mtime = self.path.stat().st_mtime
+        if watcher := watcher_for(self.path):
+            watcher.refresh(self.path)
+
+        # the saved content supersedes any draft still waiting to be written
+        if buffer := get_draft_buffer():
+            buffer.discard(self.id)
 
         with closing(self.conn.cursor()) as c:
             c.execute(
@@ -211,12 +448,23 @@ class Document:
             """,
                 (None, st_mtime, self.id),
             )
+            self.clear_patches()
             self.conn.commit()
 
         self._draft = None
         self._st_mtime = st_mtime
 
     def save_draft(self, content):
+        # a full draft replaces the base and its patches
+        if self.patch_count:
+            self.clear_patches()
+            self.conn.commit()
+
+        if buffer := get_draft_buffer():
+            buffer.put(self.id, content)
+            self._draft = content
+            return
+
         with closing(self.conn.cursor()) as c:
             c.execute(
                 """
@@ -239,6 +487,41 @@ class Document:
         else:
             return self.path.read_text()
 
+    @property
+    def revision(self):
+        """Changes whenever `content` does, without materializing it
+
+        Hashes the draft and patch log when there are any, otherwise the
+        size and mtime of the file on disk.
+        """
+        buffer = get_draft_buffer()
+        if buffer is not None and buffer.has(self.id):
+            draft, patches = buffer.get(self.id), []
+        else:
+            self.read_db()
+            draft = self._draft
+            patches = self.patches() if self._patches else []
+
+        h = hashlib.sha1()
+        if draft is not None:
+            h.update(draft.encode("utf-8"))
+        elif self.path is not None and self.path.exists():
+            st = self.path.stat()
+            h.update(f"{st.st_size}:{st.st_mtime_ns}".encode("utf-8"))
+        for patch in patches:
+            h.update(repr(patch).encode("utf-8"))
+        return h.hexdigest()
+
+    @property
+    def is_large(self):
+        """Too large to edit, shown a page of lines at a time instead"""
+        return (
+            self.mime != "application/octet-stream"
+            and self.draft is None
+            and self.path.exists()
+            and is_large(self.path)
+        )
+
     def is_modified(self):
         return self.draft is not None
 
@@ -246,9 +529,16 @@ class Document:
         """Returns true if underlying file has changed on disk
         since being opened
         """
-        return self.st_mtime != self.path.stat().st_mtime
+        watcher = watcher_for(self.path)
+        st_mtime = watcher.mtime(self.path) if watcher else None
+        if st_mtime is None:
+            st_mtime = self.path.stat().st_mtime
+        return self.st_mtime != st_mtime
 
     def close(self):
+        if buffer := get_draft_buffer():
+            buffer.discard(self.id)
+
         self.conn.execute(
             """
             DELETE FROM documents
@@ -256,8 +546,10 @@ class Document:
         """,
             (self.id,),
         )
+        self.clear_patches()
         self.conn.commit()
         self._read = False
+        loaded_documents().pop(self.id, None)
 
     def __eq__(self, other):
         "Lookup by relative paths"
@@ -270,5 +562,5 @@ class Document:
 def get_document(id):
     if id is not None:
         conn = get_db()
-        return Document(conn, id)
+        return Document.get(conn, id)
     return None
@@ -0,0 +1,125 @@
+"""Write-behind buffer for document drafts
+
+The editor posts the whole document on every pause in typing. Writing
+each of those drafts straight away costs a transaction (and an fsync)
+per post and keeps the database writer busy. Drafts are buffered here
+instead: a newer draft of a document replaces the pending one and all
+pending drafts are written together in one transaction every `interval`
+seconds.
+
+Reading a document's draft checks the buffer first so a request never
+sees an older draft than the one last posted.
+
+Crash safety:
+
+* a draft is in the database at most `interval` seconds after it was
+  posted
+* saving or closing a document drops its pending draft before the
+  document is written, so an old draft can not reappear afterwards
+* pending drafts are flushed when the buffer is stopped and at
+  interpreter exit, so a clean shutdown loses nothing
+* a hard crash (killed process, power loss) loses at most the drafts
+  posted in the last `interval` seconds. The file on disk is never
+  touched by a draft so nothing saved is lost.
+"""
+
+import atexit
+import sqlite3
+import threading
+from pathlib import Path
+
+from flask import current_app, has_app_context
+
+from ..database import db
+
+DEFAULT_INTERVAL = 0.5
+
+
+class DraftBuffer:
+    def __init__(self, path, interval=DEFAULT_INTERVAL):
+        self.path = str(path)
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        # document id -> latest draft
+        self.pending = {}
+        self.conn = None
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """Stops flushing in the background and flushes what is left"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def put(self, document_id, draft):
+        with self.lock:
+            self.pending[document_id] = draft
+
+    def has(self, document_id):
+        with self.lock:
+            return document_id in self.pending
+
+    def get(self, document_id):
+        """Pending draft of a document. KeyError if there is none"""
+        with self.lock:
+            return self.pending[document_id]
+
+    def discard(self, document_id):
+        """Drops a pending draft that must never be written"""
+        with self.lock:
+            self.pending.pop(document_id, None)
+
+    def flush(self):
+        """Writes every pending draft in a single transaction"""
+        with self.lock:
+            if not self.pending:
+                return
+            if self.conn is None:
+                self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE documents SET draft = ? WHERE id = ?",
+                    [(draft, id) for id, draft in self.pending.items()],
+                )
+            self.pending.clear()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # kept pending and retried next interval
+                pass
+
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def get_draft_buffer():
+    """Started buffer of the app's database, None unless `BUFFER_DRAFTS` is set"""
+    if not has_app_context() or not current_app.config.get("BUFFER_DRAFTS"):
+        return None
+
+    path = Path(db.get_connection_str()).resolve()
+    with _buffers_lock:
+        if path not in _buffers:
+            _buffers[path] = DraftBuffer(path).start()
+        return _buffers[path]
+
+
+__all__ = ["DraftBuffer", "get_draft_buffer"]
@@ -1,5 +1,7 @@
 from contextlib import closing
 
+from flask import g, has_app_context
+
 from .document import Document
 from ..database import get_db
 
@@ -48,6 +50,36 @@ class Editor:
         self.id = id
         self.conn = conn
 
+        # Editor state read once by `load`
+        self._loaded = False
+        self._active_tab = None
+        self._documents = []
+
+    def load(self):
+        """Reads the active tab and every opened document in one query"""
+        if self._loaded:
+            return
+
+        cursor = self.conn.execute(
+            """
+            SELECT e.active_tab, d.id, d.path, d.draft, d.mime, d.st_mtime, d.meta,
+                   d.patches
+            FROM editors AS e
+            LEFT JOIN opened_documents AS o ON o.editor_id = e.id
+            LEFT JOIN documents AS d ON d.id = o.document_id
+            WHERE e.id = ?
+            ORDER BY o.id
+        """,
+            (self.id,),
+        )
+        rows = cursor.fetchall()
+
+        self._active_tab = rows[0][0] if rows else None
+        self._documents = [
+            Document.from_row(self.conn, row[1:]) for row in rows if row[1] is not None
+        ]
+        self._loaded = True
+
     @staticmethod
     def create(conn):
         cursor = conn.cursor()
@@ -65,32 +97,17 @@ class Editor:
         return Editor(conn, id)
 
     def documents(self):
-        cursor = self.conn.execute(
-            """
-            SELECT document_id
-            FROM opened_documents
-            WHERE editor_id = ?
-        """,
-            (self.id,),
-        )
-        rows = cursor.fetchall()
-
-        return [Document(self.conn, row[0]) for row in rows]
+        self.load()
+        return list(self._documents)
 
     @property
     def active_document(self):
-        cursor = self.conn.execute(
-            """
-            SELECT active_tab
-            FROM editors
-            WHERE id = ?
-        """,
-            (self.id,),
-        )
-        row = cursor.fetchone()
-        document_id = row[0]
+        self.load()
+        document_id = self._active_tab
         if document_id is not None:
-            document = Document(self.conn, document_id)
+            document = next((d for d in self._documents if d.id == document_id), None)
+            if document is None:
+                document = Document.get(self.conn, document_id)
             if document.path and document.path.exists():
                 return document
             else:  # just return the first document
@@ -112,6 +129,7 @@ class Editor:
         )
         self.conn.commit()
         cursor.close()
+        self._active_tab = document.id if document is not None else None
 
     def open(self, path):
         document = Document.open(self.conn, path)
@@ -126,6 +144,7 @@ class Editor:
                     (self.id, document.id),
                 )
                 self.conn.commit()
+            self._documents.append(document)
         return document
 
     def close(self, document):
@@ -141,6 +160,7 @@ class Editor:
                 (document.id,),
             )
             self.conn.commit()
+        self._documents = [d for d in self._documents if d.id != document.id]
 
         # close document
         document.close()
@@ -151,7 +171,13 @@ class Editor:
 
 
 def get_editor(id):
+    """The request's instance of an editor so its state is loaded once"""
     if id is not None:
         conn = get_db()
-        return Editor(conn, id)
+        if not has_app_context():
+            return Editor(conn, id)
+        editors = g.setdefault("loaded_editors", {})
+        if str(id) not in editors:
+            editors[str(id)] = Editor(conn, id)
+        return editors[str(id)]
     return None
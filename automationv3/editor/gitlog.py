@@ -0,0 +1,289 @@
+"""Commit log reader
+
+Reads every field the commit log views need with a single `git log`
+invocation instead of a process per commit and field. Records start with
+an ASCII record separator and fields are split with a unit separator,
+which never appear in names, dates or file paths. File names follow the
+fields NUL separated (`-z`).
+
+Output is parsed as it streams in so a page of commits only costs as
+much as reading that page.
+
+Commits never change, so `CommitCache` keeps them in the database. Only
+commits newer than the cached head are read from git, and pages come
+straight from the cache however long the history is.
+"""
+
+import json
+import re
+import sqlite3
+import subprocess
+
+from flask import current_app
+
+from ..database import get_db
+
+RECORD = b"\x1e"
+FIELD = "\x1f"
+
+# hash, author name, committer date, raw body
+FORMAT = "%x1e%H%x1f%an%x1f%cd%x1f%B%x1f"
+
+COMMIT_PATTERN = re.compile("[0-9a-fA-F]{4,40}")
+
+READ_SIZE = 64 * 1024
+
+
+def parse_record(record):
+    """Parses one `FORMAT` record into a commit dict"""
+    text = record.decode("utf-8", errors="replace")
+    hash, author, date, message, files = text.split(FIELD, 4)
+    message = message.strip()
+    return {
+        "hash": hash,
+        "author": author,
+        "date": date,
+        "message": message,
+        "title": message.split("\n")[0],
+        "files": [f.strip("\n") for f in files.split("\0") if f.strip("\n")],
+    }
+
+
+def iter_records(stream):
+    """Yields raw records from a `git log` output stream as they complete"""
+    pending = b""
+    while chunk := stream.read(READ_SIZE):
+        records = (pending + chunk).split(RECORD)
+        pending = records.pop()
+        for record in records:
+            if record:
+                yield record
+    if pending:
+        yield pending
+
+
+class GitLog:
+    def __init__(self, root):
+        self.root = root
+
+    def iter_commits(self, *revisions, skip=0, max_count=None, topo_order=False):
+        """Yields commits newest first
+
+        `revisions` are passed to `git log` as is, defaulting to HEAD.
+        """
+        cmd = ["git", "log", "-z", "--name-only", f"--format={FORMAT}"]
+        if topo_order:
+            cmd.append("--topo-order")
+        if skip:
+            cmd.append(f"--skip={skip}")
+        if max_count is not None:
+            cmd.append(f"--max-count={max_count}")
+        cmd.extend(revisions or ["HEAD"])
+        cmd.append("--")
+
+        with subprocess.Popen(
+            cmd, cwd=self.root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ) as proc:
+            try:
+                for record in iter_records(proc.stdout):
+                    yield parse_record(record)
+            finally:
+                # the consumer may stop early
+                proc.kill()
+
+    def commits(self, skip=0, max_count=None):
+        return list(self.iter_commits(skip=skip, max_count=max_count))
+
+    def get_commit(self, hash):
+        """A single commit, or None if `hash` does not name one"""
+        if not COMMIT_PATTERN.fullmatch(hash):
+            return None
+        return next(self.iter_commits(hash, max_count=1), None)
+
+    def head(self):
+        """Hash of HEAD or None for a repository without commits"""
+        try:
+            output = subprocess.check_output(
+                ["git", "rev-parse", "--verify", "-q", "HEAD"],
+                cwd=self.root,
+                stderr=subprocess.DEVNULL,
+            )
+        except subprocess.CalledProcessError:
+            return None
+        return output.decode("utf-8").strip()
+
+    def is_ancestor(self, ancestor, descendant):
+        result = subprocess.run(
+            ["git", "merge-base", "--is-ancestor", ancestor, descendant],
+            cwd=self.root,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        return result.returncode == 0
+
+
+# Helpers
+def table_exists(conn, table_name):
+    cursor = conn.execute(
+        """
+        SELECT name
+        FROM sqlite_master
+        WHERE type='table' AND name= ?
+    """,
+        (table_name,),
+    )
+    return len(cursor.fetchall()) != 0
+
+
+class CommitCache:
+    """Commit metadata of a repository's HEAD history kept in sqlite
+
+    Commits are numbered by `seq`, oldest first and without gaps, so a
+    page is a range scan from the top. New commits are appended on top.
+    If HEAD no longer descends from the cached head (a reset or rebase)
+    the cache is rebuilt.
+    """
+
+    @staticmethod
+    def ensure_db(conn):
+        if not table_exists(conn, "commits"):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS commits(
+                    repo TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    hash TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    files TEXT NOT NULL,
+                    PRIMARY KEY (repo, seq)
+                )
+            """)
+            conn.execute("CREATE INDEX commits_hash ON commits(repo, hash)")
+            conn.commit()
+        if not table_exists(conn, "commit_heads"):
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS commit_heads(
+                    repo TEXT PRIMARY KEY,
+                    head TEXT,
+                    count INTEGER NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def __init__(self, conn, log):
+        self.conn = conn
+        self.log = log
+        self.repo = str(log.root)
+
+    def cached_head(self):
+        """(head, count) of the cached history"""
+        row = self.conn.execute(
+            "SELECT head, count FROM commit_heads WHERE repo = ?", (self.repo,)
+        ).fetchone()
+        return row if row is not None else (None, 0)
+
+    def refresh(self):
+        """Caches commits added since the last refresh"""
+        cached, count = self.cached_head()
+        head = self.log.head()
+        if head == cached:
+            return
+
+        if cached is None or head is None or not self.log.is_ancestor(cached, head):
+            revisions, count = [head] if head else [], 0
+        else:
+            revisions = [head, f"^{cached}"]
+
+        new = list(self.log.iter_commits(*revisions, topo_order=True)) if head else []
+        rows = [
+            (
+                self.repo,
+                count + len(new) - i,
+                commit["hash"],
+                commit["author"],
+                commit["date"],
+                commit["message"],
+                json.dumps(commit["files"]),
+            )
+            for i, commit in enumerate(new)
+        ]
+
+        try:
+            with self.conn:
+                # another request may have refreshed in the meantime
+                if self.cached_head()[0] != cached:
+                    return
+                if count == 0:
+                    self.conn.execute(
+                        "DELETE FROM commits WHERE repo = ?", (self.repo,)
+                    )
+                self.conn.executemany(
+                    "INSERT INTO commits VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO commit_heads VALUES (?, ?, ?)",
+                    (self.repo, head, count + len(new)),
+                )
+        except sqlite3.IntegrityError:
+            # lost the race, the other refresh cached the same commits
+            pass
+
+    @staticmethod
+    def from_row(row):
+        hash, author, date, message, files = row
+        return {
+            "hash": hash,
+            "author": author,
+            "date": date,
+            "message": message,
+            "title": message.split("\n")[0],
+            "files": json.loads(files),
+        }
+
+    def commits(self, skip=0, max_count=None):
+        self.refresh()
+        _, count = self.cached_head()
+        cursor = self.conn.execute(
+            """
+            SELECT hash, author, date, message, files
+            FROM commits
+            WHERE repo = ? AND seq <= ?
+            ORDER BY seq DESC
+            LIMIT ?
+        """,
+            (self.repo, count - skip, -1 if max_count is None else max_count),
+        )
+        return [self.from_row(row) for row in cursor]
+
+    def get_commit(self, hash):
+        """A single commit, or None if `hash` does not name one"""
+        if not COMMIT_PATTERN.fullmatch(hash):
+            return None
+
+        hash = hash.lower()
+        row = self.conn.execute(
+            """
+            SELECT hash, author, date, message, files
+            FROM commits
+            WHERE repo = ? AND hash >= ? AND hash < ?
+            LIMIT 2
+        """,
+            (self.repo, hash, hash + "g"),
+        ).fetchall()
+        if len(row) == 1:
+            return self.from_row(row[0])
+
+        # not on HEAD's history (or ambiguous), ask git
+        return self.log.get_commit(hash)
+
+
+def get_git_log():
+    return GitLog(current_app.config["WORKSPACE_PATH"])
+
+
+def get_commit_cache():
+    return CommitCache(get_db(), get_git_log())
+
+
+__all__ = ["GitLog", "CommitCache", "get_git_log", "get_commit_cache"]
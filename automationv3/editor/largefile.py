@@ -0,0 +1,111 @@
+"""Viewing files too large to load
+
+Documents larger than `LARGE_FILE_SIZE` are not read into memory. The
+file is memory-mapped and an index of where each line starts is built
+once per mtime, so any range of lines can be served without reading
+the rest of the file. The editor shows such documents read-only, a page
+of lines at a time.
+"""
+
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+LARGE_FILE_SIZE = 5 * 1024**2
+
+# Lines served per request
+LINE_PAGE_SIZE = 500
+
+# Indexed files kept open
+INDEX_CACHE_SIZE = 8
+
+
+def is_large(path):
+    return Path(path).stat().st_size > LARGE_FILE_SIZE
+
+
+class LineIndex:
+    """Line offsets of a memory-mapped file"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with self.path.open(mode="rb") as f:
+            st = os.fstat(f.fileno())
+            self.size, self.mtime_ns = st.st_size, st.st_mtime_ns
+            # an empty file can not be mapped
+            self.map = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+            )
+
+        self.starts = array("Q", [0])
+        find = self.map.find
+        position = find(b"\n")
+        while position != -1:
+            self.starts.append(position + 1)
+            position = find(b"\n", position + 1)
+        if self.starts[-1] == self.size and self.size:
+            # no line after the last newline
+            self.starts.pop()
+
+    @property
+    def line_count(self):
+        return len(self.starts) if self.size else 0
+
+    def is_current(self):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (self.size, self.mtime_ns)
+
+    def lines(self, start, count):
+        """Lines `start` to `start + count`, without line endings"""
+        start = max(start, 0)
+        stop = min(start + count, self.line_count)
+        if start >= stop:
+            return []
+
+        begin = self.starts[start]
+        end = self.starts[stop] if stop < len(self.starts) else self.size
+        text = self.map[begin:end].decode("utf-8", errors="replace")
+        # only \n ends a line, as in the index. splitlines() would also
+        # split on \r, \x0c, \u2028 and others
+        lines = text.split("\n")
+        if text.endswith("\n"):
+            lines.pop()
+        return [line.removesuffix("\r") for line in lines]
+
+    def close(self):
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_line_index(path):
+    """Index of a file as it is now, rebuilt when the file changed"""
+    path = Path(path).resolve()
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is not None and index.is_current():
+            _indexes.move_to_end(path)
+            return index
+
+    # built outside of the lock, large files take a while
+    index = LineIndex(path)
+    with _indexes_lock:
+        if path in _indexes:
+            # still mapped pages stay valid for requests using the old one
+            _indexes.pop(path)
+        _indexes[path] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+__all__ = ["LineIndex", "get_line_index", "is_large", "LARGE_FILE_SIZE"]
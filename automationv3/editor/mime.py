@@ -0,0 +1,115 @@
+"""Content type sniffing
+
+Deciding what a file is only looks at its first `SNIFF_LENGTH` bytes:
+
+* binary if the prefix has a NUL byte or is not valid UTF-8, like git
+* `.rvt` files are `application/rvt+edn` when their first edn form is
+  a string or a list. Only the first token is looked at, the form
+  itself is not read.
+* everything else goes by file name
+
+Results are cached by path, size and mtime so a file is sniffed once
+until it changes.
+"""
+
+import functools
+import mimetypes
+from pathlib import Path
+
+from ..framework import edn
+
+SNIFF_LENGTH = 8000
+
+# First characters of forms that are strings or lists
+EDN_DOCUMENT_START = {'"', "(", "'"}
+
+# First characters of forms that are not
+EDN_DATA_START = {"[", "{", "#"}
+
+
+def is_binary_prefix(prefix):
+    if b"\0" in prefix:
+        return True
+    try:
+        prefix.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # a character cut in half at the end of the prefix
+        return e.reason != "unexpected end of data"
+    return False
+
+
+def is_binary(path, sample_length=SNIFF_LENGTH):
+    """Simplistic Git method. Basically read checking for NUL"""
+    with Path(path).open(mode="rb") as f:
+        return is_binary_prefix(f.read(sample_length))
+
+
+def first_token(text):
+    """Text from the first edn token on, skipping whitespace and comments"""
+    i = 0
+    while i < len(text):
+        if edn.is_whitespace(text[i]):
+            i += 1
+        elif text[i] == ";":
+            newline = text.find("\n", i)
+            if newline == -1:
+                return ""
+            i = newline + 1
+        else:
+            return text[i:]
+    return ""
+
+
+def is_edn_document(prefix, complete):
+    """True if the first form of `prefix` is a string or list
+
+    `complete` tells whether `prefix` is the whole file.
+    """
+    text = first_token(prefix.decode("utf-8", errors="ignore"))
+    if not text:
+        if not complete:
+            raise ValueError("No edn form in prefix")
+        # an empty document reads as a string (READ_EOF)
+        return True
+
+    if text[0] in EDN_DOCUMENT_START:
+        return True
+    if text[0] in EDN_DATA_START:
+        return False
+
+    # a symbol, keyword, number or character, all short
+    try:
+        return isinstance(edn.read(text), (str, edn.List))
+    except Exception:
+        return False
+
+
+@functools.lru_cache(maxsize=4096)
+def sniff_mime(path, size, mtime_ns):
+    """Content type of `path` as it was at `size` and `mtime_ns`"""
+    with path.open(mode="rb") as f:
+        prefix = f.read(SNIFF_LENGTH)
+
+    if is_binary_prefix(prefix):
+        return "application/octet-stream"
+    elif path.suffix == ".rvt":
+        try:
+            edn_document = is_edn_document(prefix, complete=size <= len(prefix))
+        except ValueError:
+            # nothing but comments in the prefix, read the first form
+            try:
+                edn_document = isinstance(edn.read(path.read_text()), (str, edn.List))
+            except Exception:
+                edn_document = False
+        return "application/rvt+edn" if edn_document else "application/rvt"
+    else:
+        return mimetypes.guess_type(path)[0]
+
+
+def guess_mime(path):
+    path = Path(path)
+    st = path.stat()
+    return sniff_mime(path, st.st_size, st.st_mtime_ns)
+
+
+__all__ = ["guess_mime", "is_binary", "sniff_mime"]
@@ -0,0 +1,79 @@
+"""Statement level draft patches
+
+Editing a section of a test case used to store the whole re-serialized
+test case as the document's draft. Instead the draft is kept as a base
+text plus a log of patches, one per section edit:
+
+    (statement index, hash of the statement replaced, new value)
+
+The base is the document's stored draft. When there is none the first
+patch stores the file's text as the draft, so changing the file on disk
+does not invalidate the log. The current text is materialized on demand by replaying the
+log on top of the base. Each patch checks the hash of the statement it
+replaces so a log is never replayed over a base it was not made for.
+
+Undo drops the newest patch. Once a log grows past `COMPACT_AFTER`
+patches all but the newest `UNDO_DEPTH` are folded into the base.
+"""
+
+import threading
+from collections import OrderedDict
+
+from ..framework.testcase import EdnTestCase
+
+# Patches logged before the log is compacted
+COMPACT_AFTER = 50
+
+# Patches kept for undo when compacting
+UNDO_DEPTH = 20
+
+
+class PatchConflict(Exception):
+    pass
+
+
+# Replaying a log applies the same patches to the same texts over and
+# over. Results are kept so only new patches cost a parse.
+CACHE_SIZE = 32
+_applied = OrderedDict()
+_applied_lock = threading.Lock()
+
+
+def record_patch(text, index, old_hash, value, patched):
+    """Remembers the result of a patch applied elsewhere"""
+    with _applied_lock:
+        _applied[(text, index, old_hash, value)] = patched
+        _applied.move_to_end((text, index, old_hash, value))
+        while len(_applied) > CACHE_SIZE:
+            _applied.popitem(last=False)
+
+
+def apply_patch(text, index, old_hash, value):
+    """Text with statement `index` replaced by `value`
+
+    Raises `PatchConflict` if the statement does not hash to `old_hash`.
+    """
+    with _applied_lock:
+        patched = _applied.get((text, index, old_hash, value))
+    if patched is not None:
+        return patched
+
+    testcase = EdnTestCase(None, text)
+    try:
+        current_hash = testcase.statement_hash(index)
+    except IndexError:
+        current_hash = None
+    if current_hash != old_hash:
+        raise PatchConflict(f"Statement {index} changed since the patch was made")
+    testcase.update_statement(index, value)
+    record_patch(text, index, old_hash, value, testcase.text)
+    return testcase.text
+
+
+def apply_patches(text, patches):
+    for index, old_hash, value in patches:
+        text = apply_patch(text, index, old_hash, value)
+    return text
+
+
+__all__ = ["PatchConflict", "apply_patch", "apply_patches", "record_patch"]
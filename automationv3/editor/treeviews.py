@@ -1,6 +1,9 @@
 from pathlib import Path
+from collections import OrderedDict
 from contextlib import closing
 import json
+import os
+import threading
 
 
 def table_exists(conn, table_name):
@@ -16,6 +19,13 @@ def table_exists(conn, table_name):
 
 
 class Treeview:
+    """A tree of nodes and which of them are expanded
+
+    Expanded nodes are rows of `treeview_opened` keyed by the node's
+    path relative to the tree root. Toggling is a single insert or
+    delete and membership is read from a set loaded once per instance.
+    """
+
     def __init__(self, conn, id, factoryfn):
         self.conn = conn
         self.id = id
@@ -23,7 +33,7 @@ class Treeview:
 
         cursor = self.conn.execute(
             """
-            SELECT opened, root
+            SELECT root
             FROM treeviews
             WHERE id = ?
         """,
@@ -31,8 +41,8 @@ class Treeview:
         )
         row = cursor.fetchone()
 
-        self.root = factoryfn(row[1], root=None)
-        self.opened = [factoryfn(n, self.root) for n in json.loads(row[0])]
+        self.root = factoryfn(row[0], root=None)
+        self._opened = None
 
     @staticmethod
     def ensure_db(conn):
@@ -48,16 +58,47 @@ class Treeview:
             """
             )
             conn.commit()
+        if not table_exists(conn, "treeview_opened"):
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS treeview_opened(
+                    treeview_id INTEGER REFERENCES treeviews(id) ON DELETE CASCADE,
+                    relative_path TEXT NOT NULL,
+                    PRIMARY KEY (treeview_id, relative_path)
+                ) WITHOUT ROWID
+            """
+            )
+            Treeview.migrate_opened(conn)
+            conn.commit()
+
+    @staticmethod
+    def migrate_opened(conn):
+        """Moves opened nodes out of the old JSON `opened` column"""
+        rows = conn.execute(
+            "SELECT id, root, opened FROM treeviews WHERE opened IS NOT NULL"
+        ).fetchall()
+        for id, root, opened in rows:
+            for path in json.loads(opened):
+                path = Path(path)
+                if path.is_absolute():
+                    if not path.is_relative_to(root):
+                        continue
+                    path = path.relative_to(root)
+                conn.execute(
+                    "INSERT OR IGNORE INTO treeview_opened VALUES (?, ?)",
+                    (id, str(path)),
+                )
+        conn.execute("UPDATE treeviews SET opened = NULL")
 
     @staticmethod
     def create(conn, root, factoryfn):
         with closing(conn.cursor()) as c:
             c.execute(
                 """
-                INSERT INTO treeviews(opened, root)
-                VALUES (?, ?)
+                INSERT INTO treeviews(root)
+                VALUES (?)
             """,
-                (json.dumps([]), str(root)),
+                (str(root),),
             )
             id = c.lastrowid
             conn.commit()
@@ -66,36 +107,141 @@ class Treeview:
     def node(self, id):
         return self.factoryfn(id, self.root)
 
-    def toggle(self, node):
-        if node in self.opened:
-            self.opened.remove(node)
-        else:
-            self.opened.append(node)
-
-        opened_as_str = [str(i) for i in self.opened]
+    def key(self, node):
+        if not hasattr(node, "relative_path"):
+            node = self.node(node)
+        return str(node.relative_path)
 
-        with closing(self.conn.cursor()) as c:
-            c.execute(
+    @property
+    def opened(self):
+        """Relative paths of expanded nodes. Nodes compare equal to these"""
+        if self._opened is None:
+            cursor = self.conn.execute(
                 """
-                UPDATE treeviews
-                SET opened = ?
-                WHERE id = ?
+                SELECT relative_path
+                FROM treeview_opened
+                WHERE treeview_id = ?
             """,
-                (json.dumps(opened_as_str), self.id),
+                (self.id,),
             )
+            self._opened = {row[0] for row in cursor}
+        return self._opened
+
+    def is_opened(self, node):
+        key = self.key(node)
+        if self._opened is not None:
+            return key in self._opened
+
+        cursor = self.conn.execute(
+            """
+            SELECT 1
+            FROM treeview_opened
+            WHERE treeview_id = ? AND relative_path = ?
+        """,
+            (self.id, key),
+        )
+        return cursor.fetchone() is not None
+
+    def toggle(self, node):
+        key = self.key(node)
+        opened = self.is_opened(node)
+
+        with closing(self.conn.cursor()) as c:
+            if opened:
+                c.execute(
+                    """
+                    DELETE FROM treeview_opened
+                    WHERE treeview_id = ? AND relative_path = ?
+                """,
+                    (self.id, key),
+                )
+            else:
+                c.execute(
+                    """
+                    INSERT OR IGNORE INTO treeview_opened(treeview_id, relative_path)
+                    VALUES (?, ?)
+                """,
+                    (self.id, key),
+                )
             self.conn.commit()
 
+        if self._opened is not None:
+            if opened:
+                self._opened.discard(key)
+            else:
+                self._opened.add(key)
+
+
+# Directory listings kept, each valid while the directory's mtime holds
+LISTING_CACHE_SIZE = 64
+
+_listings = OrderedDict()
+_listings_lock = threading.Lock()
+
+
+def listing_order(entry):
+    """Directories first, then by name"""
+    name, is_dir = entry
+    return (not is_dir, name)
+
+
+def scan_directory(path):
+    """Sorted (name, is_dir) entries of a directory
+
+    Uses the entry types `os.scandir` already read, so listing does not
+    stat every child. Listings are cached until the directory changes.
+    """
+    key = str(path)
+    mtime = os.stat(path).st_mtime_ns
+    with _listings_lock:
+        cached = _listings.get(key)
+        if cached is not None and cached[0] == mtime:
+            _listings.move_to_end(key)
+            return cached[1]
+
+    with os.scandir(path) as it:
+        entries = sorted(((e.name, e.is_dir()) for e in it), key=listing_order)
+
+    with _listings_lock:
+        _listings[key] = (mtime, entries)
+        _listings.move_to_end(key)
+        while len(_listings) > LISTING_CACHE_SIZE:
+            _listings.popitem(last=False)
+    return entries
+
 
 class FilesystemTreeNode:
-    def __init__(self, pathstr, root):
+    def __init__(self, pathstr, root, is_dir=None):
         self.root = root or self
+        if root is None:
+            # set by the workspace when its files are being watched
+            self.watcher = None
 
         self.path = Path(pathstr)
         if not self.path.is_relative_to(self.root.path):
             self.path = (self.root.path / Path(pathstr)).resolve()
 
-    def children(self):
-        return [FilesystemTreeNode(path, self.root) for path in self.path.iterdir()]
+        self._is_dir = is_dir
+
+    def listing(self):
+        watcher = self.root.watcher
+        if watcher is not None:
+            entries = watcher.children(self.relative_path)
+            if entries is not None:
+                return entries
+        return scan_directory(self.path)
+
+    def children(self, offset=0, limit=None):
+        """Child nodes, directories first. Optionally a page of them"""
+        entries = self.listing()
+        end = None if limit is None else offset + limit
+        return [
+            FilesystemTreeNode(self.path / name, self.root, is_dir)
+            for name, is_dir in entries[offset:end]
+        ]
+
+    def child_count(self):
+        return len(self.listing())
 
     @property
     def name(self):
@@ -110,9 +256,13 @@ class FilesystemTreeNode:
         return self.relative_path == Path(".")
 
     def is_dir(self):
+        if self._is_dir is not None:
+            return self._is_dir
         return self.path.is_dir()
 
     def is_file(self):
+        if self._is_dir is not None:
+            return not self._is_dir
         return self.path.is_file()
 
     def __eq__(self, other):
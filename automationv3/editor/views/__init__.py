@@ -1,5 +1,6 @@
 from .editor import editor
 from .workspace import workspace
 from .commitlog import commitlog
+from .coverage import coverage
 
-__all__ = [editor, workspace, commitlog]
+__all__ = [editor, workspace, commitlog, coverage]
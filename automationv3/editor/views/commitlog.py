@@ -1,52 +1,11 @@
-import subprocess
-
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, abort
 
+from ..gitlog import get_commit_cache
 
 commitlog = Blueprint("commitlog", __name__, template_folder="templates")
 
-
-def get_files_for_commit(commit_hash):
-    cmd = ["git", "show", "--pretty=", "--name-only", commit_hash]
-    output = subprocess.check_output(cmd).decode("utf-8")
-    return output.splitlines()
-
-
-def get_author_for_commit(commit_hash):
-    cmd = ["git", "show", '--pretty="%an"', "-s", commit_hash]
-    output = subprocess.check_output(cmd).decode("utf-8")
-    return output.strip().strip('"')
-
-
-def get_commit_date(commit_hash):
-    cmd = ["git", "show", '--pretty="%cd"', "-s", commit_hash]
-    output = subprocess.check_output(cmd).decode("utf-8")
-    return output.strip().strip('"')
-
-
-def get_message_for_commit(commit_hash):
-    cmd = ["git", "show", '--pretty="%B"', "-s", commit_hash]
-    output = subprocess.check_output(cmd).decode("utf-8")
-    return output.strip().strip('"')
-
-
-def get_commit_log():
-    cmd = ["git", "log", '--format="%H"']
-    output = subprocess.check_output(cmd).decode("utf-8")
-
-    commits = {}
-
-    for commit_hash in output.splitlines():
-        commit_hash = commit_hash.strip('"')
-        commits[commit_hash] = {
-            "files": get_files_for_commit(commit_hash),
-            "author": get_author_for_commit(commit_hash),
-            "date": get_commit_date(commit_hash),
-            "message": get_message_for_commit(commit_hash),
-        }
-        commits[commit_hash]["title"] = commits[commit_hash]["message"].split("\n")[0]
-
-    return commits
+# Commits per page of the commit log
+PAGE_SIZE = 50
 
 
 def get_versions():
@@ -61,13 +20,23 @@ def get_versions():
 
 @commitlog.route("/")
 def list():
-    commits = get_commit_log()
+    page = max(request.args.get("page", 0, type=int), 0)
+
+    # one extra commit tells us whether there is a next page
+    commits = get_commit_cache().commits(skip=page * PAGE_SIZE, max_count=PAGE_SIZE + 1)
     versions = get_versions()
-    return render_template("commitlog.html", commitlog=commits, versions=versions)
+    return render_template(
+        "commitlog.html",
+        commitlog=commits[:PAGE_SIZE],
+        versions=versions,
+        page=page,
+        has_next=len(commits) > PAGE_SIZE,
+    )
 
 
 @commitlog.route("/details/<hash>")
 def details(hash):
-    commits = get_commit_log()
-    commit = commits[hash]
+    commit = get_commit_cache().get_commit(hash)
+    if commit is None:
+        abort(404)
     return render_template("partials/commitlog_detail.html", commit=commit)
@@ -0,0 +1,80 @@
+from flask import Blueprint, jsonify, render_template, request
+
+from ..coverage import OVER_COVERED, refresh_coverage
+from ..templates import template_root
+from ..workspace import get_workspaces
+from ...requirements.views import wants_json
+
+coverage = Blueprint("coverage", __name__, template_folder=template_root)
+
+
+def rate(covered, total):
+    return covered / total if total else 0.0
+
+
+@coverage.route("/<path:id>", methods=["GET"])
+def report(id):
+    """Requirement coverage of a workspace's procedures
+
+    Only procedures changed since the last report are parsed. Answers
+    JSON, with the full requirement x procedure matrix, to clients that
+    prefer it.
+    """
+    workspace = get_workspaces(id)
+    workspace_coverage = refresh_coverage(workspace)
+
+    selected_subsystem = request.args.get("subsystem")
+    threshold = request.args.get("over", OVER_COVERED, type=int)
+
+    subsystems = [
+        {
+            "subsystem": subsystem,
+            "requirements": total,
+            "covered": covered,
+            "rate": rate(covered, total),
+        }
+        for subsystem, total, covered in workspace_coverage.subsystems()
+    ]
+    total = sum(s["requirements"] for s in subsystems)
+    covered = sum(s["covered"] for s in subsystems)
+    summary = {
+        "procedures": workspace_coverage.procedure_count(),
+        "requirements": total,
+        "covered": covered,
+        "rate": rate(covered, total),
+    }
+    uncovered = [
+        {"id": id, "text": text, "subsystem": subsystem}
+        for id, text, subsystem in workspace_coverage.uncovered(selected_subsystem)
+    ]
+    over_covered = [
+        {"id": id, "procedures": count}
+        for id, count in workspace_coverage.over_covered(threshold)
+    ]
+    unknown = [
+        {"id": id, "procedures": count} for id, count in workspace_coverage.unknown()
+    ]
+
+    if wants_json():
+        return jsonify(
+            {
+                "summary": summary,
+                "subsystems": subsystems,
+                "uncovered": uncovered,
+                "over_covered": over_covered,
+                "unknown": unknown,
+                "matrix": workspace_coverage.matrix(),
+            }
+        )
+
+    return render_template(
+        "coverage.html",
+        workspace=workspace,
+        summary=summary,
+        subsystems=subsystems,
+        selected_subsystem=selected_subsystem,
+        uncovered=uncovered,
+        over_covered=over_covered,
+        threshold=threshold,
+        unknown=unknown,
+    )
@@ -1,15 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import json
-from flask import Blueprint, render_template, request, abort, make_response
+from flask import (
+    Blueprint,
+    render_template,
+    stream_template,
+    request,
+    abort,
+    make_response,
+)
+from sqlalchemy.exc import OperationalError
 
 from ..editor import get_editor
-from ..workspace import get_workspaces
+from ..workspace import find_workspace_root
 from ..document import get_document
+from ..largefile import LINE_PAGE_SIZE, get_line_index
 
 from automationv3.framework import edn
-from automationv3.database import get_db
+from automationv3.database import db
+from automationv3.httpcache import (
+    IMMUTABLE,
+    REVALIDATE,
+    make_etag,
+    not_modified,
+    tagged,
+)
 from automationv3.jobqueue import sqlqueue
+from automationv3.jobqueue.aioqueue import wake_waiters
+from automationv3.jobqueue.objectstore import get_object_store
+from automationv3.jobqueue.scheduler import Requirements
 from automationv3.framework.testcase import EdnTestCase
+from automationv3.requirements.models import Requirement
 
 editor = Blueprint("editor", __name__, template_folder="templates")
 
@@ -34,9 +55,7 @@ def open_document(id):
     editor = get_editor(id)
 
     # For now a path must be within one of our workspaces
-    root = next(
-        (ws.root for ws in get_workspaces() if path.is_relative_to(ws.root)), None
-    )
+    root = find_workspace_root(path)
     if root is None:
         abort(404)
 
@@ -77,6 +96,22 @@ def update_tabs(id, document_id):
 visual_editors = {"application/rvt+edn": "partials/editor_rvt.html"}
 
 
+def requirements_version():
+    """Version of the requirements `:req:` references render"""
+    try:
+        with db.session as session:
+            return Requirement.table_version(session)
+    except (RuntimeError, OperationalError):
+        # outside of the app or without a requirements table, references
+        # render without text
+        return None
+
+
+def content_version(document):
+    """Changes whenever anything the document's rendering reads does"""
+    return make_etag(document.id, document.revision, requirements_version())
+
+
 @editor.route("<id>/content", methods=["GET"])
 def content(id):
     editor = get_editor(id)
@@ -87,9 +122,26 @@ def content(id):
     if not active_document:
         return make_response("")
 
+    version = content_version(active_document)
+    etag = make_etag(request.full_path, version, json.dumps(active_document.meta))
+    if (response := not_modified(etag)) is not None:
+        return response
+
     supports_visual = active_document.mime in visual_editors
     raw = active_document.meta.get("raw", False)
 
+    if active_document.is_large:
+        page = render_template(
+            "partials/editor_large.html",
+            id=id,
+            editor=editor,
+            document=active_document,
+            index=get_line_index(active_document.path),
+            start=0,
+            page_size=LINE_PAGE_SIZE,
+        )
+        return tagged(page, etag)
+
     if raw:
         template = "partials/editor.html"
     elif active_document.mime == "application/rvt+edn":
@@ -98,7 +150,7 @@ def content(id):
     else:
         template = "partials/editor.html"
 
-    return render_template(
+    page = render_template(
         template,
         id=id,
         editor=editor,
@@ -107,6 +159,77 @@ def content(id):
         raw=raw,
         supports_visual=supports_visual,
         testcase=testcase,
+        batch_size=SECTION_BATCH_SIZE,
+        version=version,
+    )
+    return tagged(page, etag)
+
+
+# Sections requested at once when a test case is opened
+SECTION_BATCH_SIZE = 25
+
+# Most sections rendered for one request
+MAX_SECTION_BATCH = 200
+
+
+@editor.route("<id>/content-sections", methods=["GET"])
+def sections(id):
+    """Renders a batch of sections, streamed as they render
+
+    Either `start` and `count` or a comma separated list of `sections`.
+    Requested with the `content_version` as `v` the batch never changes.
+    """
+    editor = get_editor(id)
+    document = editor.active_document
+    if document is None:
+        abort(404)
+
+    version = content_version(document)
+    etag = make_etag(request.full_path, version)
+    cache_control = IMMUTABLE if request.args.get("v") == version else REVALIDATE
+    if (response := not_modified(etag, cache_control)) is not None:
+        return response
+
+    testcase = EdnTestCase(document.path.name, document.content)
+    statement_count = len(testcase.spans)
+
+    if "sections" in request.args:
+        try:
+            indices = [int(i) for i in request.args["sections"].split(",") if i]
+        except ValueError:
+            abort(400)
+    else:
+        start = max(request.args.get("start", 0, type=int), 0)
+        count = request.args.get("count", SECTION_BATCH_SIZE, type=int)
+        count = min(max(count, 0), MAX_SECTION_BATCH)
+        indices = range(start, min(start + count, statement_count))
+    indices = [i for i in indices if 0 <= i < statement_count][:MAX_SECTION_BATCH]
+
+    page = stream_template(
+        "partials/editor_rvt_section.html",
+        id=id,
+        editor=editor,
+        testcase=testcase,
+        document=document,
+        sections=indices,
+    )
+    return tagged(page, etag, cache_control)
+
+
+@editor.route("<id>/lines/<document_id>", methods=["GET"])
+def lines(id, document_id):
+    """A page of a large document's lines"""
+    document = get_document(document_id)
+    if document.path is None or not document.path.exists():
+        abort(404)
+
+    return render_template(
+        "partials/editor_lines.html",
+        id=id,
+        document=document,
+        index=get_line_index(document.path),
+        start=max(request.args.get("start", 0, type=int), 0),
+        page_size=LINE_PAGE_SIZE,
     )
 
 
@@ -121,6 +244,11 @@ def section(id):
 
     editor = get_editor(id)
     document = editor.active_document
+
+    etag = make_etag(request.full_path, content_version(document))
+    if (response := not_modified(etag)) is not None:
+        return response
+
     testcase = EdnTestCase(document.path.name, document.content)
 
     if section == -1:  # add new section
@@ -131,7 +259,7 @@ def section(id):
     else:
         template = "partials/editor_rvt_section.html"
 
-    return render_template(
+    page = render_template(
         template,
         id=id,
         editor=editor,
@@ -140,6 +268,7 @@ def section(id):
         section=section,
         sections=[section if updated == -1 else updated],
     )
+    return tagged(page, etag)
 
 
 @editor.route("<id>/content/<document_id>", methods=["POST"])
@@ -162,6 +291,9 @@ def update_content(id, document_id):
     elif action == "view-visual":
         document.set_meta("raw", False)
         triggers.add("editor-content-update")
+    elif action == "undo":
+        if document.undo():
+            triggers.update(["tab-action", "editor-content-update"])
     else:
         abort(404)
 
@@ -181,8 +313,11 @@ def update_testcase(id, document_id):
 
     triggers = {"tab-action": "save-draft"}
 
+    # only the edit is stored, not the whole re-serialized test case
+    old_hash = testcase.statement_hash(section)
     modified, shifted = testcase.update_statement(section, value)
-    document.save_draft(testcase.text)
+    document.save_patch(section, old_hash, value, testcase.text)
+    testcase.render(modified)
 
     triggers["updated-section"] = {"updated": {o: n for o, n in shifted}}
 
@@ -201,9 +336,35 @@ def update_testcase(id, document_id):
     return resp
 
 
+# Workspaces are snapshotted one at a time, off the request threads
+snapshots = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot")
+
+
+def queue_job(queue_path, job, requires, store=None, root=None):
+    """Snapshots the workspace at `root` into `store` and queues `job`
+
+    Hashing and storing a workspace reads every file changed since the
+    last snapshot, so it runs on `snapshots` rather than in the request.
+    """
+    try:
+        tree = None
+        if root is not None:
+            tree = store.write_tree(root)
+            job["tree"] = tree
+
+        q = sqlqueue.SQLPriorityQueue(queue_path)
+        try:
+            q.put(edn.writes(job), requires=requires.dumps(), tree=tree)
+        finally:
+            q.conn.close()
+        wake_waiters(queue_path)
+    except Exception as e:
+        print("Queueing test failed:", e)
+        raise
+
+
 @editor.route("<id>/run_test/<document_id>", methods=["POST"])
 def run_test(id, document_id):
-    q = sqlqueue.SQLPriorityQueue(get_db())
     document = get_document(document_id)
 
     # This is where we would actually create a job
@@ -218,6 +379,16 @@ def run_test(id, document_id):
         "body": document.content,
     }
 
-    q.put(edn.writes(job))
+    # Ship the workspace as it is on disk so WIP code can be tested.
+    # Unchanged files are neither rehashed nor stored again.
+    store = None
+    path = Path(document.path)
+    root = find_workspace_root(path)
+    if root is not None:
+        store = get_object_store()
+        job["path"] = str(path.relative_to(root))
+
+    requires = Requirements.for_testcase(document.content)
+    snapshots.submit(queue_job, db.get_connection_str(), job, requires, store, root)
 
-    return make_response("SUCCESS", 200)
+    return make_response("QUEUED", 202)
@@ -1,13 +1,36 @@
 from pathlib import Path
 import re
 import json
-from flask import Blueprint, render_template, request, abort, make_response
+import queue
+import threading
+import time
+from flask import Blueprint, Response, render_template, request, abort, make_response
 
 from ..templates import template_root
 from ..workspace import get_workspaces
+from ..watcher import get_watcher
 
 workspace = Blueprint("workspace", __name__, template_folder=template_root)
 
+# Children of a directory rendered per request
+TREE_PAGE_SIZE = 200
+
+# An open event stream holds a server thread for as long as it lasts.
+# Streams beyond this many are refused with a 503 and the browser retries
+# later, so the remaining threads keep serving ordinary requests.
+MAX_EVENT_STREAMS = 16
+
+# Seconds an event stream stays open before the browser reconnects
+EVENT_STREAM_TIMEOUT = 300
+
+# Milliseconds the browser waits before reconnecting (the SSE `retry:`)
+EVENT_STREAM_RETRY = 10_000
+
+# Seconds between keepalive comments on an idle event stream
+EVENT_STREAM_KEEPALIVE = 15
+
+event_streams = threading.BoundedSemaphore(MAX_EVENT_STREAMS)
+
 
 @workspace.route("/<path:path>", methods=["GET"])
 def index(path):
@@ -16,10 +39,61 @@ def index(path):
     editor = workspace.editors()
 
     return render_template(
-        "workspace.html", workspaces=workspaces, workspace=workspace, editor=editor
+        "workspace.html",
+        workspaces=workspaces,
+        workspace=workspace,
+        editor=editor,
+        watching=get_watcher(workspace.root) is not None,
     )
 
 
+@workspace.route("<id>/events", methods=["GET"])
+def events(id):
+    """Server-sent events for files changing in a workspace
+
+    Bursts of changes are sent as one `fs-change` event carrying a list.
+    """
+    ws = get_workspaces(id)
+    watcher = get_watcher(ws.root)
+    if watcher is None:
+        abort(404)
+
+    if not event_streams.acquire(blocking=False):
+        response = make_response("Too many event streams", 503)
+        response.headers["Retry-After"] = str(EVENT_STREAM_RETRY // 1000)
+        return response
+
+    subscriber = watcher.subscribe()
+
+    def stream():
+        yield f"retry: {EVENT_STREAM_RETRY}\n\n"
+        deadline = time.monotonic() + EVENT_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                changes = [subscriber.get(timeout=EVENT_STREAM_KEEPALIVE)]
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+
+            while not subscriber.empty():
+                changes.append(subscriber.get_nowait())
+            yield f"event: fs-change\ndata: {json.dumps(changes)}\n\n"
+
+    def close():
+        watcher.unsubscribe(subscriber)
+        event_streams.release()
+
+    # no-transform keeps proxies and the gzip middleware from buffering events
+    response = Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache, no-transform"},
+    )
+    # called by the server even if the stream never started
+    response.call_on_close(close)
+    return response
+
+
 # TreeView
 @workspace.app_template_filter()
 def is_dir(paths):
@@ -59,6 +133,30 @@ def tree(path):
         workspace=workspace,
         node=fstree.node(path),
         opened=fstree.opened,
+        page_size=TREE_PAGE_SIZE,
+    )
+
+
+@workspace.route("/children", defaults={"path": ""}, methods=["GET"])
+@workspace.route("/children/<path:path>", methods=["GET"])
+def tree_children(path):
+    """A further page of a directory's children"""
+    workspace_id = request.args.get("workspace_id")
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    workspace = get_workspaces(workspace_id)
+    fstree = workspace.filesystem_tree()
+
+    if not (workspace.root / path).resolve().is_relative_to(workspace.root):
+        abort(404)
+
+    path = (workspace.root / path).resolve().relative_to(workspace.root)
+    return render_template(
+        "partials/treechildren.html",
+        workspace=workspace,
+        node=fstree.node(path),
+        opened=fstree.opened,
+        offset=offset,
+        page_size=TREE_PAGE_SIZE,
     )
 
 
@@ -0,0 +1,383 @@
+"""Workspace filesystem watcher
+
+Keeps an in-memory index of every directory in a workspace (entry names,
+whether they are directories and their mtimes) so tree rendering and
+modified-on-disk checks do not touch the filesystem.
+
+On Linux the index is kept current with inotify (through ctypes, no
+extra dependency). Elsewhere, or when inotify is unavailable, the tree
+is rescanned every `poll_interval` seconds. Directories inotify refuses
+to watch (e.g. once `max_user_watches` is reached) are polled the same
+way. Both only ever ask for a directory to be rescanned, the index is
+updated by diffing the new scan with the old one.
+
+Changes are published to subscribers as `created`, `deleted` and
+`modified` events which the editor receives as server-sent events.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+
+from flask import current_app
+
+log = logging.getLogger(__name__)
+
+IGNORED = {".git", "__pycache__"}
+
+# Events buffered per subscriber before newer ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def join(rel, name):
+    return f"{rel}/{name}" if rel else name
+
+
+class Inotify:
+    """Minimal inotify binding"""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (
+        IN_MODIFY
+        | IN_ATTRIB
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+        | IN_MOVE_SELF
+        | IN_ONLYDIR
+    )
+
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not supported")
+
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(path), ctypes.c_uint32(self.WATCH_MASK)
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Can not watch {path}")
+        return wd
+
+    def read(self, timeout):
+        """Returns (wd, mask, name) events, waiting up to `timeout`"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WorkspaceWatcher:
+    def __init__(self, root, poll_interval=2.0, use_inotify=True):
+        self.root = Path(root)
+        self.poll_interval = poll_interval
+
+        self.lock = threading.RLock()
+        # relative directory -> {name: (is_dir, st_mtime)}
+        self.dirs = {}
+        # sorted children, dropped whenever a directory is rescanned
+        self.listings = {}
+        self.subscribers = []
+
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError):
+                self.inotify = None
+        self.watches = {}
+        # directories inotify could not watch, polled instead
+        self.unwatched = set()
+
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @property
+    def backend(self):
+        return "inotify" if self.inotify is not None else "polling"
+
+    def start(self):
+        """Indexes the workspace and starts watching it"""
+        with self.lock:
+            self._index_tree("")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.inotify is not None:
+            self.inotify.close()
+
+    def relative(self, path):
+        path = Path(path)
+        if path.is_absolute():
+            path = path.relative_to(self.root)
+        rel = path.as_posix()
+        return "" if rel == "." else rel
+
+    def children(self, path=""):
+        """(name, is_dir) entries of a directory, directories first
+
+        None if the directory is not indexed.
+        """
+        rel = self.relative(path)
+        with self.lock:
+            if rel in self.listings:
+                return self.listings[rel]
+
+            entries = self.dirs.get(rel)
+            if entries is None:
+                return None
+            listing = sorted(
+                ((name, is_dir) for name, (is_dir, _) in entries.items()),
+                key=lambda entry: (not entry[1], entry[0]),
+            )
+            self.listings[rel] = listing
+            return listing
+
+    def mtime(self, path):
+        """st_mtime of an indexed file or None"""
+        try:
+            rel = self.relative(path)
+        except ValueError:
+            return None
+
+        parent, _, name = rel.rpartition("/")
+        with self.lock:
+            entry = self.dirs.get(parent, {}).get(name)
+        return entry[1] if entry is not None else None
+
+    def refresh(self, path):
+        """Rescans the directory containing `path` right away
+
+        For callers that just changed a file and must not see the index
+        lag behind.
+        """
+        parent = self.relative(path).rpartition("/")[0]
+        with self.lock:
+            self._refresh_dir(parent)
+
+    def subscribe(self, subscriber=None):
+        """Sends change events to `subscriber`, a bounded queue by default
+
+        Anything with a `put_nowait(event)` is a subscriber.
+        """
+        if subscriber is None:
+            subscriber = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def _publish(self, type, path, is_dir):
+        event = {"type": type, "path": path, "is_dir": is_dir}
+        for subscriber in self.subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+    def _scan(self, rel):
+        entries = {}
+        try:
+            with os.scandir(self.root / rel) as it:
+                for entry in it:
+                    if entry.name in IGNORED:
+                        continue
+                    try:
+                        entries[entry.name] = (entry.is_dir(), entry.stat().st_mtime)
+                    except FileNotFoundError:
+                        # broken symlink or already deleted
+                        entries[entry.name] = (False, None)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return entries
+
+    def _index_tree(self, rel):
+        entries = self._scan(rel)
+        if entries is None:
+            return
+        self.dirs[rel] = entries
+        self.listings.pop(rel, None)
+        if self.inotify is not None:
+            try:
+                self.watches[self.inotify.add_watch(self.root / rel)] = rel
+            except OSError as e:
+                if not self.unwatched:
+                    log.warning(
+                        "Can not watch %s (%s), polling it and any other"
+                        " unwatchable directory every %ss",
+                        self.root / rel,
+                        e,
+                        self.poll_interval,
+                    )
+                self.unwatched.add(rel)
+
+        for name, (is_dir, _) in entries.items():
+            if is_dir:
+                self._index_tree(join(rel, name))
+
+    def _drop_tree(self, rel):
+        for path in [d for d in self.dirs if d == rel or d.startswith(rel + "/")]:
+            del self.dirs[path]
+            self.listings.pop(path, None)
+            self.unwatched.discard(path)
+
+    def _refresh_dir(self, rel):
+        if rel not in self.dirs:
+            return
+
+        old = self.dirs[rel]
+        new = self._scan(rel)
+        if new is None:
+            self._drop_tree(rel)
+            return
+        self.dirs[rel] = new
+        if new != old:
+            self.listings.pop(rel, None)
+
+        for name in old.keys() - new.keys():
+            self._removed(join(rel, name), old[name][0])
+
+        for name in new.keys() - old.keys():
+            self._added(join(rel, name), new[name][0])
+
+        for name in new.keys() & old.keys():
+            (was_dir, old_mtime), (is_dir, mtime) = old[name], new[name]
+            if was_dir != is_dir:
+                self._removed(join(rel, name), was_dir)
+                self._added(join(rel, name), is_dir)
+            elif not is_dir and mtime != old_mtime:
+                self._publish("modified", join(rel, name), False)
+
+    def _added(self, path, is_dir):
+        if is_dir:
+            self._index_tree(path)
+        self._publish("created", path, is_dir)
+
+    def _removed(self, path, was_dir):
+        if was_dir:
+            self._drop_tree(path)
+        self._publish("deleted", path, was_dir)
+
+    def _run(self):
+        if self.inotify is not None:
+            self._run_inotify()
+        else:
+            self._run_polling()
+
+    def _run_inotify(self):
+        next_poll = time.monotonic() + self.poll_interval
+        while not self.stopped.is_set():
+            events = self.inotify.read(timeout=min(0.5, self.poll_interval))
+
+            changed = set()
+            with self.lock:
+                for wd, mask, name in events:
+                    if mask & Inotify.IN_Q_OVERFLOW:
+                        changed.update(self.dirs)
+                    elif mask & Inotify.IN_IGNORED:
+                        self.watches.pop(wd, None)
+                    elif wd in self.watches:
+                        changed.add(self.watches[wd])
+
+                if time.monotonic() >= next_poll:
+                    changed.update(self.unwatched)
+                    next_poll = time.monotonic() + self.poll_interval
+
+                # parents first so removed subtrees are not rescanned
+                for rel in sorted(changed, key=lambda d: d.count("/")):
+                    self._refresh_dir(rel)
+
+    def _run_polling(self):
+        while not self.stopped.wait(self.poll_interval):
+            with self.lock:
+                for rel in sorted(self.dirs, key=lambda d: d.count("/")):
+                    self._refresh_dir(rel)
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def get_watcher(root):
+    """Started watcher of a workspace, None unless `WATCH_WORKSPACES` is set"""
+    if not current_app.config.get("WATCH_WORKSPACES"):
+        return None
+
+    root = Path(root)
+    with _watchers_lock:
+        if root not in _watchers:
+            _watchers[root] = WorkspaceWatcher(root).start()
+        return _watchers[root]
+
+
+def watcher_for(path):
+    """Running watcher of the workspace containing `path` or None"""
+    path = Path(path)
+    with _watchers_lock:
+        return next(
+            (w for root, w in _watchers.items() if path.is_relative_to(root)), None
+        )
+
+
+__all__ = ["WorkspaceWatcher", "get_watcher", "watcher_for"]
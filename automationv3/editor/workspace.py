@@ -1,13 +1,16 @@
 from pathlib import Path
 from contextlib import closing
 import subprocess
+import threading
+import time
 
 from flask import current_app, abort
 
 from .treeviews import Treeview, FilesystemTreeNode
 from .editor import Editor
+from .watcher import get_watcher
 
-from ..database import get_db
+from ..database import get_db, db
 
 
 # Helpers
@@ -61,7 +64,7 @@ class Workspace:
             )
             conn.commit()
 
-    def __init__(self, id, conn, workspace_root):
+    def __init__(self, id, conn, workspace_root, ensure=True):
         self.id = id
         self.conn = conn
 
@@ -71,7 +74,8 @@ class Workspace:
         self._editors = None
         self._filesystem_tree = None
 
-        self.ensure_self()
+        if ensure:
+            self.ensure_self()
 
     def ensure_self(self):
         cursor = self.conn.execute(
@@ -160,33 +164,137 @@ class Workspace:
             )
             row = cursor.fetchone()
             self._filesystem_tree = Treeview(self.conn, row[0], FilesystemTreeNode)
+            self._filesystem_tree.root.watcher = get_watcher(self.root)
         return self._filesystem_tree
 
 
+def parse_worktrees(output):
+    """Maps branch name to workspace root from `git worktree list --porcelain`
+
+    Worktrees without a branch (bare or detached) have no workspace.
+    """
+    worktrees = {}
+    for record in output.strip().split("\n\n"):
+        fields = dict(
+            line.split(" ", 1) if " " in line else (line, None)
+            for line in record.splitlines()
+        )
+        branch = fields.get("branch")
+        if "worktree" in fields and branch:
+            name = branch[len("refs/heads/") :]
+            worktrees[name] = Path(fields["worktree"]) / "rvts"
+    return worktrees
+
+
+class WorktreeRegistry:
+    """Worktrees of a repository, cached between requests
+
+    Listing worktrees forks git so the listing is kept until the
+    repository's worktree metadata changes. Adding or removing a
+    worktree touches `<git dir>/worktrees` and switching branch rewrites
+    a `HEAD` file, so their mtimes are checked on every lookup. The
+    listing is also refreshed after `ttl` seconds in case a change is
+    missed.
+    """
+
+    TTL = 30
+
+    def __init__(self, root, ttl=TTL):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        self._git_dir = None
+        self._fingerprint = None
+        self._loaded_at = None
+        self._worktrees = {}
+
+        # workspaces whose database rows are known to exist
+        self.ensured = set()
+
+    def git_dir(self):
+        if self._git_dir is None:
+            output = subprocess.check_output(
+                ["git", "rev-parse", "--git-common-dir"], cwd=self.root
+            )
+            self._git_dir = (self.root / output.decode("utf-8").strip()).resolve()
+        return self._git_dir
+
+    def fingerprint(self):
+        git_dir = self.git_dir()
+        paths = [git_dir / "HEAD", git_dir / "worktrees"]
+        try:
+            paths.extend(p / "HEAD" for p in (git_dir / "worktrees").iterdir())
+        except FileNotFoundError:
+            pass
+
+        fingerprint = []
+        for path in paths:
+            try:
+                fingerprint.append((str(path), path.stat().st_mtime_ns))
+            except FileNotFoundError:
+                pass
+        return tuple(fingerprint)
+
+    def worktrees(self):
+        with self.lock:
+            fingerprint = self.fingerprint()
+            expired = (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at > self.ttl
+            )
+            if expired or fingerprint != self._fingerprint:
+                output = subprocess.check_output(
+                    ["git", "worktree", "list", "--porcelain"], cwd=self.root
+                )
+                self._worktrees = parse_worktrees(output.decode("utf-8"))
+                self._fingerprint = fingerprint
+                self._loaded_at = time.monotonic()
+            return dict(self._worktrees)
+
+    def workspace(self, conn, id, worktree_root):
+        ensure = id not in self.ensured
+        workspace = Workspace(id, conn, worktree_root, ensure=ensure)
+        self.ensured.add(id)
+        return workspace
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_worktree_registry():
+    # rows are ensured per database
+    key = (str(current_app.config["WORKSPACE_PATH"]), str(db.get_connection_str()))
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = WorktreeRegistry(key[0])
+        return _registries[key]
+
+
+def find_workspace_root(path):
+    """Root of the workspace containing `path` or None"""
+    worktrees = get_worktree_registry().worktrees()
+    return next(
+        (root for root in worktrees.values() if Path(path).is_relative_to(root)), None
+    )
+
+
 def get_workspaces(id=None):
     conn = get_db()
-    root = current_app.config["WORKSPACE_PATH"]
+    registry = get_worktree_registry()
 
     # A workspace id is the branch name of the git repo pointed
     # to at the root
-    output = subprocess.check_output(
-        ["git", "worktree", "list", "--porcelain"], cwd=root
-    )
-    output = output.decode("utf-8").splitlines()
-    output = zip(output[::4], output[1::4], output[2::4], output[3::4])
-    worktrees = {}
-    for worktree, head, branch, _ in output:
-        worktree_root = Path(worktree[len("worktree") + 1 :]) / "rvts"
-        name = branch[len("branch refs/heads/") :]
-        worktrees[name] = worktree_root
+    worktrees = registry.worktrees()
 
     if id is None:
         return [
-            Workspace(id, conn, worktree_root)
+            registry.workspace(conn, id, worktree_root)
             for id, worktree_root in worktrees.items()
         ]
 
     if id in worktrees:
-        return Workspace(id, conn, worktrees[id])
+        return registry.workspace(conn, id, worktrees[id])
 
     abort(404)
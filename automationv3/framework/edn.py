@@ -51,7 +51,11 @@ import io
 from collections import abc
 
 
-class ParseError(Exception):
+class ReadError(Exception):
+    """Text that is not valid EDN"""
+
+
+class ParseError(ReadError):
     def __init__(self, msg, line_info):
         super().__init__(f"{msg} (line: {line_info[0]}, col: {line_info[1]})")
         self.line = line_info[0]
@@ -65,6 +69,8 @@ class PushBackCharStream:
         self.pushed_back = []
         self.line = 0
         self.col = 0
+        # characters read so far
+        self.offset = 0
         self.line_history = [0]
         self.__reached_end = False
 
@@ -85,6 +91,7 @@ class PushBackCharStream:
                 return None
 
         # advanced character position
+        self.offset += 1
         if char == "\n":
             self.line += 1
             self.col = 0
@@ -105,6 +112,7 @@ class PushBackCharStream:
         self.pushed_back.append(char)
 
         # Reverse the position
+        self.offset -= 1
         if self.col == 0:
             self.line -= 1
             self.col = self.line_history[self.line]
@@ -278,7 +286,7 @@ invalid_namespace = re.compile(r".*:$")
 def parse_symbol(token):
     "Parses a string into a tuple of the namespace and symbol"
     if not token or invalid_token.match(token):
-        raise Exception("Invalid symbol: '{}'".format(token))
+        raise ReadError("Invalid symbol: '{}'".format(token))
 
     # If no namespace just return None as ns and token as symbol
     if token == "/" or "/" not in token:
@@ -293,7 +301,7 @@ def parse_symbol(token):
         and (sym == "/" or "/" not in sym)
     ):
         return ns, sym
-    raise Exception("Invalid symbol: '{}'".format(token))
+    raise ReadError("Invalid symbol: '{}'".format(token))
 
 
 def read_token(stream, initch):
@@ -324,7 +332,7 @@ def read_string(stream, initch):
         elif ch == "\\":
             s += escape_char(stream)
         elif ch is None:
-            raise Exception("EOF in middle of string")
+            raise ReadError("EOF in middle of string")
         else:
             s += ch
     return s
@@ -353,7 +361,7 @@ def escape_char(stream):
         stream.push_back(ch)
         ch = read_unicode_char(stream, base=8, length=3)
     else:
-        raise Exception("Invalid escape '\\{}'".format(ch))
+        raise ReadError("Invalid escape '\\{}'".format(ch))
     return ch
 
 
@@ -366,22 +374,22 @@ def read_unicode_char(stream, base, length):
     for _ in range(length):
         ch = next(stream)
         if not is_numeric(ch, base=base):
-            raise Exception("Invalid unicode escape '{}'".format(ch))
+            raise ReadError("Invalid unicode escape '{}'".format(ch))
         unicode_bytes += bytes(ch, "utf-8")
 
     try:
         return unicode_bytes.decode("unicode-escape")
     except UnicodeError:
-        raise Exception("Invalid unicode escape '{}'".format(unicode_bytes))
+        raise ReadError("Invalid unicode escape '{}'".format(unicode_bytes))
 
 
 def read_char(stream, initch):
     ch = next(stream)
     if ch is None:
-        raise Exception("EOF in character")
+        raise ReadError("EOF in character")
 
     if is_whitespace(ch):
-        raise Exception("Backslash cannot be followed by whitespace")
+        raise ReadError("Backslash cannot be followed by whitespace")
 
     if is_ending(ch):
         token = ch
@@ -409,7 +417,7 @@ def read_char(stream, initch):
         stream.push_back(token[1:])
         ch = read_unicode_char(stream, base=8, length=len(token) - 1)
     else:
-        raise Exception("Invalid character escape '{}'".format(token))
+        raise ReadError("Invalid character escape '{}'".format(token))
 
     return ch
 
@@ -418,14 +426,14 @@ def read_keyword(stream, initch):
     starting_info = stream.starting_line_col_info()
 
     ch = next(stream)
-    if is_whitespace(ch):
-        raise Exception("Single colon not allowed")
+    if ch is None or is_whitespace(ch):
+        raise ReadError("Single colon not allowed")
 
     token = read_token(stream, ch)
     ns, kw = parse_symbol(token)
 
     if ns is not None and ns.startswith(":"):
-        raise Exception("Namespace alias not supported")
+        raise ReadError("Namespace alias not supported")
 
     keyword = Keyword(kw, ns)
 
@@ -533,7 +541,7 @@ def read_delimited(stream, initch, sentinel):
     while True:
         form = read(stream, sentinel)
         if form == READ_EOF:
-            raise Exception("EOF in middle of list")
+            raise ReadError("EOF in middle of list")
         elif form == READ_FINISHED:
             return forms
         elif form == stream:
@@ -586,7 +594,7 @@ def read_dispatch(stream, initch):
     ch = next(stream)
     if ch in dispatch_macros:
         return dispatch_macros[ch](stream, ch)
-    raise Exception("Invalid Dispatch")
+    raise ReadError("Invalid Dispatch")
 
 
 def read_set(stream, initch):
@@ -652,6 +660,8 @@ def read(stream_or_str, sentinel=None):
             continue
         if ch == sentinel:
             return READ_FINISHED
+        if ch in ")]}":
+            raise ReadError(f"Unmatched '{ch}'")
 
         # Possibly need 1 lookahead
         lookahead = next(stream)
@@ -694,6 +704,34 @@ def read_all(text):
         return
 
 
+def read_all_spans(text):
+    """Reads EDN yielding (form, start, end) of every top-level form
+
+    `text[start:end]` is the text the form was read from, without the
+    whitespace and comments around it.
+    """
+    stream = PushBackCharStream(text)
+    while True:
+        ch = next(stream, None)
+        if ch is None:
+            return
+        if is_whitespace(ch):
+            continue
+        if ch == ";":
+            read_comment(stream, ch)
+            continue
+
+        stream.push_back(ch)
+        start = stream.offset
+        form = read(stream)
+
+        # symbols and numbers consume the whitespace ending them
+        end = stream.offset
+        while end > start and is_whitespace(text[end - 1]):
+            end -= 1
+        yield form, start, end
+
+
 # Write functions
 # This is trickier than it looks to get it to output
 # clean looking code.
@@ -1,7 +1,9 @@
-from .block import BuildingBlock
+from .block import BuildingBlock, BlockResult, find_block
+from . import edn
 
 import automationv3.plugins
 
+import contextvars
 import importlib
 import pkgutil
 
@@ -16,9 +18,45 @@ discovered_plugins = {
 }
 
 
-def execute_text(text, observer):
+# Directory holding the filesystem tree of the test being executed.
+# Blocks that need files from the tree resolve them against this, jobs
+# share the worker process so its cwd can not be used.
+working_directory = contextvars.ContextVar("working_directory", default=None)
+
+
+def execute_text(text, observer, workdir=None):
+    """Executes the building blocks of an edn test case in order
+
+    Strings are documentation and are reported to the observer as
+    comments. Lists are looked up as building blocks and executed.
+    Returns True if every block passed. `workdir` is the test's
+    `working_directory` while it runs.
+    """
+    token = working_directory.set(workdir)
+    try:
+        return _execute_forms(text, observer)
+    finally:
+        working_directory.reset(token)
+
+
+def _execute_forms(text, observer):
     observer.on_test_begin()
-    observer.on_test_end()
+
+    passed = True
+    for index, form in enumerate(edn.read_all(text) or []):
+        if isinstance(form, str):
+            observer.on_comment(form)
+        elif isinstance(form, list) and len(form) > 0:
+            observer.on_step_start(index, form)
+            if block := find_block(form):
+                result = block.execute()
+            else:
+                result = BlockResult(False, stderr=f"Unknown block: {form[0]}")
+            observer.on_step_end(index, form, result)
+            passed = passed and bool(result)
+
+    observer.on_test_end(passed)
+    return passed
 
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ import docutils.core
 from docutils import writers, nodes
 from docutils.parsers.rst import roles, Directive, directives
 from docutils.writers.html4css1 import Writer, HTMLTranslator
+from sqlalchemy.exc import OperationalError
 
 from . import edn
 from .block import find_block
@@ -29,11 +30,16 @@ def requirement_reference_role(
 class requirement(nodes.Inline, nodes.TextElement):
     def __init__(self, id):
         super().__init__()
-        with db.session as session:
-            self.req = Requirement.find_by_id(session, id)
+        try:
+            with db.session as session:
+                self.req = Requirement.find_by_id(session, id)
+        except (RuntimeError, OperationalError):
+            # outside of the app or without a requirements table, still a
+            # reference to `id`
+            self.req = None
 
-            if self.req is None:
-                self.req = Requirement(id=id)
+        if self.req is None:
+            self.req = Requirement(id=id)
 
 
 # Register requirement role
@@ -126,6 +132,46 @@ def repr_rst(form):
         return rst_codeblock(edn.writes(form))
 
 
+adornment_pattern = re.compile(r"^([!-/:-@\[-`{-~])\1+\s*$")
+
+# Stands in for content that is not rendered
+PLACEHOLDER_RST = "...\n"
+
+
+def section_outline(rst):
+    """Section titles of rst with placeholders for the rest of the content
+
+    Heading levels are decided by the order in which title styles first
+    appear in a document. Rendering a statement along with the outline
+    of the others gives it the same headings as rendering everything.
+    """
+    lines = rst.splitlines()
+    outline = []
+    content = False
+    for i, line in enumerate(lines[:-1]):
+        underline = lines[i + 1]
+        previous = lines[i - 1] if i > 0 else ""
+        if (
+            line.strip()
+            and not line[0].isspace()
+            and not adornment_pattern.match(line)
+            and adornment_pattern.match(underline)
+            and (not previous.strip() or adornment_pattern.match(previous))
+        ):
+            if content:
+                outline.append(PLACEHOLDER_RST)
+                content = False
+            if previous.strip() and previous[0] == underline[0]:
+                outline.append(previous)
+            outline.extend([line, underline, ""])
+        elif line.strip() and not adornment_pattern.match(line):
+            content = True
+
+    if content or (lines and not adornment_pattern.match(lines[-1])):
+        outline.append(PLACEHOLDER_RST)
+    return "\n".join(outline) + "\n"
+
+
 def write_html_parts(rst_statements):
     # At this point we can assume all of our statements
     # are in rst format. To allow us to split up the rendered
@@ -1,10 +1,17 @@
 """Models and utilites for reading and representing test cases"""
 import functools
+import hashlib
 from abc import ABC, abstractmethod
 
 from . import edn
 from .block import find_block
-from .rst import extract_testcase_fields, write_html_parts, repr_rst
+from .rst import (
+    extract_testcase_fields,
+    write_html_parts,
+    repr_rst,
+    section_outline,
+    PLACEHOLDER_RST,
+)
 
 
 # TODO: This likely should actually extend a job class.
@@ -109,6 +116,38 @@ def get_statements(text):
     return statements
 
 
+@functools.lru_cache(maxsize=128)
+def read_source_map(text):
+    """Top-level forms of `text` and the (start, end) offsets of each"""
+    forms, spans = [], []
+    for form, start, end in edn.read_all_spans(text):
+        forms.append(form)
+        spans.append((start, end))
+    return tuple(forms), tuple(spans)
+
+
+def render_statements(forms, indices):
+    """Renders the statements of `forms` at `indices`
+
+    The other statements only contribute their section outline so the
+    rendered headings match rendering the whole test case.
+    """
+    rst_statements = []
+    for i, form in enumerate(forms):
+        if i in indices:
+            rst_statements.append(repr_rst(form))
+        elif isinstance(form, str):
+            rst_statements.append(section_outline(form))
+        else:
+            rst_statements.append(PLACEHOLDER_RST)
+    html_statements = write_html_parts(rst_statements)
+
+    return {
+        i: TestCaseStatement(forms[i], html_statements[i], rst_statements[i])
+        for i in indices
+    }
+
+
 class EdnTestCase(TestCase):
     """Test case represented in edn
 
@@ -133,7 +172,16 @@ class EdnTestCase(TestCase):
         self._id = id
         self.text = text
 
-        self.fields = extract_testcase_fields(self.__repr_rst__())
+        # Source map of the text, read on first use
+        self._forms = None
+        self._spans = None
+        # Rendered statements, None where a statement changed since
+        self._statements = None
+
+    @functools.cached_property
+    def fields(self):
+        # Rendering the whole test case is costly and not needed to edit it
+        return extract_testcase_fields(self.__repr_rst__())
 
     @property
     def id(self):
@@ -147,11 +195,52 @@ class EdnTestCase(TestCase):
     def requirements(self):
         return self.fields["requirements"]
 
+    @property
+    def spans(self):
+        """(start, end) offsets of each statement in `text`"""
+        self._read_source_map()
+        return list(self._spans)
+
+    def _read_source_map(self):
+        if self._spans is None:
+            forms, spans = read_source_map(self.text)
+            self._forms, self._spans = list(forms), list(spans)
+
     @property
     def statements(self):
-        return list(get_statements(self.text))
+        if self._statements is None:
+            return list(get_statements(self.text))
+        self.render(range(len(self._statements)))
+        return list(self._statements)
+
+    def statement(self, index):
+        """Statement `index`, rendering no other statement that changed"""
+        if self._statements is None:
+            return get_statements(self.text)[index]
+        self.render([index])
+        return self._statements[index]
+
+    def render(self, indices):
+        """Renders the statements at `indices` that changed, in one pass"""
+        changed = [i for i in indices if self._statements[i] is None]
+        if changed:
+            for i, stmt in render_statements(self._forms, changed).items():
+                self._statements[i] = stmt
+
+    def statement_hash(self, index):
+        """Identifies statement `index` as written. None for -1 (appending)"""
+        if index == -1:
+            return None
+        self._read_source_map()
+        text = TestCaseStatement(self._forms[index])._repr_edn_()
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
 
     def update_statement(self, index, value):
+        """Replaces statement `index` (-1 to append) with those in `value`
+
+        Only the statement's span of `text` is rewritten and only the new
+        statements are rendered, when they are next asked for.
+        """
         # simple detection of rst or code
         # very rare should a rst step start with a (
         # otherwise need to have the GUI handle cell
@@ -159,35 +248,53 @@ class EdnTestCase(TestCase):
         if not value.strip().startswith("("):
             value = f'"{value}"'
 
-        statements = get_statements(value)
-
-        all_statements = self.statements
-        original_len = len(all_statements)
-
-        if index != -1:
-            all_statements[index : index + 1] = statements
+        self._read_source_map()
+        if self._statements is None:
+            self._statements = [None] * len(self._forms)
+        original_len = len(self._forms)
+
+        replacement = "\n".join(
+            TestCaseStatement(form)._repr_edn_() for form in edn.read_all(value)
+        )
+        if index == -1:
+            prefix = self.text.rstrip()
+            if prefix:
+                prefix += "\n\n"
+            start, end = len(prefix), len(self.text)
+            text = prefix + replacement
+            index = original_len
         else:
-            all_statements += statements
-
-        # Now we need to just write out each sections
-        text = "\n".join([stmt._repr_edn_() for stmt in all_statements])
+            start, end = self._spans[index]
+            if replacement:
+                replacement = replacement.rstrip("\n")
+            elif index + 1 < original_len:
+                # removed, along with the whitespace up to the next statement
+                end = self._spans[index + 1][0]
+            text = self.text[:start] + replacement + self.text[end:]
+
+        forms, spans = read_source_map(replacement)
+        delta = len(text) - len(self.text)
+        self._forms[index : index + 1] = forms
+        self._spans[index : index + 1] = [(s + start, e + start) for s, e in spans]
+        self._spans[index + len(forms) :] = [
+            (s + delta, e + delta) for s, e in self._spans[index + len(forms) :]
+        ]
+        self._statements[index : index + 1] = [None] * len(forms)
         self.text = text
 
         # Still not sure how I handle this.
         # return the sections updated
         # if statements read is of len == 1 then its only this index
         # otherwise its current index until the end
-        if index == -1:  # added at end
-            modified = list(range(original_len, original_len + len(statements)))
+        if index == original_len:  # added at end
+            modified = list(range(original_len, original_len + len(forms)))
             shifted = []
-        elif len(statements) <= 1:
+        elif len(forms) <= 1:
             modified = [index]
             shifted = []
         else:
-            modified = [i for i in range(index, index + len(statements))]
-            shifted = [
-                (i, i + len(statements) - 1) for i in range(index + 1, original_len)
-            ]
+            modified = [i for i in range(index, index + len(forms))]
+            shifted = [(i, i + len(forms) - 1) for i in range(index + 1, original_len)]
 
         return modified, shifted
 
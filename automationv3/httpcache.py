@@ -0,0 +1,54 @@
+"""Conditional responses for rendered fragments
+
+Fragments are tagged with an ETag computed from what they are rendered
+from, not from the rendered output. A request whose `If-None-Match`
+matches is answered with a 304 before anything is read, parsed or
+rendered.
+
+Tagged responses are revalidated on every use (`no-cache`). Fragments
+requested through a URL that already names their version (`?v=`) can
+never change and are marked immutable instead.
+"""
+
+import hashlib
+
+from flask import make_response, request
+
+# Bump whenever rendering changes so tags of old renders stop matching
+RENDERER_VERSION = 1
+
+REVALIDATE = "no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def make_etag(*parts):
+    """Tag of a fragment rendered from `parts`"""
+    h = hashlib.sha1(str(RENDERER_VERSION).encode("utf-8"))
+    for part in parts:
+        h.update(b"\0")
+        h.update(str(part).encode("utf-8"))
+    return h.hexdigest()
+
+
+def tagged(response, etag, cache_control=REVALIDATE):
+    response = make_response(response)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def not_modified(etag, cache_control=REVALIDATE):
+    """A 304 if the client already has `etag`, None otherwise"""
+    if request.if_none_match.contains_weak(etag):
+        return tagged(make_response("", 304), etag, cache_control)
+    return None
+
+
+__all__ = [
+    "make_etag",
+    "not_modified",
+    "tagged",
+    "IMMUTABLE",
+    "RENDERER_VERSION",
+    "REVALIDATE",
+]
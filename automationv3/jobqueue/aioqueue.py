@@ -0,0 +1,257 @@
+"""asyncio facade for `SQLPriorityQueue`
+
+Workers waiting on the queue should not have to spin on `pop`. The
+`AsyncSQLPriorityQueue` lets a worker `await queue.get()` and sleep until
+a message is available.
+
+Two wakeup paths are used:
+
+1. Puts made through the same `AsyncSQLPriorityQueue` notify an
+   `asyncio.Condition` so waiters in the same process wake immediately.
+2. Puts made from any other process (or through a plain
+   `SQLPriorityQueue`, see `wake_waiters`) send a datagram to every
+   waiter registered in a `WakeChannel` directory that lives alongside
+   the sqlite file (`<db>.wake/`).
+
+Wakeups are only hints. Every waiter re-checks the queue after waking and
+also re-checks every `poll_interval` seconds, so a lost datagram (or a
+platform without unix sockets) only costs latency, never a job.
+
+Queue operations take sqlite's write lock, so they run in a worker
+thread (`asyncio.to_thread`) rather than on the event loop. The wrapped
+queue's connection must allow that (`check_same_thread=False`, which
+`AsyncSQLPriorityQueue.open` sets).
+"""
+
+import asyncio
+import os
+import select
+import socket
+import threading
+import uuid
+from contextlib import closing
+from pathlib import Path
+
+from .sqlqueue import SQLPriorityQueue
+
+
+class WakeChannel:
+    """Cross-process wakeup for queues sharing a sqlite file
+
+    Each waiting process binds a unix datagram socket in `directory`.
+    `notify` sends a single byte to every socket found there, removing
+    sockets left behind by processes that no longer exist.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.path = None
+        self.sock = None
+
+    @classmethod
+    def for_database(cls, filename):
+        """Channel used by every queue opened on `filename`"""
+        return cls(f"{filename}.wake")
+
+    @staticmethod
+    def supported():
+        return hasattr(socket, "AF_UNIX")
+
+    def open(self):
+        """Registers this process as a waiter"""
+        if self.sock is not None:
+            return self.sock
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(str(path))
+        except OSError:
+            sock.close()
+            raise
+        sock.setblocking(False)
+
+        self.path = path
+        self.sock = sock
+        return sock
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def drain(self):
+        """Discards pending wakeups. Returns True if there were any"""
+        woken = False
+        while True:
+            try:
+                self.sock.recv(64)
+                woken = True
+            except (BlockingIOError, InterruptedError):
+                return woken
+
+    def wait(self, timeout=None):
+        """Blocks until notified or `timeout` seconds pass
+
+        Synchronous counterpart to the asyncio reader used by
+        `AsyncSQLPriorityQueue`. Returns True if woken by a notify.
+        """
+        self.open()
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        return bool(readable) and self.drain()
+
+    def notify(self):
+        """Wakes every other waiter registered in the directory"""
+        if not self.directory.exists():
+            return
+
+        with closing(socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)) as sender:
+            sender.setblocking(False)
+            for path in self.directory.glob("*.sock"):
+                if path == self.path:
+                    continue
+                try:
+                    sender.sendto(b"\0", str(path))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # waiter exited without cleaning up
+                    path.unlink(missing_ok=True)
+                except (BlockingIOError, InterruptedError):
+                    # receiver already has wakeups pending
+                    pass
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self.path = None
+
+
+def wake_waiters(filename):
+    """Wakes processes waiting on the queue stored in `filename`
+
+    For producers that use a plain `SQLPriorityQueue`. Call it after
+    every `put` and every `requeue_expired` that returned jobs.
+    """
+    if WakeChannel.supported():
+        WakeChannel.for_database(filename).notify()
+
+
+class AsyncSQLPriorityQueue:
+    """asyncio compatible facade over a `SQLPriorityQueue`
+
+    Mirrors `asyncio.Queue`: `get` waits for a message, `get_nowait`
+    raises `asyncio.QueueEmpty`.
+    """
+
+    def __init__(self, queue, wake=None, poll_interval=5.0):
+        self.queue = queue
+        self.wake = wake
+        self.poll_interval = poll_interval
+
+        # created on first use so it binds to the running loop
+        self._cond = None
+        self._loop = None
+        # wakeups seen so far, lets `get` detect one that raced its pop
+        self._wakeups = 0
+        # one connection, so one transaction at a time
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, filename=None, poll_interval=5.0, **kwargs):
+        """Opens the queue in `filename` along with its `WakeChannel`"""
+        kwargs.setdefault("check_same_thread", False)
+        queue = SQLPriorityQueue(filename, **kwargs)
+
+        memory = kwargs.get("memory") or filename is None or filename == ":memory:"
+        if memory or not WakeChannel.supported():
+            wake = None
+        else:
+            wake = WakeChannel.for_database(filename)
+
+        return cls(queue, wake, poll_interval)
+
+    def _condition(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+            self._loop = asyncio.get_running_loop()
+
+            if self.wake is not None:
+                try:
+                    self.wake.open()
+                    self._loop.add_reader(self.wake.fileno(), self._on_wake)
+                except OSError:
+                    # e.g. socket path too long. Fall back to polling
+                    self.wake = None
+        return self._cond
+
+    def _on_wake(self):
+        self.wake.drain()
+        self._loop.create_task(self._notify_local())
+
+    async def _notify_local(self):
+        cond = self._condition()
+        async with cond:
+            self._wakeups += 1
+            cond.notify_all()
+
+    def _locked(self, method, *args):
+        with self._lock:
+            return method(*args)
+
+    async def _run(self, method, *args):
+        """Runs a blocking queue method off the event loop"""
+        return await asyncio.to_thread(self._locked, method, *args)
+
+    async def put(self, message):
+        """Inserts a message and wakes waiting consumers"""
+        rid = await self._run(self.queue.put, message)
+
+        await self._notify_local()
+        if self.wake is not None:
+            self.wake.notify()
+
+        return rid
+
+    def get_nowait(self):
+        message = self._locked(self.queue.pop)
+        if message is None:
+            raise asyncio.QueueEmpty
+        return message
+
+    async def get(self):
+        """Removes and returns the next message, waiting until one exists"""
+        cond = self._condition()
+        while True:
+            seen = self._wakeups
+            message = await self._run(self.queue.pop)
+            if message is not None:
+                return message
+
+            async with cond:
+                if self._wakeups != seen:
+                    # woken while popping, check again
+                    continue
+                try:
+                    await asyncio.wait_for(cond.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def done(self, message_id):
+        return self.queue.done(message_id)
+
+    def qsize(self):
+        return self.queue.qsize()
+
+    def empty(self):
+        return self.queue.empty()
+
+    def close(self):
+        if self.wake is not None:
+            if self._loop is not None and self.wake.sock is not None:
+                self._loop.remove_reader(self.wake.fileno())
+            self.wake.close()
+
+
+__all__ = ["AsyncSQLPriorityQueue", "WakeChannel", "wake_waiters"]
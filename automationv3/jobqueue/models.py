@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import String, Integer, DateTime
+from sqlalchemy import String, Integer, DateTime, Text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -26,6 +26,10 @@ class Worker(ModelBase):
     last_keepalive: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now()
     )
+    capacity: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    free_slots: Mapped[int] = mapped_column(Integer, default=1, server_default="1")
+    # json encoded `scheduler.Capabilities`
+    capabilities: Mapped[str] = mapped_column(Text, nullable=True)
 
     def __repr__(self):
         return f"<Worker {self.name}>"
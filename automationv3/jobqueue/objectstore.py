@@ -0,0 +1,462 @@
+"""Content addressed filesystem tree storage
+
+Filesystem trees are stored the way git stores them. Every file is a
+`blob` object and every directory a `tree` object listing its entries.
+An object is identified by the sha1 of its header and content
+(`"<type> <size>\\0<content>"`) and stored zlib compressed under
+`objects/<first two hex digits>/<remaining hex digits>`.
+
+Because identical content always has the same id, uploading a workspace
+that is mostly unchanged only transfers the objects the server lacks:
+
+1. The client hashes its tree (`TreeBuilder`), reusing the hashes of
+   files whose size and mtime did not change since the last build.
+2. It asks the server which of the object ids it `want`s. If the server
+   already has the root tree there is nothing to send.
+3. It uploads a pack of just the wanted objects.
+
+Objects are always written children first, so a store that has a tree
+also has everything the tree refers to. Uploaded trees are refused until
+every entry they list is stored, so a pack must list children first too.
+
+Files are read twice, once to hash and once to store them. A file that
+changed in between is not stored under its stale id, the tree is built
+again instead.
+"""
+
+import hashlib
+import io
+import os
+import re
+import stat
+import tempfile
+import threading
+import zlib
+from pathlib import Path
+
+import requests
+from flask import current_app
+
+from ..database import db
+
+MODE_FILE = "100644"
+MODE_EXECUTABLE = "100755"
+MODE_SYMLINK = "120000"
+MODE_TREE = "40000"
+
+PACK_CONTENT_TYPE = "application/x-automationv3-pack"
+
+IGNORED = {".git", "__pycache__"}
+
+SHA_PATTERN = re.compile("[0-9a-f]{40}")
+
+# Seconds to wait on the server while transferring objects
+REQUEST_TIMEOUT = 60
+
+# Builds of a tree tried while its files keep changing
+BUILD_ATTEMPTS = 3
+
+
+class ObjectStoreError(Exception):
+    pass
+
+
+class FileChanged(ObjectStoreError):
+    """A file no longer has the content its tree was built with"""
+
+    def __init__(self, path):
+        super().__init__(f"{path} changed while being stored")
+        self.path = path
+
+
+def object_header(type, size):
+    return f"{type} {size}\0".encode("ascii")
+
+
+def hash_object(type, data):
+    return hashlib.sha1(object_header(type, len(data)) + data).hexdigest()
+
+
+def encode_tree(entries):
+    """Encodes (mode, name, sha) entries in git tree format"""
+
+    # git sorts directories as though their name ended with '/'
+    def sort_key(entry):
+        mode, name, _ = entry
+        return name + "/" if mode == MODE_TREE else name
+
+    out = io.BytesIO()
+    for mode, name, sha in sorted(entries, key=sort_key):
+        out.write(f"{mode} {name}\0".encode("utf-8"))
+        out.write(bytes.fromhex(sha))
+    return out.getvalue()
+
+
+def valid_entry_name(name):
+    """True if `name` can only name a file inside its tree's directory"""
+    return name not in ("", ".", "..") and "/" not in name and "\0" not in name
+
+
+def decode_tree(data):
+    """Returns the (mode, name, sha) entries of an encoded tree
+
+    Trees come from clients, so an entry that could escape the tree's
+    directory when checked out, or a repeated name, is an error.
+    """
+    entries = []
+    names = set()
+    pos = 0
+    while pos < len(data):
+        space = data.index(b" ", pos)
+        nul = data.index(b"\0", space)
+        mode = data[pos:space].decode("ascii")
+        name = data[space + 1 : nul].decode("utf-8")
+        sha = data[nul + 1 : nul + 21].hex()
+        if not valid_entry_name(name) or name in names:
+            raise ObjectStoreError(f"Invalid tree entry name {name!r}")
+        names.add(name)
+        entries.append((mode, name, sha))
+        pos = nul + 21
+    return entries
+
+
+def decompress_object(compressed):
+    try:
+        raw = zlib.decompress(compressed)
+        nul = raw.index(b"\0")
+        type, size = raw[:nul].decode("ascii").split(" ")
+        size = int(size)
+    except (zlib.error, ValueError) as e:
+        raise ObjectStoreError(f"Corrupt object: {e}") from None
+    data = raw[nul + 1 :]
+    if size != len(data):
+        raise ObjectStoreError("Object size does not match header")
+    return type, data
+
+
+def compress_object(type, data):
+    return zlib.compress(object_header(type, len(data)) + data)
+
+
+class ObjectStore:
+    """Directory of zlib compressed, sha1 keyed objects"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+
+    def path(self, sha):
+        # ids come from clients so never let one escape the store
+        if not isinstance(sha, str) or not SHA_PATTERN.fullmatch(sha):
+            raise ObjectStoreError(f"Invalid object id {sha!r}")
+        return self.objects / sha[:2] / sha[2:]
+
+    def has(self, sha):
+        return self.path(sha).exists()
+
+    def missing(self, shas):
+        return [sha for sha in dict.fromkeys(shas) if not self.has(sha)]
+
+    def _store(self, sha, compressed):
+        path = self.path(sha)
+        if path.exists():
+            return
+
+        path.parent.mkdir(exist_ok=True)
+        # write then rename so readers never see partial objects
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp, path)
+
+    def write(self, type, data):
+        sha = hash_object(type, data)
+        if not self.has(sha):
+            self._store(sha, compress_object(type, data))
+        return sha
+
+    def write_raw(self, sha, compressed):
+        """Stores an already compressed object after verifying it
+
+        The object's id must match its content and a tree's entries must
+        all be stored already.
+        """
+        if self.has(sha):
+            return
+        type, data = decompress_object(compressed)
+        if hash_object(type, data) != sha:
+            raise ObjectStoreError(f"Object {sha} does not match its content")
+        if type == "tree":
+            missing = self.missing(entry_sha for _, _, entry_sha in decode_tree(data))
+            if missing:
+                raise ObjectStoreError(
+                    f"Tree {sha} refers to {len(missing)} missing objects"
+                )
+        self._store(sha, compressed)
+
+    def read_raw(self, sha):
+        try:
+            return self.path(sha).read_bytes()
+        except FileNotFoundError:
+            raise KeyError(sha) from None
+
+    def read(self, sha):
+        """Returns the (type, data) of an object"""
+        return decompress_object(self.read_raw(sha))
+
+    def read_tree(self, sha):
+        type, data = self.read(sha)
+        if type != "tree":
+            raise ObjectStoreError(f"Object {sha} is a {type} not a tree")
+        return decode_tree(data)
+
+    def write_tree(self, path, builder=None):
+        """Stores the directory at `path`. Returns the root tree id"""
+        builder = builder or tree_builder
+        for attempt in range(BUILD_ATTEMPTS):
+            root, objects = builder.build(path)
+            try:
+                for sha in objects.missing_from(self):
+                    self._store(sha, objects.compressed(sha))
+                return root
+            except FileChanged as e:
+                builder.forget(e.path)
+                if attempt == BUILD_ATTEMPTS - 1:
+                    raise
+
+    def add_pack(self, stream):
+        """Stores every object in a pack. Returns the number read"""
+        count = 0
+        for sha, compressed in read_pack(stream):
+            self.write_raw(sha, compressed)
+            count += 1
+        return count
+
+    def pack(self, shas):
+        """Pack of stored objects, in the given order"""
+        return write_pack((sha, self.read_raw(sha)) for sha in shas)
+
+
+def write_pack(objects):
+    """Encodes (sha, compressed) pairs as a pack
+
+    A pack is each object as `<sha> <length>\\n<compressed bytes>`.
+    """
+    out = io.BytesIO()
+    for sha, compressed in objects:
+        out.write(f"{sha} {len(compressed)}\n".encode("ascii"))
+        out.write(compressed)
+    return out.getvalue()
+
+
+def read_pack(stream):
+    """Yields (sha, compressed) pairs from a pack stream or bytes"""
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+
+    while header := stream.readline():
+        try:
+            sha, length = header.decode("ascii").split()
+            length = int(length)
+        except ValueError:
+            raise ObjectStoreError("Invalid pack header") from None
+        compressed = stream.read(int(length))
+        if len(compressed) != length:
+            raise ObjectStoreError("Truncated pack")
+        yield sha, compressed
+
+
+class TreeObjects:
+    """Objects of a built tree. Blob content is read from disk on demand"""
+
+    def __init__(self):
+        # sha -> (type, data) for trees, (type, path) for blobs
+        self.objects = {}
+
+    def add_blob(self, sha, path):
+        self.objects.setdefault(sha, ("blob", path))
+
+    def add_tree(self, sha, data):
+        self.objects.setdefault(sha, ("tree", data))
+
+    def __iter__(self):
+        # insertion order is children first
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+    def data(self, sha):
+        """(type, data) of an object
+
+        Raises `FileChanged` if a file no longer hashes to `sha`.
+        """
+        type, source = self.objects[sha]
+        if type == "tree":
+            return type, source
+        if isinstance(source, bytes):
+            return type, source
+        try:
+            if source.is_symlink():
+                data = os.readlink(source).encode("utf-8")
+            else:
+                data = source.read_bytes()
+        except FileNotFoundError:
+            raise FileChanged(source) from None
+        if hash_object(type, data) != sha:
+            raise FileChanged(source)
+        return type, data
+
+    def compressed(self, sha):
+        return compress_object(*self.data(sha))
+
+    def missing_from(self, store):
+        return [sha for sha in self if not store.has(sha)]
+
+    def pack(self, shas):
+        return write_pack((sha, self.compressed(sha)) for sha in shas)
+
+
+class TreeBuilder:
+    """Hashes directories into trees
+
+    File hashes are cached by (size, mtime) so rebuilding a mostly
+    unchanged tree only reads the files that changed.
+    """
+
+    def __init__(self, ignored=IGNORED):
+        self.ignored = set(ignored)
+        self.lock = threading.Lock()
+        self.stat_cache = {}
+
+    def _hash_file(self, path, st):
+        key = str(path)
+        fingerprint = (st.st_size, st.st_mtime_ns, st.st_mode)
+        with self.lock:
+            cached = self.stat_cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        if stat.S_ISLNK(st.st_mode):
+            data = os.readlink(path).encode("utf-8")
+        else:
+            data = path.read_bytes()
+        sha = hash_object("blob", data)
+
+        with self.lock:
+            self.stat_cache[key] = (fingerprint, sha)
+        return sha
+
+    def forget(self, path):
+        """Drops the cached hash of a file so it is read again"""
+        with self.lock:
+            self.stat_cache.pop(str(path), None)
+
+    def build(self, path):
+        """Returns (root tree id, `TreeObjects`) for the directory at path"""
+        objects = TreeObjects()
+        root = self._build(Path(path), objects)
+        return root, objects
+
+    def _build(self, path, objects):
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name in self.ignored:
+                    continue
+
+                entry_path = Path(entry.path)
+                st = entry.stat(follow_symlinks=False)
+                if stat.S_ISDIR(st.st_mode):
+                    mode, sha = MODE_TREE, self._build(entry_path, objects)
+                elif stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode):
+                    if stat.S_ISLNK(st.st_mode):
+                        mode = MODE_SYMLINK
+                    elif st.st_mode & stat.S_IXUSR:
+                        mode = MODE_EXECUTABLE
+                    else:
+                        mode = MODE_FILE
+                    sha = self._hash_file(entry_path, st)
+                    objects.add_blob(sha, entry_path)
+                else:
+                    continue
+                entries.append((mode, entry.name, sha))
+
+        data = encode_tree(entries)
+        sha = hash_object("tree", data)
+        objects.add_tree(sha, data)
+        return sha
+
+
+# Shared so repeated uploads from this process reuse file hashes
+tree_builder = TreeBuilder()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_object_store():
+    """Object store of the running app
+
+    Kept in `OBJECT_STORE_PATH`, next to the database by default.
+    """
+    root = current_app.config.get("OBJECT_STORE_PATH")
+    if root is None:
+        root = f"{db.get_connection_str()}.objects"
+
+    with _stores_lock:
+        if str(root) not in _stores:
+            _stores[str(root)] = ObjectStore(root)
+        return _stores[str(root)]
+
+
+def upload_tree(path, objects_url, builder=None, session=requests):
+    """Uploads the directory at `path` to a central server
+
+    Only objects the server does not already have are sent. Returns
+    the root tree id.
+    """
+    builder = builder or tree_builder
+    objects_url = objects_url.rstrip("/")
+
+    for attempt in range(BUILD_ATTEMPTS):
+        root, objects = builder.build(path)
+        response = session.post(
+            f"{objects_url}/want",
+            json={"tree": root, "objects": list(objects)},
+            timeout=REQUEST_TIMEOUT,
+        )
+        response.raise_for_status()
+        want = response.json()["want"]
+        if not want:
+            return root
+
+        try:
+            pack = objects.pack(want)
+        except FileChanged as e:
+            builder.forget(e.path)
+            if attempt == BUILD_ATTEMPTS - 1:
+                raise
+            continue
+
+        response = session.post(
+            objects_url,
+            data=pack,
+            headers={"Content-Type": PACK_CONTENT_TYPE},
+            timeout=REQUEST_TIMEOUT,
+        )
+        response.raise_for_status()
+        return root
+
+
+__all__ = [
+    "FileChanged",
+    "ObjectStore",
+    "ObjectStoreError",
+    "TreeBuilder",
+    "get_object_store",
+    "upload_tree",
+    "read_pack",
+    "write_pack",
+]
@@ -0,0 +1,137 @@
+"""Capability and affinity aware job scheduling
+
+Workers advertise `Capabilities` (building blocks, plugins, simulator
+stand-ins, free form tags and the filesystem trees they have cached).
+Jobs declare `Requirements`. When a worker claims work the scheduler only
+hands it jobs it can run, and prefers jobs whose filesystem tree the
+worker already has cached. A job whose tree is cached on another worker
+with free slots is left for that worker for `affinity_wait` seconds
+before anyone else may take it, avoiding an expensive tree transfer.
+"""
+
+import json
+import time
+
+from ..framework import edn
+from ..framework.block import all_blocks, discovered_plugins
+
+
+def _as_set(values):
+    return set(values or [])
+
+
+class Capabilities:
+    """What a worker is able to run"""
+
+    FIELDS = ("blocks", "plugins", "simulators", "tags", "trees")
+
+    def __init__(self, blocks=(), plugins=(), simulators=(), tags=(), trees=()):
+        self.blocks = _as_set(blocks)
+        self.plugins = _as_set(plugins)
+        self.simulators = _as_set(simulators)
+        self.tags = _as_set(tags)
+        self.trees = _as_set(trees)
+
+    @classmethod
+    def local(cls, simulators=(), tags=(), trees=()):
+        """Capabilities of the framework installed in this process"""
+        return cls(
+            blocks=[block.name() for block in all_blocks],
+            plugins=discovered_plugins.keys(),
+            simulators=simulators,
+            tags=tags,
+            trees=trees,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(**{field: data.get(field) for field in cls.FIELDS})
+
+    @classmethod
+    def loads(cls, text):
+        return cls.from_dict(json.loads(text) if text else None)
+
+    def to_dict(self):
+        return {field: sorted(getattr(self, field)) for field in self.FIELDS}
+
+    def dumps(self):
+        return json.dumps(self.to_dict())
+
+
+class Requirements:
+    """What a job needs from the worker running it"""
+
+    FIELDS = ("blocks", "plugins", "simulators", "tags")
+
+    def __init__(self, blocks=(), plugins=(), simulators=(), tags=()):
+        self.blocks = _as_set(blocks)
+        self.plugins = _as_set(plugins)
+        self.simulators = _as_set(simulators)
+        self.tags = _as_set(tags)
+
+    @classmethod
+    def for_testcase(cls, text, **kwargs):
+        """Requires every building block used by an edn test case"""
+        blocks = {
+            str(form[0])
+            for form in edn.read_all(text) or []
+            if isinstance(form, list) and len(form) > 0
+        }
+        return cls(blocks=blocks, **kwargs)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(**{field: data.get(field) for field in cls.FIELDS})
+
+    @classmethod
+    def loads(cls, text):
+        return cls.from_dict(json.loads(text) if text else None)
+
+    def to_dict(self):
+        return {field: sorted(getattr(self, field)) for field in self.FIELDS}
+
+    def dumps(self):
+        return json.dumps(self.to_dict())
+
+    def satisfied_by(self, capabilities):
+        return all(
+            getattr(self, field) <= getattr(capabilities, field)
+            for field in self.FIELDS
+        )
+
+
+class Scheduler:
+    """Chooses which waiting jobs a claiming worker should get"""
+
+    def __init__(self, affinity_wait=30):
+        self.affinity_wait = affinity_wait
+
+    def select(self, capabilities, candidates, limit, peers=(), now=None):
+        """Returns the message ids of up to `limit` jobs for a worker
+
+        `candidates` are waiting queue rows in priority order, `peers` the
+        capabilities of other live workers that have free slots.
+        """
+        now = time.time() if now is None else now
+        peer_trees = set().union(*(peer.trees for peer in peers))
+
+        cached, uncached = [], []
+        for job in candidates:
+            if not Requirements.loads(job["requires"]).satisfied_by(capabilities):
+                continue
+
+            tree = job["tree"]
+            if tree is None or tree in capabilities.trees:
+                cached.append(job["message_id"])
+            elif tree in peer_trees and now - job["in_time"] < self.affinity_wait:
+                # leave it for a worker that already has the tree
+                continue
+            else:
+                uncached.append(job["message_id"])
+
+        return (cached + uncached)[:limit]
+
+
+__all__ = ["Capabilities", "Requirements", "Scheduler"]
@@ -11,6 +11,15 @@ class Status(IntEnum):
 
 
 class SQLPriorityQueue:
+    # Columns added after the original schema
+    ADDED_COLUMNS = {
+        "worker": "TEXT",
+        "heartbeat_time": "INTEGER",
+        "result": "TEXT",
+        "requires": "TEXT",
+        "tree": "TEXT",
+    }
+
     def __init__(self, filename=None, memory=False, **kwargs):
         if memory or filename is None or filename == ":memory:":
             self.conn = sqlite3.connect(":memory:", isolation_level=None, **kwargs)
@@ -36,16 +45,34 @@ class SQLPriorityQueue:
                   in_time INTEGER NOT NULL DEFAULT (strftime('%s','now')),
                   lock_time INTEGER,
                   done_time INTEGER,
-                  priority INTEGER DEFAULT 0 )
+                  priority INTEGER DEFAULT 0,
+                  worker TEXT,
+                  heartbeat_time INTEGER,
+                  result TEXT,
+                  requires TEXT,
+                  tree TEXT )
                 """
             )
 
+            # Queues created by older versions
+            columns = {
+                row["name"] for row in self.conn.execute("PRAGMA table_info(Queue)")
+            }
+            for column, column_type in self.ADDED_COLUMNS.items():
+                if column not in columns:
+                    self.conn.execute(
+                        f"ALTER TABLE Queue ADD COLUMN {column} {column_type}"
+                    )
+
             self.conn.execute("CREATE INDEX IF NOT EXISTS TIdx ON Queue(message_id)")
             self.conn.execute("CREATE INDEX IF NOT EXISTS SIdx ON Queue(status)")
 
-    def put(self, message):
+    def put(self, message, requires=None, tree=None):
         """
         Insert a new message
+
+        `requires` is the json encoded `scheduler.Requirements` of the
+        job and `tree` the id of the filesystem tree it runs against.
         """
 
         with self.transaction(mode="IMMEDIATE"):
@@ -57,7 +84,9 @@ class SQLPriorityQueue:
                                     in_time,
                                     lock_time,
                                     done_time,
-                                    priority)
+                                    priority,
+                                    requires,
+                                    tree)
                 VALUES (:message,
                         lower(hex(randomblob(16))),
                         0,
@@ -66,11 +95,13 @@ class SQLPriorityQueue:
                         NULL,
                         (SELECT COALESCE( MAX( priority ), 0 ) + 1
                          FROM Queue
-                         WHERE STATUS = 0))
+                         WHERE STATUS = 0),
+                        :requires,
+                        :tree)
                 RETURNING
                 message_id, priority
                 """,
-                {"message": message},
+                {"message": message, "requires": requires, "tree": tree},
             ).fetchone()
 
         return dict(rid)
@@ -82,8 +113,9 @@ class SQLPriorityQueue:
             message = self.conn.execute(
                 """
                 SELECT * FROM Queue
-                WHERE rowid = (SELECT min(priority) FROM Queue
-                               WHERE status = 0)
+                WHERE status = 0
+                ORDER BY priority, rowid
+                LIMIT 1
                 """
             ).fetchone()
 
@@ -111,6 +143,142 @@ class SQLPriorityQueue:
 
             return dict(message)
 
+    def claim(self, worker, limit=1, select=None, window=None):
+        """Locks up to `limit` waiting messages for `worker`
+
+        The claim is a lease. It is kept alive with `heartbeat` and
+        ended with `complete`. Leases that are not kept alive are
+        returned to the queue by `requeue_expired`.
+
+        Without `select` the highest priority messages are claimed.
+        Otherwise `select(candidates, limit)` is given waiting rows in
+        priority order, `window` at a time, and returns the message ids
+        to claim (see `scheduler.Scheduler`). Windows are read until
+        `limit` messages are chosen or the queue is exhausted, so jobs
+        the worker cannot run do not hide the ones behind them.
+        """
+        if select is None:
+            window = limit
+        elif window is None:
+            window = max(limit * 4, 64)
+
+        with self.transaction(mode="IMMEDIATE"):
+            ids = []
+            # (priority, rowid) of the last row read
+            last = {"priority": None, "rowid": None}
+            while len(ids) < limit:
+                candidates = self.conn.execute(
+                    """
+                    SELECT rowid, priority, message_id, in_time, requires, tree
+                    FROM Queue
+                    WHERE status = 0
+                      AND (:priority IS NULL
+                           OR (priority, rowid) > (:priority, :rowid))
+                    ORDER BY priority, rowid
+                    LIMIT :window
+                    """,
+                    {**last, "window": window},
+                ).fetchall()
+
+                if select is None:
+                    ids = [row["message_id"] for row in candidates]
+                    break
+
+                wanted = limit - len(ids)
+                ids += select(candidates, wanted)[:wanted]
+                if len(candidates) < window:
+                    break
+                last = {
+                    "priority": candidates[-1]["priority"],
+                    "rowid": candidates[-1]["rowid"],
+                }
+
+            if not ids:
+                return []
+
+            placeholders = ", ".join("?" for _ in ids)
+            self.conn.execute(
+                f"""
+                UPDATE Queue
+                SET status = 1,
+                    worker = ?,
+                    lock_time = strftime('%s','now'),
+                    heartbeat_time = strftime('%s','now')
+                WHERE status = 0 AND message_id IN ({placeholders})
+                """,
+                [worker, *ids],
+            )
+
+            messages = self.conn.execute(
+                f"""
+                SELECT * FROM Queue
+                WHERE message_id IN ({placeholders})
+                ORDER BY priority, rowid
+                """,
+                ids,
+            )
+            return [dict(m) for m in messages]
+
+    def heartbeat(self, worker, message_ids):
+        """Extends the leases of `worker` on `message_ids`
+
+        Returns the ids still leased to `worker`. Any missing id has
+        been requeued or completed and should no longer be worked.
+        """
+        if not message_ids:
+            return []
+
+        placeholders = ", ".join("?" for _ in message_ids)
+        with self.transaction(mode="IMMEDIATE"):
+            self.conn.execute(
+                f"""
+                UPDATE Queue
+                SET heartbeat_time = strftime('%s','now')
+                WHERE status = 1 AND worker = ? AND message_id IN ({placeholders})
+                """,
+                [worker, *message_ids],
+            )
+            rows = self.conn.execute(
+                f"""
+                SELECT message_id FROM Queue
+                WHERE status = 1 AND worker = ? AND message_id IN ({placeholders})
+                """,
+                [worker, *message_ids],
+            )
+            return [row["message_id"] for row in rows]
+
+    def complete(self, worker, message_id, result=None):
+        """Marks a message leased to `worker` as done
+
+        Returns False if the lease was lost (e.g. it expired and the
+        message was handed to another worker).
+        """
+        with self.transaction(mode="IMMEDIATE"):
+            cursor = self.conn.execute(
+                """
+                UPDATE Queue
+                SET status = 2, done_time = strftime('%s','now'), result = :result
+                WHERE message_id = :message_id AND worker = :worker AND status = 1
+                """,
+                {"message_id": message_id, "worker": worker, "result": result},
+            )
+            return cursor.rowcount == 1
+
+    def requeue_expired(self, timeout):
+        """Returns messages whose lease was not renewed within `timeout` seconds"""
+        with self.transaction(mode="IMMEDIATE"):
+            cursor = self.conn.execute(
+                """
+                UPDATE Queue
+                SET status = 0, worker = NULL, lock_time = NULL, heartbeat_time = NULL
+                WHERE status = 1
+                  AND heartbeat_time IS NOT NULL
+                  AND heartbeat_time < strftime('%s','now') - :timeout
+                """,
+                {"timeout": timeout},
+            )
+            return cursor.rowcount
+
     def update_priority(self, message_id, priority):
         with self.transaction(mode="IMMEDIATE"):
             # First shift all lower priorities down by 1
@@ -0,0 +1,292 @@
+"""Worker side cache of filesystem trees
+
+Jobs that carry a `tree` run in a private checkout of that tree. A
+`TreeCache` keeps the trees it has seen on local disk:
+
+* tree objects are kept compressed in an `ObjectStore`
+* file content is kept uncompressed and read-only under `blobs/` so a
+  checkout is just a hardlink per file (a copy when the job directory is
+  on another filesystem)
+
+Only objects the cache lacks are fetched from the central server, in
+batches. The cache is bounded by the total size of its files. Whole
+trees are evicted least recently used first and a file is deleted once
+no cached tree refers to it. Files of a running job's checkout survive
+eviction since they are hardlinks.
+
+Checked out files are shared with the cache and are read-only. A job
+that wants to change a file must replace it rather than write to it.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+import requests
+
+from .objectstore import (
+    MODE_EXECUTABLE,
+    MODE_SYMLINK,
+    MODE_TREE,
+    REQUEST_TIMEOUT,
+    ObjectStore,
+    ObjectStoreError,
+    decompress_object,
+    hash_object,
+    read_pack,
+    valid_entry_name,
+)
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# Objects requested per fetch
+FETCH_BATCH = 512
+
+
+class TreeCache:
+    def __init__(
+        self,
+        root,
+        objects_url,
+        max_bytes=DEFAULT_MAX_BYTES,
+        session=requests,
+        fetch_batch=FETCH_BATCH,
+    ):
+        self.root = Path(root)
+        self.objects_url = objects_url.rstrip("/")
+        self.max_bytes = max_bytes
+        self.session = session
+        self.fetch_batch = fetch_batch
+
+        self.trees = ObjectStore(self.root / "trees")
+        self.blobs = self.root / "blobs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.json"
+
+        self.lock = threading.Lock()
+        # root tree -> file keys, least recently used first
+        self.cached = OrderedDict()
+        self.refs = Counter()
+        self.sizes = {}
+        self.pinned = Counter()
+        # cached trees whose files have all been fetched
+        self.complete = set()
+
+        self._load()
+
+    @property
+    def size(self):
+        with self.lock:
+            return sum(self.sizes.values())
+
+    def roots(self):
+        """Trees that can be checked out without fetching anything"""
+        with self.lock:
+            return [tree for tree in self.cached if tree in self.complete]
+
+    def blob_path(self, key):
+        return self.blobs / key[:2] / key[2:]
+
+    @staticmethod
+    def blob_key(mode, sha):
+        # hardlinks share permissions so executables are cached separately
+        return sha + "x" if mode == MODE_EXECUTABLE else sha
+
+    def walk(self, tree, prefix=""):
+        """Yields (relative path, mode, sha) of every file in a cached tree"""
+        for mode, name, sha in self.trees.read_tree(tree):
+            path = f"{prefix}{name}"
+            if mode == MODE_TREE:
+                yield from self.walk(sha, path + "/")
+            else:
+                yield path, mode, sha
+
+    def _fetch(self, shas):
+        """Yields (sha, type, data) for objects fetched from the server"""
+        for start in range(0, len(shas), self.fetch_batch):
+            batch = shas[start : start + self.fetch_batch]
+            response = self.session.post(
+                f"{self.objects_url}/fetch",
+                json={"objects": batch},
+                timeout=REQUEST_TIMEOUT,
+            )
+            response.raise_for_status()
+
+            for sha, compressed in read_pack(response.content):
+                type, data = decompress_object(compressed)
+                if hash_object(type, data) != sha:
+                    raise ObjectStoreError(f"Object {sha} does not match its content")
+                yield sha, type, data
+
+    def _write_blob(self, key, data):
+        path = self.blob_path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o555 if key.endswith("x") else 0o444)
+        os.replace(tmp, path)
+
+    def fetch_trees(self, tree):
+        """Fetches the tree objects of a tree a level at a time"""
+        level = [tree]
+        while level:
+            missing = self.trees.missing(level)
+            for sha, type, data in self._fetch(missing):
+                self.trees.write(type, data)
+
+            level = [
+                sha
+                for parent in level
+                for mode, _, sha in self.trees.read_tree(parent)
+                if mode == MODE_TREE
+            ]
+
+    def fetch_blobs(self, files):
+        """Fetches the content of (path, mode, sha) `files` not cached yet"""
+        wanted = {}
+        for _, mode, sha in files:
+            key = self.blob_key(mode, sha)
+            if not self.blob_path(key).exists():
+                wanted.setdefault(sha, set()).add(key)
+
+        for sha, _, data in self._fetch(list(wanted)):
+            for key in wanted[sha]:
+                self._write_blob(key, data)
+
+    def fetch(self, tree):
+        """Fetches whatever part of a tree is not cached yet
+
+        Trees are fetched a level at a time, then all missing files in
+        batches.
+        """
+        self.fetch_trees(tree)
+        self.fetch_blobs(list(self.walk(tree)))
+
+    def checkout(self, tree, dest):
+        """Materializes a tree at `dest`. Returns `dest`
+
+        The tree is added to the cache before its files are fetched, so
+        an eviction made for another checkout never deletes them.
+        """
+        dest = Path(dest)
+        with self.lock:
+            self.pinned[tree] += 1
+        try:
+            self.fetch_trees(tree)
+            files = list(self.walk(tree))
+            self._add(tree, files)
+            self.fetch_blobs(files)
+
+            dest.mkdir(parents=True)
+            real_dest = os.path.realpath(dest)
+            for path, mode, sha in files:
+                if not all(valid_entry_name(name) for name in path.split("/")):
+                    raise ObjectStoreError(f"Invalid path {path!r} in tree {tree}")
+                target = dest / path
+                parent = os.path.realpath(target.parent)
+                if os.path.commonpath([real_dest, parent]) != real_dest:
+                    raise ObjectStoreError(f"Path {path!r} leaves the checkout")
+                target.parent.mkdir(parents=True, exist_ok=True)
+
+                source = self.blob_path(self.blob_key(mode, sha))
+                if mode == MODE_SYMLINK:
+                    os.symlink(source.read_text(), target)
+                    continue
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copy2(source, target)
+
+            with self.lock:
+                self._measure(files)
+                self.complete.add(tree)
+                self._evict()
+                self._save()
+        finally:
+            with self.lock:
+                self.pinned[tree] -= 1
+                incomplete = tree in self.cached and tree not in self.complete
+                if incomplete and self.pinned[tree] == 0:
+                    self._remove(tree)
+        return dest
+
+    def _add(self, tree, files):
+        """Adds a tree to the cache, referencing its files"""
+        keys = {self.blob_key(mode, sha) for _, mode, sha in files}
+        with self.lock:
+            if tree in self.cached:
+                self.cached.move_to_end(tree)
+            else:
+                self.cached[tree] = keys
+                self.refs.update(keys)
+
+    def _measure(self, files):
+        """Records the size of cached files not measured yet"""
+        for _, mode, sha in files:
+            key = self.blob_key(mode, sha)
+            if key not in self.sizes:
+                self.sizes[key] = self.blob_path(key).stat().st_size
+
+    def _remove(self, tree):
+        self.complete.discard(tree)
+        for key in self.cached.pop(tree):
+            self.refs[key] -= 1
+            if self.refs[key] == 0:
+                del self.refs[key]
+                self.sizes.pop(key, None)
+                self.blob_path(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        total = sum(self.sizes.values())
+        for tree in list(self.cached):
+            if total <= self.max_bytes:
+                break
+            if self.pinned[tree] > 0:
+                continue
+
+            for key in self.cached[tree]:
+                if self.refs[key] == 1:
+                    total -= self.sizes.get(key, 0)
+            self._remove(tree)
+
+    def _save(self):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump([tree for tree in self.cached if tree in self.complete], f)
+        os.replace(tmp, self.index_path)
+
+    def _load(self):
+        """Rebuilds the index from disk, dropping anything incomplete"""
+        try:
+            roots = json.loads(self.index_path.read_text())
+        except (FileNotFoundError, ValueError):
+            roots = []
+
+        for tree in roots:
+            try:
+                keys = {self.blob_key(mode, sha) for _, mode, sha in self.walk(tree)}
+            except (KeyError, ObjectStoreError):
+                continue
+            if all(self.blob_path(key).exists() for key in keys):
+                self.cached[tree] = keys
+                self.complete.add(tree)
+                self.refs.update(keys)
+
+        # files left behind by evictions or fetches that never finished
+        for directory in self.blobs.iterdir():
+            for path in directory.iterdir():
+                key = directory.name + path.name
+                if key in self.refs:
+                    self.sizes[key] = path.stat().st_size
+                else:
+                    path.unlink()
+
+        self._evict()
+
+
+__all__ = ["TreeCache"]
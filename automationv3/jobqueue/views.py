@@ -1,11 +1,23 @@
 """Job Runner / Queue"""
 
+import json
 from pathlib import Path
-from flask import Blueprint, render_template, request, jsonify
+from flask import (
+    Blueprint,
+    Response,
+    current_app,
+    render_template,
+    request,
+    stream_template,
+    jsonify,
+)
 from datetime import datetime, timedelta
 
 from . import sqlqueue
+from .aioqueue import wake_waiters
 from .models import Worker
+from .objectstore import PACK_CONTENT_TYPE, ObjectStoreError, get_object_store
+from .scheduler import Capabilities, Scheduler
 from ..database import get_db, db
 
 jobqueue = Blueprint(
@@ -13,25 +25,219 @@ jobqueue = Blueprint(
 )
 
 
-@jobqueue.route("/", methods=["GET"])
-def list():
-    q = sqlqueue.SQLPriorityQueue(get_db())
+# Upper bound on jobs handed out per claim regardless of worker capacity
+MAX_CLAIM_BATCH = 32
+
+# Seconds a claimed job may go without a heartbeat before it is requeued
+LEASE_TIMEOUT = 120
+
+scheduler = Scheduler()
+
 
-    q.put("Task 1")
+def is_count(value):
+    """A JSON integer. `bool` is an `int` subclass and is not one"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+@jobqueue.route("/", methods=["GET"], endpoint="list")
+def list_queue():
+    q = sqlqueue.SQLPriorityQueue(get_db())
 
     return render_template("queue.html", queue=q)
 
 
+def lease_timeout():
+    return current_app.config.get("JOB_LEASE_TIMEOUT", LEASE_TIMEOUT)
+
+
+def live_peers(session, worker_url):
+    """Capabilities of other live workers that have free slots"""
+    five_minutes_ago = datetime.utcnow() - timedelta(minutes=5)
+    workers = (
+        session.query(Worker)
+        .filter(Worker.last_keepalive >= five_minutes_ago)
+        .filter(Worker.free_slots > 0)
+        .filter(Worker.url != worker_url)
+        .all()
+    )
+    return [Capabilities.loads(worker.capabilities) for worker in workers]
+
+
+def record_claim(session, worker_url, capabilities, free_slots):
+    """A claim doubles as a keepalive carrying the worker's capabilities"""
+    worker = session.query(Worker).filter_by(url=worker_url).first()
+    if worker is None:
+        worker = Worker(url=worker_url, capacity=max(free_slots, 1))
+        session.add(worker)
+
+    worker.last_keepalive = datetime.utcnow()
+    worker.free_slots = max(free_slots, 0)
+    worker.capacity = max(worker.capacity or 1, worker.free_slots)
+    worker.status = "available" if worker.free_slots > 0 else "busy"
+    worker.capabilities = capabilities.dumps()
+    session.commit()
+
+
+@jobqueue.route("/jobs/claim", methods=["POST"])
+def claim_jobs():
+    """Hands out a batch of waiting jobs to a worker
+
+    Workers pull work. Each worker asks for at most as many jobs as it
+    has free slots so the server keeps no per-worker dispatch state.
+    The worker's capabilities decide which jobs it may be given.
+    """
+    data = request.json or {}
+    worker_url = data.get("worker")
+    requested = data.get("max", 1)
+
+    if not worker_url:
+        return jsonify({"error": "worker is required"}), 400
+    if not is_count(requested) or requested < 0:
+        return jsonify({"error": "max must be a non-negative integer"}), 400
+
+    capabilities = Capabilities.from_dict(data.get("capabilities"))
+    limit = min(requested, MAX_CLAIM_BATCH)
+
+    with db.session as session:
+        peers = live_peers(session, worker_url)
+
+    q = sqlqueue.SQLPriorityQueue(get_db())
+    if q.requeue_expired(lease_timeout()):
+        wake_waiters(db.get_connection_str())
+
+    def select(candidates, limit):
+        return scheduler.select(capabilities, candidates, limit, peers)
+
+    jobs = q.claim(worker_url, limit, select=select) if limit > 0 else []
+
+    with db.session as session:
+        record_claim(session, worker_url, capabilities, requested - len(jobs))
+
+    return jsonify(
+        {
+            "jobs": [
+                {"message_id": job["message_id"], "message": job["message"]}
+                for job in jobs
+            ],
+            "lease": lease_timeout(),
+        }
+    )
+
+
+@jobqueue.route("/jobs/heartbeat", methods=["POST"])
+def heartbeat_jobs():
+    """Renews the leases for all jobs a worker is running"""
+    data = request.json or {}
+    worker_url = data.get("worker")
+    message_ids = data.get("jobs", [])
+
+    if not worker_url:
+        return jsonify({"error": "worker is required"}), 400
+    if not isinstance(message_ids, list) or not all(
+        isinstance(message_id, str) for message_id in message_ids
+    ):
+        return jsonify({"error": "jobs must be a list of job ids"}), 400
+
+    q = sqlqueue.SQLPriorityQueue(get_db())
+    return jsonify({"jobs": q.heartbeat(worker_url, message_ids)})
+
+
+@jobqueue.route("/jobs/<message_id>/complete", methods=["POST"])
+def complete_job(message_id):
+    data = request.json or {}
+    worker_url = data.get("worker")
+
+    if not worker_url:
+        return jsonify({"error": "worker is required"}), 400
+
+    q = sqlqueue.SQLPriorityQueue(get_db())
+    if not q.complete(worker_url, message_id, json.dumps(data.get("result"))):
+        return jsonify({"error": "Job is not leased to this worker"}), 409
+
+    return jsonify({"status": "done"})
+
+
+@jobqueue.route("/objects/want", methods=["POST"])
+def want_objects():
+    """Tells a client which of its tree's objects need uploading
+
+    A store holding a tree holds everything below it, so when the root
+    `tree` is already present nothing is wanted.
+    """
+    data = request.json or {}
+    objects = data.get("objects", [])
+    tree = data.get("tree")
+
+    if not isinstance(objects, list):
+        return jsonify({"error": "objects must be a list"}), 400
+
+    store = get_object_store()
+    try:
+        if tree and store.has(tree):
+            return jsonify({"want": []})
+        return jsonify({"want": store.missing(objects)})
+    except ObjectStoreError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@jobqueue.route("/objects", methods=["POST"])
+def upload_objects():
+    if request.mimetype != PACK_CONTENT_TYPE:
+        return jsonify({"error": f"Content-Type must be {PACK_CONTENT_TYPE}"}), 415
+
+    try:
+        count = get_object_store().add_pack(request.stream)
+    except (ObjectStoreError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"stored": count})
+
+
+@jobqueue.route("/objects/fetch", methods=["POST"])
+def fetch_objects():
+    """Pack of the requested objects, for workers filling their tree cache"""
+    objects = (request.json or {}).get("objects", [])
+
+    store = get_object_store()
+    try:
+        missing = store.missing(objects)
+    except ObjectStoreError as e:
+        return jsonify({"error": str(e)}), 400
+    if missing:
+        return jsonify({"error": "Objects not found", "missing": missing}), 404
+
+    return Response(store.pack(objects), mimetype=PACK_CONTENT_TYPE)
+
+
+@jobqueue.route("/objects/<sha>", methods=["GET"])
+def get_object(sha):
+    try:
+        compressed = get_object_store().read_raw(sha)
+    except (KeyError, ObjectStoreError):
+        return jsonify({"error": "Object not found"}), 404
+
+    return Response(compressed, mimetype="application/octet-stream")
+
+
 @jobqueue.route("/workers", methods=["POST"])
 def register_worker():
     data = request.json
     worker_url = data.get("url")  # TODO: Validate url
     worker_status = data.get("status", "available")
+    capacity = data.get("capacity", 1)
+    free_slots = data.get("free", capacity)
+    capabilities = data.get("capabilities")
+    if capabilities is not None:
+        capabilities = Capabilities.from_dict(capabilities)
 
     if not worker_url:
         return jsonify({"error": "Worker name is required"}), 400
     if worker_status not in Worker.ALLOWED_STATUS:
         return jsonify({"error": f"Status must be one of {Worker.ALLOWED_STATUS}"}), 400
+    if not is_count(capacity) or not is_count(free_slots):
+        return jsonify({"error": "capacity and free must be integers"}), 400
+    if not 0 <= free_slots <= capacity:
+        return jsonify({"error": "free must be between 0 and capacity"}), 400
 
     with db.session as session:
         worker = session.query(Worker).filter_by(url=worker_url).first()
@@ -40,11 +246,21 @@ def register_worker():
         if worker:
             worker.last_keepalive = datetime.utcnow()
             worker.status = worker_status
+            worker.capacity = capacity
+            worker.free_slots = free_slots
+            if capabilities is not None:
+                worker.capabilities = capabilities.dumps()
             session.commit()
 
         # new worker
         else:
-            new_worker = Worker(url=worker_url, status=worker_status)
+            new_worker = Worker(
+                url=worker_url,
+                status=worker_status,
+                capacity=capacity,
+                free_slots=free_slots,
+                capabilities=capabilities.dumps() if capabilities else None,
+            )
             session.add(new_worker)
             session.commit()
 
@@ -71,7 +287,7 @@ def list_workers():
             )
 
         if hx_request or "text/html" in request.headers.get("Accept", ""):
-            return render_template(
+            return stream_template(
                 "workers.html",
                 workers=workers,
                 show_all=(None if show_all else "all"),
@@ -85,6 +301,11 @@ def list_workers():
                         "id": worker.id,
                         "url": worker.url,
                         "status": worker.status,
+                        "capacity": worker.capacity,
+                        "free": worker.free_slots,
+                        "capabilities": Capabilities.loads(
+                            worker.capabilities
+                        ).to_dict(),
                         "last_keepalive": worker.last_keepalive,
                     }
                     for worker in workers
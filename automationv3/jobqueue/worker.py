@@ -1,18 +1,395 @@
+"""Worker Service
+
+A worker runs queued jobs on a pool of executor slots. The number of
+slots (and whether they are threads or processes) is configurable so a
+single worker host can saturate its cores. The worker reports its total
+and free capacity to the central server in every keepalive.
+
+Work is pulled. A `JobPuller` claims batches of jobs from the central
+server sized to the free slots, renews the leases of running jobs with
+heartbeats and reports results when jobs complete.
+
+Jobs queued with a filesystem tree run in a per-job checkout of it,
+made from the worker's `TreeCache` under `<cache>/jobs/`. Their
+procedure is read from the checkout.
+"""
+
+import os
+import random
+import shutil
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pathlib import Path
+
 import requests
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify
+
+from ..framework import edn
+from ..framework.executor import execute_text
+from .scheduler import Capabilities
+from .treecache import TreeCache
 
 app = Flask(__name__)
 
-worker_status = "available"
+# Seconds to wait on the central server before giving up on a request
+REQUEST_TIMEOUT = 10
+
+
+class JobObserver:
+    """Collects step results of a running job"""
+
+    def __init__(self):
+        self.steps = []
+        self.passed = None
+
+    def on_test_begin(self):
+        pass
+
+    def on_comment(self, text):
+        pass
+
+    def on_step_start(self, index, form):
+        pass
+
+    def on_step_end(self, index, form, result):
+        self.steps.append(
+            {
+                "index": index,
+                "block": str(form[0]),
+                "passed": bool(result),
+                "stdout": result.stdout,
+                "stderr": result.stderr,
+            }
+        )
+
+    def on_test_end(self, passed):
+        self.passed = passed
+
+
+def run_job(message, workdir=None):
+    """Runs a queued job message through the framework executor
+
+    Run in a checkout `workdir` the procedure at the job's `path` in it
+    is run, with the checkout as its working directory. Module level
+    (and returning plain data) so it can be run in a process pool.
+    """
+    job = edn.read(message)
+    text = job["body"]
+    if workdir is not None and job.get("path"):
+        text = procedure_path(workdir, job["path"]).read_text()
+
+    observer = JobObserver()
+    execute_text(text, observer, workdir)
+    return {"passed": observer.passed, "steps": observer.steps}
+
+
+def procedure_path(workdir, path):
+    """`path` in the checkout `workdir`, refusing paths leaving it"""
+    workdir = os.path.realpath(workdir)
+    full = os.path.realpath(os.path.join(workdir, path))
+    if os.path.commonpath([workdir, full]) != workdir:
+        raise ValueError(f"Job path {path!r} is outside of its tree")
+    return Path(full)
+
+
+class WorkerPool:
+    """Fixed number of executor slots for running jobs"""
+
+    EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+    def __init__(self, slots=None, mode="thread", on_change=None, tree_cache=None):
+        if mode not in self.EXECUTORS:
+            raise ValueError(f"Pool mode must be one of {list(self.EXECUTORS)}")
+
+        self.slots = slots or os.cpu_count() or 1
+        self.mode = mode
+        self.on_change = on_change
+        self.executor = self.EXECUTORS[mode](max_workers=self.slots)
+
+        # checkouts are made off the executor so process pools need not
+        # share the cache
+        self.tree_cache = tree_cache
+        self.checkouts = ThreadPoolExecutor(max_workers=self.slots)
+
+        self.lock = threading.Lock()
+        self.running = {}
+        self.results = {}
+        # running jobs whose lease was lost, their results are dropped
+        self.abandoned = set()
+
+    @property
+    def free_slots(self):
+        with self.lock:
+            return self.slots - len(self.running)
+
+    def running_jobs(self):
+        with self.lock:
+            return sorted(self.running)
+
+    @property
+    def status(self):
+        return "available" if self.free_slots > 0 else "busy"
+
+    def submit(self, job_id, message):
+        """Starts a job. Returns False if all slots are in use"""
+        with self.lock:
+            if len(self.running) >= self.slots:
+                return False
+            tree = self.job_tree(message)
+            if tree is None:
+                future = self.executor.submit(run_job, message)
+            else:
+                future = self.checkouts.submit(
+                    self._run_in_checkout, job_id, message, tree
+                )
+            self.running[job_id] = future
+
+        future.add_done_callback(lambda f: self._finished(job_id, f))
+        self._changed()
+        return True
+
+    def job_tree(self, message):
+        if self.tree_cache is None:
+            return None
+        return edn.read(message).get("tree")
+
+    def _run_in_checkout(self, job_id, message, tree):
+        workdir = self.tree_cache.root / "jobs" / str(job_id)
+        shutil.rmtree(workdir, ignore_errors=True)
+        try:
+            self.tree_cache.checkout(tree, workdir)
+            return self.executor.submit(run_job, message, workdir).result()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def capabilities(self):
+        return Capabilities.local(
+            simulators=app.config.get("SIMULATORS", []),
+            tags=app.config.get("TAGS", []),
+            trees=self.tree_cache.roots() if self.tree_cache else (),
+        )
+
+    def _finished(self, job_id, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {"passed": False, "steps": [], "error": str(e)}
+
+        with self.lock:
+            self.running.pop(job_id, None)
+            if job_id in self.abandoned:
+                self.abandoned.discard(job_id)
+            else:
+                self.results[job_id] = result
+        self._changed()
+
+    def finished_results(self):
+        """(job id, result) of finished jobs not yet `forget_result`"""
+        with self.lock:
+            return list(self.results.items())
+
+    def forget_result(self, job_id):
+        with self.lock:
+            self.results.pop(job_id, None)
+
+    def abandon(self, job_id):
+        """Stops tracking a job another worker now owns
+
+        A job not started yet is cancelled. One already running is left
+        to finish, but its result is never reported.
+        """
+        with self.lock:
+            future = self.running.get(job_id)
+            if future is None:
+                return
+            self.abandoned.add(job_id)
+        # outside the lock, a cancelled future runs its done callback now
+        future.cancel()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def keepalive_data(self):
+        return {
+            "url": app.config.get("SELF_URL", ""),
+            "status": self.status,
+            "capacity": self.slots,
+            "free": self.free_slots,
+            "capabilities": self.capabilities().to_dict(),
+        }
+
+    def shutdown(self, wait=True):
+        self.checkouts.shutdown(wait=wait)
+        self.executor.shutdown(wait=wait)
+
+
+class JobPuller:
+    """Pulls jobs from the central server into a `WorkerPool`
+
+    `session` is anything with a `requests` style `post`. The loop backs
+    off exponentially (with jitter) while the queue is empty so hundreds
+    of idle workers do not hammer the server, and wakes immediately when
+    a slot frees up.
+    """
+
+    def __init__(
+        self,
+        pool,
+        jobs_url,
+        worker_url,
+        session=requests,
+        idle_interval=1.0,
+        max_idle_interval=15.0,
+        heartbeat_interval=30.0,
+        capabilities=None,
+    ):
+        self.pool = pool
+        self.capabilities = capabilities or Capabilities.local()
+        self.jobs_url = jobs_url.rstrip("/")
+        self.worker_url = worker_url
+        self.session = session
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.heartbeat_interval = heartbeat_interval
+
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.last_heartbeat = time.monotonic()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def claim(self):
+        """Claims as many jobs as there are free slots. Returns claimed count"""
+        free = self.pool.free_slots
+        if free <= 0:
+            return 0
+
+        capabilities = self.capabilities.to_dict()
+        if self.pool.tree_cache is not None:
+            capabilities["trees"] = self.pool.tree_cache.roots()
+
+        response = self.session.post(
+            f"{self.jobs_url}/claim",
+            json={
+                "worker": self.worker_url,
+                "max": free,
+                "capabilities": capabilities,
+            },
+            timeout=REQUEST_TIMEOUT,
+        )
+        if response.status_code != 200:
+            return 0
+
+        jobs = response.json()["jobs"]
+        for job in jobs:
+            if not self.pool.submit(job["message_id"], job["message"]):
+                # Lease expires and the server requeues it
+                break
+        return len(jobs)
+
+    def heartbeat(self):
+        """Renews the running jobs' leases, abandoning the ones lost"""
+        running = self.pool.running_jobs()
+        if running:
+            response = self.session.post(
+                f"{self.jobs_url}/heartbeat",
+                json={"worker": self.worker_url, "jobs": running},
+                timeout=REQUEST_TIMEOUT,
+            )
+            if response.status_code == 200:
+                leased = set(response.json()["jobs"])
+                for job_id in running:
+                    if job_id not in leased:
+                        self.pool.abandon(job_id)
+        self.last_heartbeat = time.monotonic()
+
+    def report_results(self):
+        """Reports finished jobs. A result is kept until the server has it
+
+        Results the server refuses with 409 belong to a lease that was
+        lost, the job was requeued and is not ours to complete.
+        """
+        for job_id, result in self.pool.finished_results():
+            response = self.session.post(
+                f"{self.jobs_url}/{job_id}/complete",
+                json={"worker": self.worker_url, "result": result},
+                timeout=REQUEST_TIMEOUT,
+            )
+            if response.status_code == 409:
+                print(f"Lease on job {job_id} was lost, dropping its result")
+            elif response.status_code != 200:
+                # retried on the next pass
+                continue
+            self.pool.forget_result(job_id)
+
+    def run_once(self):
+        self.report_results()
+        if time.monotonic() - self.last_heartbeat >= self.heartbeat_interval:
+            self.heartbeat()
+        return self.claim()
+
+    def run_forever(self):
+        backoff = self.idle_interval
+        while not self.stopped.is_set():
+            try:
+                claimed = self.run_once()
+            except requests.RequestException as e:
+                print("Job pull failed:", e)
+                claimed = 0
+
+            if claimed:
+                backoff = self.idle_interval
+                continue
+
+            timeout = backoff * random.uniform(0.5, 1.0)
+            if self.pool.free_slots > 0:
+                backoff = min(backoff * 2, self.max_idle_interval)
+            self.wakeup.wait(min(timeout, self.heartbeat_interval))
+            self.wakeup.clear()
+
+    def stop(self):
+        self.stopped.set()
+        self.wake()
+
+
+pool = None
+puller = None
+
+
+def init_pool(slots=None, mode="thread", tree_cache=None):
+    global pool
+    pool = WorkerPool(slots, mode, tree_cache=tree_cache)
+    return pool
+
+
+def init_tree_cache(path, max_bytes):
+    return TreeCache(path, app.config["OBJECTS_URL"], max_bytes=max_bytes)
+
+
+def start_puller():
+    global puller
+    puller = JobPuller(
+        pool,
+        app.config["JOBS_URL"],
+        app.config["SELF_URL"],
+        capabilities=pool.capabilities(),
+    )
+    pool.on_change = puller.wake
+
+    puller_thread = threading.Thread(target=puller.run_forever)
+    puller_thread.daemon = True
+    puller_thread.start()
+    return puller
 
 
 def register_worker():
     # Perform initial registration with the central server
-    worker_details = {"url": "http://worker-url.com", "status": worker_status}
-
-    response = requests.post(app.config["WORKER_URL"], json=worker_details)
+    response = requests.post(
+        app.config["WORKER_URL"], json=pool.keepalive_data(), timeout=REQUEST_TIMEOUT
+    )
     if response.status_code == 200:
         print("Registration successful")
         keep_alive_thread = threading.Thread(target=send_keep_alive_forever)
@@ -28,35 +405,24 @@ def send_keep_alive_forever():
 
 
 def send_keep_alive_message():
-    keep_alive_data = {"url": "http://worker-url.com", "status": worker_status}
-    requests.post(app.config["WORKER_URL"], json=keep_alive_data)
-
-
-def update_status(new_status):
-    global worker_status
-    worker_status = new_status
-    send_keep_alive_message()
-
-
-@app.route("/submit-job", methods=["POST"])
-def submit_job():
-    if worker_status != "available":
-        return jsonify({"status": "Work is current busy. Job not started"}), 503
-
-    job_data = request.json
-    update_status("busy")
-    job_thread = threading.Thread(target=process_job, args=(job_data,))
-    job_thread.daemon = True
-    job_thread.start()
-    return jsonify({"status": "Job submitted"}), 202
+    try:
+        requests.post(
+            app.config["WORKER_URL"],
+            json=pool.keepalive_data(),
+            timeout=REQUEST_TIMEOUT,
+        )
+    except requests.RequestException as e:
+        print("Keepalive failed:", e)
 
 
-def process_job(job_data):
-    # Implement job processing logic here
-    print("Executing", job_data)
-    time.sleep(20)
-    print("Job Complete")
-    update_status("available")
+@app.route("/status")
+def status():
+    return jsonify(
+        {
+            **pool.keepalive_data(),
+            "running": pool.running_jobs(),
+        }
+    )
 
 
 @app.route("/")
@@ -65,5 +431,7 @@ def index():
 
 
 if __name__ == "__main__":
+    init_pool()
     register_worker()
+    start_puller()
     app.run(debug=True)
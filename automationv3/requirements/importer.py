@@ -0,0 +1,261 @@
+"""Bulk requirement import
+
+Requirement exports run to 100k lines, far too many to add one ORM
+object at a time. Files are streamed instead, a batch of `BATCH_SIZE`
+rows at a time:
+
+1. rows are read and validated, invalid rows are reported and skipped
+2. the batch is diffed against the requirements already stored
+3. only new and changed requirements are written, with one
+   `executemany` upsert per batch in a single transaction
+
+Supported formats, picked by file suffix unless given:
+
+* ``.csv``  with a header naming `id`, `text` and optionally `subsystem`
+* ``.edn``  maps with `:id`, `:text` and optionally `:subsystem`, either
+  as top-level forms or in a single vector
+* anything else is text, one requirement per line with its id in
+  brackets at the end: ``The software shall ... [VMCCOMM00001].``
+
+Without a subsystem, the letters following the id's `VMC` prefix are
+used (`VMCCOMM00001` is in `COMM`).
+"""
+
+import csv
+import itertools
+import re
+import time
+from pathlib import Path
+
+from ..framework import edn
+
+BATCH_SIZE = 5000
+
+# Ids looked up per diff query, below SQLite's bound parameter limit
+LOOKUP_SIZE = 500
+
+# Column sizes of `Requirement`
+MAX_TEXT_LENGTH = 1024
+MAX_SUBSYSTEM_LENGTH = 20
+
+text_line_pattern = re.compile(r"^(?P<text>.*?)\s*\[(?P<id>[^\[\]]+)\]\s*\.?\s*$")
+subsystem_pattern = re.compile(r"^VMC([A-Za-z]+)")
+
+
+class ImportFileError(Exception):
+    pass
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        # (line, message) of every row skipped
+        self.errors = []
+
+    @property
+    def written(self):
+        return self.inserted + self.updated
+
+    def __str__(self):
+        return (
+            f"{self.read} read, {self.inserted} new, {self.updated} changed,"
+            f" {self.unchanged} unchanged, {len(self.errors)} invalid"
+        )
+
+
+def subsystem_of(id):
+    match = subsystem_pattern.match(id)
+    return match.group(1) if match else None
+
+
+def read_text(lines):
+    """Yields (line, fields) of `text [ID].` lines"""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        match = text_line_pattern.match(line.strip())
+        if match is None:
+            yield number, None
+        else:
+            yield number, {"id": match["id"], "text": match["text"]}
+
+
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None or not {"id", "text"} <= set(reader.fieldnames):
+        raise ImportFileError("CSV header must name id and text columns")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_edn(lines):
+    """Yields (form number, fields) of requirement maps
+
+    Forms are read one at a time from the stream, a top-level vector is
+    read whole.
+    """
+    stream = edn.PushBackCharStream(itertools.chain.from_iterable(lines))
+    number = 0
+    while True:
+        try:
+            form = edn.read(stream)
+        except edn.ReadError as e:
+            raise ImportFileError(str(e)) from e
+        if form is edn.READ_EOF:
+            return
+
+        forms = form if isinstance(form, edn.Vector) else [form]
+        for form in forms:
+            number += 1
+            if isinstance(form, dict):
+                yield number, {str(k).lstrip(":"): v for k, v in form.items()}
+            else:
+                yield number, None
+
+
+readers = {"csv": read_csv, "edn": read_edn, "text": read_text}
+
+
+def validate(fields):
+    """(id, text, subsystem) of a row's fields. ValueError if invalid"""
+    if fields is None:
+        raise ValueError("not a requirement")
+
+    id = str(fields.get("id") or "").strip()
+    text = str(fields.get("text") or "").strip()
+    subsystem = str(fields.get("subsystem") or "").strip() or subsystem_of(id)
+
+    if not id:
+        raise ValueError("missing id")
+    if not text:
+        raise ValueError(f"{id}: missing text")
+    if len(text) > MAX_TEXT_LENGTH:
+        raise ValueError(f"{id}: text longer than {MAX_TEXT_LENGTH} characters")
+    if not subsystem:
+        raise ValueError(f"{id}: missing subsystem")
+    if len(subsystem) > MAX_SUBSYSTEM_LENGTH:
+        raise ValueError(
+            f"{id}: subsystem longer than {MAX_SUBSYSTEM_LENGTH} characters"
+        )
+    return id, text, subsystem
+
+
+def stored(conn, ids):
+    """(text, subsystem) of the requirements stored with `ids`, by id"""
+    rows = {}
+    for i in range(0, len(ids), LOOKUP_SIZE):
+        chunk = ids[i : i + LOOKUP_SIZE]
+        cursor = conn.execute(
+            f"""
+            SELECT id, text, subsystem
+            FROM Requirement
+            WHERE id IN ({", ".join("?" * len(chunk))})
+        """,
+            chunk,
+        )
+        rows.update((id, (text, subsystem)) for id, text, subsystem in cursor)
+    return rows
+
+
+def write_batch(conn, batch, stats, dry_run=False):
+    """Writes the requirements of `batch` that are new or changed"""
+    existing = stored(conn, [id for id, _, _ in batch])
+    changed = []
+    for id, text, subsystem in batch:
+        if id not in existing:
+            stats.inserted += 1
+        elif existing[id] != (text, subsystem):
+            stats.updated += 1
+        else:
+            stats.unchanged += 1
+            continue
+        changed.append((id, text, subsystem))
+
+    if dry_run or not changed:
+        return
+
+    # the same timestamp versions the ORM gives (see `Requirement.version`)
+    version = time.time_ns()
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO Requirement (id, text, subsystem, version)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE
+            SET text = excluded.text,
+                subsystem = excluded.subsystem,
+                version = excluded.version
+        """,
+            [(id, text, subsystem, version) for id, text, subsystem in changed],
+        )
+
+
+def has_table(conn, name):
+    cursor = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    )
+    return cursor.fetchone() is not None
+
+
+def import_requirements(
+    conn, rows, batch_size=BATCH_SIZE, dry_run=False, progress=None
+):
+    """Imports (line, fields) `rows` into the `Requirement` table
+
+    Calls `progress(stats)` after every batch. With `dry_run` the diff
+    is computed but nothing is written. Rows repeating an id already
+    read are reported and skipped.
+    """
+    if not has_table(conn, "Requirement"):
+        raise ImportFileError(
+            "The database has no Requirement table,"
+            " create its schema with `alembic upgrade head` first"
+        )
+
+    stats = ImportStats()
+    seen = set()
+    batch = []
+
+    for line, fields in rows:
+        stats.read += 1
+        try:
+            requirement = validate(fields)
+        except ValueError as e:
+            stats.errors.append((line, str(e)))
+            continue
+        if requirement[0] in seen:
+            stats.errors.append((line, f"{requirement[0]}: duplicate id"))
+            continue
+        seen.add(requirement[0])
+
+        batch.append(requirement)
+        if len(batch) >= batch_size:
+            write_batch(conn, batch, stats, dry_run)
+            batch = []
+            if progress:
+                progress(stats)
+
+    if batch:
+        write_batch(conn, batch, stats, dry_run)
+    if progress:
+        progress(stats)
+    return stats
+
+
+def import_file(conn, path, format=None, **kwargs):
+    """Imports a requirements file, see `import_requirements`
+
+    `format` is ``csv``, ``edn`` or ``text``, by default the file suffix.
+    """
+    path = Path(path)
+    format = format or path.suffix.lstrip(".").lower()
+    reader = readers.get(format, read_text)
+    # the csv module handles line endings itself
+    with path.open(newline="" if reader is read_csv else None, encoding="utf-8") as f:
+        return import_requirements(conn, reader(f), **kwargs)
+
+
+__all__ = ["ImportFileError", "ImportStats", "import_file", "import_requirements"]
@@ -1,10 +1,56 @@
 import re
+import time
 
-from sqlalchemy import String
+from sqlalchemy import DDL, BigInteger, Index, String, event, func, or_, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from ..database.base import ModelBase
 
+# Requirements listed per page
+PAGE_SIZE = 100
+
+# Full-text index over requirement ids and text. External content, so
+# the text is not stored twice, kept in sync by triggers.
+SEARCH_TABLE = "requirement_fts"
+SEARCH_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE {SEARCH_TABLE}
+    USING fts5(id, text, content='Requirement', content_rowid='rowid')
+    """,
+    f"""
+    CREATE TRIGGER requirement_fts_insert AFTER INSERT ON "Requirement" BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, id, text)
+        VALUES (new.rowid, new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER requirement_fts_delete AFTER DELETE ON "Requirement" BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, id, text)
+        VALUES ('delete', old.rowid, old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER requirement_fts_update AFTER UPDATE OF id, text
+    ON "Requirement" BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, id, text)
+        VALUES ('delete', old.rowid, old.id, old.text);
+        INSERT INTO {SEARCH_TABLE}(rowid, id, text)
+        VALUES (new.rowid, new.id, new.text);
+    END
+    """,
+]
+
+
+def match_expression(search):
+    """FTS5 query matching every word of `search` as a prefix"""
+    words = search.split()
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def like_pattern(search):
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
 
 class Requirement(ModelBase):
     __tablename__ = "Requirement"
@@ -13,10 +59,72 @@ class Requirement(ModelBase):
     text: Mapped[str] = mapped_column(String(1024))
     subsystem: Mapped[str] = mapped_column(String(20))
 
+    # Bumped by every insert and update, see `table_version`
+    version: Mapped[int] = mapped_column(BigInteger, server_default="0")
+
+    __table_args__ = (
+        # browsing a subsystem in id order never sorts
+        Index("ix_Requirement_subsystem_id", "subsystem", "id"),
+    )
+
+    __mapper_args__ = {
+        "version_id_col": version,
+        "version_id_generator": lambda version: max(time.time_ns(), (version or 0) + 1),
+    }
+
     @classmethod
     def find_by_id(cls, session, id):
         return session.query(cls).filter_by(id=id).first()
 
+    @classmethod
+    def table_version(cls, session):
+        """Changes whenever a requirement is added, changed or removed
+
+        Versions are timestamps so any insert or update raises the
+        newest one, and removing rows lowers the count.
+        """
+        return tuple(session.query(func.count(cls.id), func.max(cls.version)).one())
+
+    @classmethod
+    def page(cls, session, subsystem=None, search=None, after=None, limit=PAGE_SIZE):
+        """Up to `limit` requirements in id order, starting after id `after`
+
+        Returns the requirements and the `after` of the next page, None
+        on the last page. Seeking by id costs the same on every page,
+        unlike an OFFSET.
+        """
+        query = session.query(cls)
+        if subsystem:
+            query = query.filter(cls.subsystem == subsystem)
+        if after:
+            query = query.filter(cls.id > after)
+        if search and search.strip():
+            query = query.filter(cls.search_filter(session, search))
+
+        rows = query.order_by(cls.id).limit(limit + 1).all()
+        if len(rows) > limit:
+            return rows[:limit], rows[limit - 1].id
+        return rows, None
+
+    @classmethod
+    def search_filter(cls, session, search):
+        """Matches `search` by full-text index, by LIKE without one"""
+        if cls.has_search_index(session):
+            return text(
+                f'"Requirement".rowid IN (SELECT rowid FROM {SEARCH_TABLE}'
+                f" WHERE {SEARCH_TABLE} MATCH :search)"
+            ).bindparams(search=match_expression(search))
+
+        pattern = like_pattern(search.strip())
+        return or_(
+            cls.id.like(pattern, escape="\\"), cls.text.like(pattern, escape="\\")
+        )
+
+    @staticmethod
+    def has_search_index(session):
+        query = text("SELECT 1 FROM sqlite_master WHERE name = :name")
+        return session.execute(query, {"name": SEARCH_TABLE}).first() is not None
+
     def __eq__(self, other):
         return (self.id, self.text, self.subsystem) == (
             other.id,
@@ -38,3 +146,13 @@ class Requirement(ModelBase):
         else:
             markup = f"<strong>[{self.id}]</strong>"
         return f'<div class="mb-2">{markup}</div>'
+
+
+# create_all creates the search index too, migrations create it for
+# existing databases
+for statement in SEARCH_DDL:
+    event.listen(
+        Requirement.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="sqlite"),
+    )
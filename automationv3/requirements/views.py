@@ -1,8 +1,9 @@
 from pathlib import Path
-from flask import Blueprint, render_template, request, abort
+from flask import Blueprint, abort, jsonify, render_template, request, stream_template
 
-from .models import Requirement
+from .models import PAGE_SIZE, Requirement
 from ..database import db
+from ..httpcache import make_etag, not_modified, tagged
 
 requirements = Blueprint(
     "requirements",
@@ -11,26 +12,66 @@ requirements = Blueprint(
 )
 
 
+# Most requirements a JSON client can ask for at once
+MAX_PAGE_SIZE = 1000
+
+
+def wants_json():
+    best = request.accept_mimetypes.best_match(["text/html", "application/json"])
+    return best == "application/json"
+
+
 @requirements.route("/", methods=["GET"])
 def list():
+    """A page of requirements, optionally of a subsystem or matching `q`
+
+    Pages are keyed by the id they start `after`. Answers JSON to
+    clients that prefer it.
+    """
     subsystem = request.args.get("subsystem")
+    search = request.args.get("q")
+    after = request.args.get("after")
+    limit = min(max(request.args.get("limit", PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
 
     with db.session as session:
-        subsystems = [
-            r.subsystem for r in session.query(Requirement.subsystem).distinct()
-        ]
+        reqs, next_after = Requirement.page(
+            session, subsystem=subsystem, search=search, after=after, limit=limit
+        )
+
+        if wants_json():
+            return jsonify(
+                {
+                    "requirements": [
+                        {"id": r.id, "text": r.text, "subsystem": r.subsystem}
+                        for r in reqs
+                    ],
+                    "next": next_after,
+                }
+            )
+
+        context = dict(
+            requirements=reqs,
+            next_after=next_after,
+            selected_subsystem=subsystem,
+            search=search,
+        )
+
+        # the next page of a list already shown
+        if after:
+            return render_template("partials/requirements_page.html", **context)
 
-        query = session.query(Requirement)
-        if subsystem:
-            query = query.filter(Requirement.subsystem == subsystem)
-        reqs = query.all()
+        hx_request = request.headers.get("HX-Request", False)
+        subsystems = []
+        if not hx_request:
+            subsystems = [
+                r.subsystem for r in session.query(Requirement.subsystem).distinct()
+            ]
 
-    return render_template(
+    return stream_template(
         "requirements.html",
-        requirements=reqs,
-        hx_request=request.headers.get("HX-Request", False),
-        selected_subsystem=subsystem,
+        hx_request=hx_request,
         subsystems=subsystems,
+        **context,
     )
 
 
@@ -42,4 +83,7 @@ def by_id(id):
     if requirement is None:
         abort(404)
 
-    return requirement.__repr_html__()
+    etag = make_etag(requirement.id, requirement.version)
+    if (response := not_modified(etag)) is not None:
+        return response
+    return tagged(requirement.__repr_html__(), etag)
@@ -0,0 +1,99 @@
+"""Response compression benchmark
+
+Serves the requirements list with N requirements from waitress, the
+way the editor is deployed, and loads it from concurrent clients with
+and without `Accept-Encoding: gzip`. Reports throughput, bytes
+transferred and time to first byte.
+
+    python -m test.benchmarks.compression_benchmark [--requirements N]
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from waitress import create_server
+
+from automationv3 import editor
+from automationv3.compression import GzipMiddleware
+from automationv3.requirements.models import Requirement
+from automationv3.requirements.views import requirements
+
+
+def make_app(db_path, count):
+    engine = create_engine(f"sqlite:///{db_path}")
+    Requirement.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(
+            Requirement(
+                id=f"VMC-{i:06d}",
+                text=f"The subsystem shall handle case {i} within 10 ms",
+                subsystem=f"SUB{i % 20}",
+            )
+            for i in range(count)
+        )
+        session.commit()
+
+    app = Flask(__name__, template_folder=Path(editor.__file__).parent / "templates")
+    app.register_blueprint(requirements, url_prefix="/requirements")
+    app.config["DB_PATH"] = db_path
+    app.config["DB_SESSION_MAKER"] = sessionmaker(engine)
+    app.wsgi_app = GzipMiddleware(app.wsgi_app)
+    return app
+
+
+def fetch(url, encoding):
+    request = urllib.request.Request(url, headers={"Accept-Encoding": encoding})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        first = response.read(1)
+        first_byte = time.perf_counter() - start
+        size = len(first) + len(response.read())
+    return size, first_byte
+
+
+def load(url, encoding, requests, clients):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        results = list(pool.map(lambda _: fetch(url, encoding), range(requests)))
+    elapsed = time.perf_counter() - start
+
+    transferred = sum(size for size, _ in results)
+    first_byte = sorted(first_byte for _, first_byte in results)[len(results) // 2]
+    label = encoding or "identity"
+    print(
+        f"{label:<10} {requests / elapsed:8.1f} req/s"
+        f" {transferred / requests / 1024:10.1f} KiB/req"
+        f" {first_byte * 1000:10.1f} ms to first byte (median)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requirements", type=int, default=5_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(str(Path(tmp) / "bench.db"), args.requirements)
+        server = create_server(app, host="127.0.0.1", port=0, threads=8)
+        threading.Thread(target=server.run, daemon=True).start()
+        url = f"http://127.0.0.1:{server.effective_port}/requirements/"
+
+        try:
+            for encoding in ["", "gzip"]:
+                load(url, encoding, args.requests, args.clients)
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Commit log benchmark
+
+Builds a repository with 10k commits (using `git fast-import` so setup
+takes seconds) and times the commit log reader against the old approach
+of one `git show` per commit and field.
+
+    python -m test.benchmarks.gitlog_benchmark [--commits N]
+"""
+
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from automationv3.editor.gitlog import GitLog
+
+
+def make_repo(root, count):
+    subprocess.check_call(["git", "init", "-q", root])
+
+    stream = []
+    for i in range(count):
+        content = f"revision {i}\n".encode()
+        message = f"Commit {i}\n\nChanges file {i % 100}\n".encode()
+        stream.append(b"commit refs/heads/master\n")
+        stream.append(
+            f"committer Bench <bench@example.com> {1700000000 + i} +0000\n".encode()
+        )
+        stream.append(b"data %d\n%s\n" % (len(message), message))
+        stream.append(b"M 100644 inline dir/file_%d.txt\n" % (i % 100))
+        stream.append(b"data %d\n%s\n" % (len(content), content))
+
+    subprocess.run(
+        ["git", "fast-import", "--quiet"], cwd=root, input=b"".join(stream), check=True
+    )
+    subprocess.check_call(["git", "checkout", "-q", "master"], cwd=root)
+
+
+def old_commit(root, commit_hash):
+    """What the view used to do for every commit"""
+
+    def show(*args):
+        return subprocess.check_output(["git", "show", *args, commit_hash], cwd=root)
+
+    return {
+        "files": show("--pretty=", "--name-only").decode().splitlines(),
+        "author": show('--pretty="%an"', "-s").decode().strip(),
+        "date": show('--pretty="%cd"', "-s").decode().strip(),
+        "message": show('--pretty="%B"', "-s").decode().strip(),
+    }
+
+
+def timed(label, func, scale=1):
+    start = time.perf_counter()
+    result = func()
+    elapsed = (time.perf_counter() - start) * scale
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commits", type=int, default=10_000)
+    parser.add_argument("--old-sample", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        timed(f"create {args.commits} commits", lambda: make_repo(root, args.commits))
+
+        log = GitLog(root)
+        commits = timed("full log", log.commits)
+        assert len(commits) == args.commits
+
+        timed("first page (50)", lambda: log.commits(max_count=50))
+        timed(
+            "last page (50)", lambda: log.commits(skip=args.commits - 50, max_count=50)
+        )
+        timed("single commit", lambda: log.get_commit(commits[-1]["hash"]))
+
+        sample = commits[: args.old_sample]
+        timed(
+            f"old full log (from {len(sample)} commits)",
+            lambda: [old_commit(root, c["hash"]) for c in sample],
+            scale=args.commits / len(sample),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Fixtures shared by the job queue, object store and tree cache tests"""
+
+import os
+from pathlib import Path
+
+from flask import Flask, g
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from automationv3.database import db, ModelBase
+from automationv3.jobqueue import jobqueue
+
+
+def remove_db():
+    for suffix in ("", "-wal", "-shm"):
+        path = db.get_connection_str() + suffix
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def create_app():
+    app = Flask(__name__)
+    app.register_blueprint(jobqueue, url_prefix="/runner")
+    app.testing = True
+
+    engine = create_engine(f"sqlite:///{db.get_connection_str()}")
+    ModelBase.metadata.create_all(engine)
+    app.config["DB_SESSION_MAKER"] = sessionmaker(engine)
+
+    @app.teardown_appcontext
+    def close_db(error):
+        if hasattr(g, "sqlite_db"):
+            g.sqlite_db.close()
+
+    return app
+
+
+def make_tree(root, files):
+    for name, content in files.items():
+        path = Path(root) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
@@ -19,12 +19,14 @@ Options:
  
 
 """
+import sqlite3
+from contextlib import closing
 from pathlib import Path
 
 from docopt import docopt 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import Session
 
+from automationv3.requirements.importer import import_file
 from automationv3.requirements.models import Requirement
 
 SAMPLE_DATA_PATH = Path(__file__).resolve().parent / 'sample_requirements.txt'
@@ -36,28 +38,14 @@ def load_sample():
     dbpath = args['--dbpath']
     data = args['--data']
 
-    engine = create_engine(f'sqlite:///{dbpath}')
+    # creates the tables if the database is new
+    Requirement.metadata.create_all(create_engine(f'sqlite:///{dbpath}'))
 
-    def line_to_requirement(line):
-        line = line.strip()
-        idx = line.rfind("[")
-        requirement_text = line[:idx].strip()
-        requirement_id = line[idx + 1:-2].strip()
-        subsystem = requirement_id.split("VMC")[1].split("0")[0].strip()
-        return Requirement(
-            id=requirement_id, 
-            text=requirement_text, 
-            subsystem=subsystem
-        )
-
-    with (
-        open(data, 'r') as file,
-        Session(engine) as session
-    ):
-        requirements = [line_to_requirement(line)
-                        for line in file]
-        session.add_all(requirements)
-        session.commit()
+    with closing(sqlite3.connect(dbpath)) as conn:
+        stats = import_file(conn, data, format='text')
+    print(stats)
+    for line, message in stats.errors:
+        print(f'line {line}: {message}')
 
 if __name__ == '__main__':
     load_sample()
@@ -0,0 +1,144 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from automationv3.jobqueue.aioqueue import (
+    AsyncSQLPriorityQueue,
+    WakeChannel,
+    wake_waiters,
+)
+from automationv3.jobqueue.sqlqueue import SQLPriorityQueue
+
+
+class TestAsyncSqlPriorityQueue(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = Path(tempfile.mkdtemp())
+        self.db_file = self.tempdir / "queue.db"
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_get_returns_existing_message(self):
+        async def run():
+            q = AsyncSQLPriorityQueue.open(memory=True)
+            await q.put("Message 1")
+            return await q.get()
+
+        self.assertEqual(asyncio.run(run())["message"], "Message 1")
+
+    def test_get_nowait_raises_when_empty(self):
+        q = AsyncSQLPriorityQueue(SQLPriorityQueue(memory=True))
+        with self.assertRaises(asyncio.QueueEmpty):
+            q.get_nowait()
+
+    def test_get_waits_for_put(self):
+        async def run():
+            q = AsyncSQLPriorityQueue.open(memory=True, poll_interval=60)
+            getter = asyncio.create_task(q.get())
+            await asyncio.sleep(0.05)
+            self.assertFalse(getter.done())
+
+            await q.put("Message 1")
+            return await asyncio.wait_for(getter, 1)
+
+        self.assertEqual(asyncio.run(run())["message"], "Message 1")
+
+    def test_pop_runs_off_the_event_loop(self):
+        async def run():
+            q = AsyncSQLPriorityQueue.open(memory=True)
+            threads = []
+            pop = q.queue.pop
+
+            def recording_pop():
+                threads.append(threading.get_ident())
+                return pop()
+
+            q.queue.pop = recording_pop
+            await q.put("Message 1")
+            await q.get()
+            return threads
+
+        threads = asyncio.run(run())
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_pop_does_not_return_locked_message(self):
+        q = SQLPriorityQueue(memory=True)
+        q.put("Message 1")
+        q.pop()
+        q.put("Message 2")
+
+        self.assertEqual(q.pop()["message"], "Message 2")
+        self.assertIsNone(q.pop())
+
+    @unittest.skipUnless(WakeChannel.supported(), "requires unix sockets")
+    def test_cross_process_wakeup(self):
+        async def run():
+            consumer = AsyncSQLPriorityQueue.open(self.db_file, poll_interval=60)
+            producer = AsyncSQLPriorityQueue.open(self.db_file, poll_interval=60)
+            try:
+                getter = asyncio.create_task(consumer.get())
+                await asyncio.sleep(0.05)
+
+                start = time.monotonic()
+                await producer.put("Message 1")
+                message = await asyncio.wait_for(getter, 1)
+                return message, time.monotonic() - start
+            finally:
+                consumer.close()
+                producer.close()
+
+        message, elapsed = asyncio.run(run())
+        self.assertEqual(message["message"], "Message 1")
+        self.assertLess(elapsed, 0.5)
+
+    @unittest.skipUnless(WakeChannel.supported(), "requires unix sockets")
+    def test_plain_producer_wakes_waiters(self):
+        async def run():
+            consumer = AsyncSQLPriorityQueue.open(self.db_file, poll_interval=60)
+            producer = SQLPriorityQueue(self.db_file)
+            try:
+                getter = asyncio.create_task(consumer.get())
+                await asyncio.sleep(0.05)
+
+                producer.put("Message 1")
+                wake_waiters(self.db_file)
+                return await asyncio.wait_for(getter, 1)
+            finally:
+                consumer.close()
+                producer.conn.close()
+
+        self.assertEqual(asyncio.run(run())["message"], "Message 1")
+
+    @unittest.skipUnless(WakeChannel.supported(), "requires unix sockets")
+    def test_wake_channel_sync_wait(self):
+        waiter = WakeChannel(self.tempdir / "wake")
+        notifier = WakeChannel(self.tempdir / "wake")
+        try:
+            waiter.open()
+            self.assertFalse(waiter.wait(0))
+
+            notifier.notify()
+            self.assertTrue(waiter.wait(1))
+        finally:
+            waiter.close()
+
+    @unittest.skipUnless(WakeChannel.supported(), "requires unix sockets")
+    def test_notify_removes_stale_waiters(self):
+        wake_dir = self.tempdir / "wake"
+        stale = WakeChannel(wake_dir)
+        stale.open()
+        stale_path = stale.path
+        stale.sock.close()
+        stale.sock = None
+
+        WakeChannel(wake_dir).notify()
+        self.assertFalse(stale_path.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import gzip
+import unittest
+
+from flask import Flask, Response
+
+from automationv3.compression import GzipMiddleware
+from automationv3.httpcache import make_etag, not_modified, tagged
+
+PAGE = "<li>requirement</li>\n" * 500
+
+
+class TestGzipMiddleware(unittest.TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+
+        @app.route("/page")
+        def page():
+            return PAGE
+
+        @app.route("/small")
+        def small():
+            return "<p>small</p>"
+
+        @app.route("/stream")
+        def stream():
+            return Response(
+                (f"<li>{i}</li>" for i in range(5000)), mimetype="text/html"
+            )
+
+        @app.route("/short-stream")
+        def short_stream():
+            return Response(iter(["<p>", "short", "</p>"]), mimetype="text/html")
+
+        @app.route("/events")
+        def events():
+            def stream():
+                for i in range(3):
+                    self.produced.append(i)
+                    yield f"event: tick\ndata: {i}\n\n"
+
+            return Response(stream(), mimetype="text/event-stream")
+
+        @app.route("/no-transform")
+        def no_transform():
+            return Response(
+                (f"<li>{i}</li>" for i in range(5000)),
+                mimetype="text/html",
+                headers={"Cache-Control": "no-transform"},
+            )
+
+        @app.route("/binary")
+        def binary():
+            return Response(b"\0" * 4096, mimetype="application/octet-stream")
+
+        @app.route("/tagged")
+        def tagged_page():
+            etag = make_etag("page")
+            return not_modified(etag) or tagged(PAGE, etag)
+
+        app.wsgi_app = GzipMiddleware(app.wsgi_app)
+        self.produced = []
+        self.client = app.test_client()
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers={"Accept-Encoding": "gzip", **headers})
+
+    def test_compresses_large_text(self):
+        response = self.get("/page")
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertLess(len(response.data), len(PAGE) / 10)
+        self.assertEqual(gzip.decompress(response.data).decode(), PAGE)
+
+    def test_leaves_small_and_binary_alone(self):
+        for url in ["/small", "/short-stream", "/binary"]:
+            response = self.get(url)
+            self.assertNotIn("Content-Encoding", response.headers, url)
+
+        self.assertEqual(self.get("/short-stream").text, "<p>short</p>")
+
+    def test_requires_accept_encoding(self):
+        self.assertNotIn("Content-Encoding", self.client.get("/page").headers)
+        response = self.get("/page", **{"Accept-Encoding": "gzip;q=0"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_parses_q_values(self):
+        for accept, compressed in [
+            ("gzip;q=abc", False),
+            ("gzip;Q=0", False),
+            ("gzip; q=0.5", True),
+            ("*;q=0, gzip", True),
+            ("gzip;q=0, *", False),
+            ("*", True),
+            ("br, deflate", False),
+        ]:
+            response = self.get("/page", **{"Accept-Encoding": accept})
+            self.assertEqual(response.status_code, 200, accept)
+            self.assertEqual("Content-Encoding" in response.headers, compressed, accept)
+
+    def test_compresses_streams(self):
+        response = self.get("/stream")
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response.headers)
+        expected = "".join(f"<li>{i}</li>" for i in range(5000))
+        self.assertEqual(gzip.decompress(response.data).decode(), expected)
+
+    def test_event_streams_are_not_held_back(self):
+        response = self.client.get(
+            "/events", headers={"Accept-Encoding": "gzip"}, buffered=False
+        )
+        self.assertNotIn("Content-Encoding", response.headers)
+
+        chunks = iter(response.response)
+        self.assertEqual(next(chunks), b"event: tick\ndata: 0\n\n")
+        # sent before the next event is produced
+        self.assertEqual(self.produced, [0])
+        response.close()
+
+    def test_no_transform_opts_out(self):
+        response = self.get("/no-transform")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_weakens_etag(self):
+        response = self.get("/tagged")
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+
+        response = self.get("/tagged", **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from flask import Flask
+
+from automationv3.database import add_server_timing, close_db, get_db
+from automationv3.database.pool import ConnectionPool, PoolTimeout
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pool = ConnectionPool(Path(self.tmp.name) / "test.db", size=2)
+        self.addCleanup(self.pool.close)
+
+    def test_pragmas_applied(self):
+        conn, _ = self.pool.acquire()
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+        self.pool.release(conn)
+
+        self.assertEqual(mode, "wal")
+        self.assertEqual(synchronous, 1)
+
+    def test_thread_gets_its_connection_back(self):
+        conn, _ = self.pool.acquire()
+
+        def borrow_and_return():
+            other, _ = self.pool.acquire()
+            self.pool.release(other)
+
+        thread = threading.Thread(target=borrow_and_return)
+        thread.start()
+        thread.join()
+        self.pool.release(conn)
+
+        # the other thread's connection has been idle longer
+        self.assertIs(self.pool.acquire()[0], conn)
+        self.assertEqual(self.pool.stats()["opened"], 2)
+
+    def test_bounded(self):
+        first, _ = self.pool.acquire()
+        second, _ = self.pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire(timeout=0.05)
+
+        self.pool.release(first)
+        conn, _ = self.pool.acquire(timeout=0.05)
+        self.assertIs(conn, first)
+
+    def test_reset_on_release(self):
+        conn, _ = self.pool.acquire()
+        conn.execute("CREATE TABLE t(x)")
+        conn.commit()
+        conn.isolation_level = None
+        conn.row_factory = sqlite3.Row
+        conn.execute("BEGIN")
+        conn.execute("INSERT INTO t VALUES (1)")
+        self.pool.release(conn)
+
+        conn, _ = self.pool.acquire()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone(), (0,))
+        self.assertEqual(conn.isolation_level, "")
+
+
+class TestPooledRequests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.pool = ConnectionPool(Path(tmp.name) / "test.db", size=1)
+        self.addCleanup(self.pool.close)
+
+        self.app = Flask(__name__)
+        self.app.config["DB_POOL"] = self.pool
+        self.app.after_request(add_server_timing)
+        self.app.teardown_appcontext(lambda error: close_db())
+
+        @self.app.route("/")
+        def index():
+            return str(id(get_db()))
+
+    def test_connection_reused_between_requests(self):
+        client = self.app.test_client()
+        first = client.get("/")
+        second = client.get("/")
+
+        self.assertEqual(first.text, second.text)
+        self.assertIn("db-acquire;dur=", first.headers["Server-Timing"])
+        self.assertEqual(self.pool.stats()["idle"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
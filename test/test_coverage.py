@@ -0,0 +1,188 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from automationv3 import editor as editor_package
+from automationv3.editor.coverage import Coverage, requirement_ids
+from automationv3.editor.views import coverage
+from automationv3.editor.watcher import WorkspaceWatcher
+from automationv3.requirements.models import Requirement
+
+
+def procedure(*ids):
+    references = "\n".join(f"{i + 1}. :req:`{id}`" for i, id in enumerate(ids))
+    return f'"\nTitle\n=====\n"\n\n"\nRequirements\n------------\n\n{references}\n"\n'
+
+
+class TestCoverage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+
+        Requirement.metadata.create_all(create_engine("sqlite:///test.db"))
+        self.conn = sqlite3.connect("test.db")
+        Coverage.ensure_db(self.conn)
+        self.conn.executemany(
+            "INSERT INTO Requirement (id, text, subsystem) VALUES (?, ?, ?)",
+            [
+                ("BRA1", "The brakes shall hold", "BRA"),
+                ("BRA2", "The brakes shall release", "BRA"),
+                ("FUE1", "The fuel shall flow", "FUE"),
+            ],
+        )
+        self.conn.commit()
+
+        self.write("BRA/tc_1.rvt", procedure("BRA1", "FUE1"))
+        self.write("BRA/tc_2.rvt", procedure("BRA1", "XYZ9"))
+        self.write("notes.txt", procedure("BRA2"))
+        self.coverage = Coverage(self.conn, "master", self.root)
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove("test.db")
+
+    def write(self, path, text):
+        path = self.root / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        return path
+
+    def test_matrix(self):
+        self.assertEqual(self.coverage.refresh(), 2)
+
+        self.assertEqual(
+            self.coverage.matrix(),
+            {
+                "BRA1": ["BRA/tc_1.rvt", "BRA/tc_2.rvt"],
+                "FUE1": ["BRA/tc_1.rvt"],
+                "XYZ9": ["BRA/tc_2.rvt"],
+            },
+        )
+        self.assertEqual(
+            self.coverage.requirements_for("BRA/tc_1.rvt"), ["BRA1", "FUE1"]
+        )
+
+    def test_queries(self):
+        self.coverage.refresh()
+
+        self.assertEqual(
+            self.coverage.uncovered(), [("BRA2", "The brakes shall release", "BRA")]
+        )
+        self.assertEqual(self.coverage.uncovered("FUE"), [])
+        self.assertEqual(self.coverage.over_covered(1), [("BRA1", 2)])
+        self.assertEqual(self.coverage.unknown(), [("XYZ9", 1)])
+        self.assertEqual(self.coverage.subsystems(), [("BRA", 2, 1), ("FUE", 1, 1)])
+
+    def test_incremental(self):
+        self.coverage.refresh()
+        self.assertEqual(self.coverage.refresh(), 0)
+
+        # touched without changes is not parsed again
+        path = self.root / "BRA/tc_1.rvt"
+        os.utime(path, ns=(0, path.stat().st_mtime_ns + 10**9))
+        self.assertEqual(self.coverage.refresh(), 0)
+
+        self.write("BRA/tc_1.rvt", procedure("BRA2"))
+        (self.root / "BRA/tc_2.rvt").unlink()
+        self.assertEqual(self.coverage.refresh(), 1)
+
+        self.assertEqual(self.coverage.matrix(), {"BRA2": ["BRA/tc_1.rvt"]})
+        self.assertEqual(self.coverage.procedure_count(), 1)
+
+    def test_refresh_paths(self):
+        self.coverage.refresh()
+        self.write("BRA/tc_1.rvt", procedure("BRA2"))
+        (self.root / "BRA/tc_2.rvt").unlink()
+
+        # only what is asked for is looked at
+        self.assertEqual(self.coverage.refresh(["BRA/tc_1.rvt"]), 1)
+        self.assertEqual(self.coverage.procedure_count(), 2)
+
+        self.write("BRA/new/tc_3.rvt", procedure("FUE1"))
+        self.assertEqual(self.coverage.refresh(["BRA/new", "BRA/tc_2.rvt"]), 1)
+        self.assertEqual(
+            self.coverage.matrix(),
+            {"BRA2": ["BRA/tc_1.rvt"], "FUE1": ["BRA/new/tc_3.rvt"]},
+        )
+
+    def test_malformed_procedures_cover_nothing(self):
+        for text in ["(Wait", ":", '"unterminated', "#foo", "}"]:
+            self.assertEqual(requirement_ids(text), [], text)
+
+
+class TestCoverageHandler(TestCoverage):
+    def setUp(self):
+        super().setUp()
+        app = Flask(
+            __name__,
+            template_folder=Path(editor_package.__file__).parent / "templates",
+        )
+        app.register_blueprint(coverage, url_prefix="/coverage")
+        engine = create_engine("sqlite:///test.db")
+        app.config["DB_SESSION_MAKER"] = sessionmaker(engine)
+        self.client = app.test_client()
+
+        views = sys.modules["automationv3.editor.views.coverage"]
+        workspace = SimpleNamespace(id="master", root=self.root)
+        patcher = mock.patch.object(views, "get_workspaces", lambda id: workspace)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_report(self):
+        response = self.client.get("/coverage/master")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("2 of 3 requirements", response.text)
+        self.assertIn("BRA2", response.text)
+
+    def test_json_report(self):
+        response = self.client.get(
+            "/coverage/master?over=1", headers={"Accept": "application/json"}
+        )
+
+        report = response.json
+        self.assertEqual(report["summary"]["covered"], 2)
+        self.assertEqual(report["over_covered"], [{"id": "BRA1", "procedures": 2}])
+        self.assertEqual(report["matrix"]["FUE1"], ["BRA/tc_1.rvt"])
+
+    def test_watched_workspace_walked_once(self):
+        watcher = WorkspaceWatcher(self.root, 0.05, use_inotify=False)
+        watcher.start()
+        self.addCleanup(watcher.stop)
+        engine = sys.modules["automationv3.editor.coverage"]
+        walk = mock.patch.object(
+            Coverage,
+            "procedures_on_disk",
+            autospec=True,
+            side_effect=Coverage.procedures_on_disk,
+        )
+        with mock.patch.object(engine, "get_watcher", lambda root: watcher), walk as m:
+            self.client.get("/coverage/master")
+            self.assertEqual([c.args[1:] for c in m.call_args_list], [()])
+
+            events = watcher.subscribe()
+            self.write("BRA/tc_2.rvt", procedure("BRA2"))
+            self.assertEqual(events.get(timeout=5)["path"], "BRA/tc_2.rvt")
+
+            m.reset_mock()
+            response = self.client.get(
+                "/coverage/master", headers={"Accept": "application/json"}
+            )
+            self.assertEqual(
+                [c.args[1:] for c in m.call_args_list], [("BRA/tc_2.rvt",)]
+            )
+            self.assertEqual(response.json["matrix"]["BRA2"], ["BRA/tc_2.rvt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
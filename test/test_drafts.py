@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from automationv3.editor.drafts import DraftBuffer
+from automationv3.editor.models import Document
+
+
+class TestDraftBuffer(unittest.TestCase):
+    def setUp(self):
+        self.db_file = "test_drafts.db"
+        self.conn = sqlite3.connect(self.db_file)
+        Document.ensure_db(self.conn)
+
+        self.temp_file = Path(__file__).resolve().parent / "data" / "drafts.txt"
+        self.temp_file.write_text("on disk")
+        self.document = Document.open(self.conn, self.temp_file)
+
+        self.buffer = DraftBuffer(self.db_file, interval=0.05)
+        patcher = mock.patch(
+            "automationv3.editor.document.get_draft_buffer", lambda: self.buffer
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.buffer.stop()
+        self.conn.close()
+        os.remove(self.db_file)
+        self.temp_file.unlink()
+
+    def stored_draft(self):
+        return self.conn.execute(
+            "SELECT draft FROM documents WHERE id = ?", (self.document.id,)
+        ).fetchone()[0]
+
+    def test_latest_draft_wins(self):
+        for draft in ["a", "ab", "abc"]:
+            self.document.save_draft(draft)
+
+        self.assertIsNone(self.stored_draft())
+        self.assertEqual(Document(self.conn, self.document.id).content, "abc")
+
+        self.buffer.flush()
+        self.assertEqual(self.stored_draft(), "abc")
+        self.assertFalse(self.buffer.has(self.document.id))
+
+    def test_flushed_within_interval(self):
+        self.buffer.start()
+        self.document.save_draft("typed")
+
+        deadline = time.monotonic() + 2
+        while self.stored_draft() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.stored_draft(), "typed")
+
+    def test_save_drops_pending_draft(self):
+        self.document.save_draft("saved")
+        self.document.save()
+        self.buffer.flush()
+
+        self.assertEqual(self.temp_file.read_text(), "saved")
+        self.assertIsNone(self.stored_draft())
+        self.assertFalse(Document(self.conn, self.document.id).is_modified())
+
+    def test_stop_flushes(self):
+        self.buffer.start()
+        self.buffer.stopped.set()
+        self.buffer.thread.join()
+        self.document.save_draft("unsaved")
+
+        self.buffer.stop()
+        self.assertEqual(self.stored_draft(), "unsaved")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+import html
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from automationv3 import editor as editor_package
+from automationv3.editor.models import Editor
+from automationv3.editor.views import editor
+from automationv3.editor.views.editor import snapshots
+from automationv3.framework import edn
+from automationv3.jobqueue.sqlqueue import SQLPriorityQueue
+
+
+class TestSectionHandlers(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        path = Path(self.tmp.name) / "long.rvt"
+        path.write_text("\n\n".join(f"(Wait {i})" for i in range(60)))
+
+        self.conn = sqlite3.connect("test.db")
+        Editor.ensure_db(self.conn)
+        self.editor = Editor.create(self.conn)
+        self.editor.select_document(self.editor.open(path))
+
+        app = Flask(
+            __name__,
+            template_folder=Path(editor_package.__file__).parent / "templates",
+        )
+        app.register_blueprint(editor, url_prefix="/editor")
+        engine = create_engine("sqlite:///test.db")
+        app.config["DB_SESSION_MAKER"] = sessionmaker(engine)
+        self.addCleanup(engine.dispose)
+        self.app = app
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove("test.db")
+
+    def test_content_requests_sections_in_batches(self):
+        response = self.client.get(f"/editor/{self.editor.id}/content")
+
+        self.assertEqual(response.text.count("content-sections"), 3)
+        self.assertEqual(response.text.count('hx-trigger="load"'), 1)
+        self.assertEqual(response.text.count('hx-trigger="intersect once"'), 2)
+
+    def test_batch(self):
+        response = self.client.get(
+            f"/editor/{self.editor.id}/content-sections?start=50&count=25"
+        )
+
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.text.count("<strong>Wait</strong>"), 10)
+        self.assertIn("59 seconds", response.text)
+
+    def test_batch_arguments(self):
+        views = sys.modules["automationv3.editor.views.editor"]
+        with mock.patch.object(views, "MAX_SECTION_BATCH", 5):
+            response = self.client.get(
+                f"/editor/{self.editor.id}/content-sections?start=x&count=1000"
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.text.count("<strong>Wait</strong>"), 5)
+
+            response = self.client.get(
+                f"/editor/{self.editor.id}/content-sections?start=0&count=-3"
+            )
+            self.assertEqual(response.text.count("<strong>Wait</strong>"), 0)
+
+    def test_selected_sections(self):
+        response = self.client.get(
+            f"/editor/{self.editor.id}/content-sections?sections=3,7,100"
+        )
+
+        self.assertEqual(response.text.count("<strong>Wait</strong>"), 2)
+        self.assertIn("7 seconds", response.text)
+
+    def test_content_not_modified(self):
+        response = self.client.get(f"/editor/{self.editor.id}/content")
+        etag = response.headers["ETag"]
+
+        response = self.client.get(
+            f"/editor/{self.editor.id}/content", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.editor.active_document.save_draft("(Wait 1)")
+        response = self.client.get(
+            f"/editor/{self.editor.id}/content", headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_versioned_batch_is_immutable(self):
+        response = self.client.get(f"/editor/{self.editor.id}/content")
+        url = re.search(r'hx-get="([^"]*content-sections[^"]*)"', response.text)[1]
+
+        response = self.client.get(html.unescape(url))
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("<strong>Wait</strong>", response.text)
+
+        response = self.client.get(
+            f"/editor/{self.editor.id}/content-sections?start=0&count=25&v=old"
+        )
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        self.assertIn("<strong>Wait</strong>", response.text)
+
+    def test_section_not_modified(self):
+        url = f"/editor/{self.editor.id}/content-section?section=3"
+        etag = self.client.get(url).headers["ETag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_requirements_version_errors_propagate(self):
+        views = sys.modules["automationv3.editor.views.editor"]
+        with self.app.app_context():
+            # no requirements table
+            self.assertIsNone(views.requirements_version())
+
+        with mock.patch.object(
+            views.Requirement, "table_version", side_effect=ValueError
+        ):
+            with self.app.app_context(), self.assertRaises(ValueError):
+                views.requirements_version()
+
+    def test_run_test_queues_job(self):
+        subprocess.check_call(["git", "init", "-q", "-b", "main"], cwd=self.tmp.name)
+        self.app.config["WORKSPACE_PATH"] = self.tmp.name
+        self.app.config["OBJECT_STORE_PATH"] = Path(self.tmp.name) / ".store"
+        path = Path(self.tmp.name) / "rvts" / "BRA" / "run.rvt"
+        path.parent.mkdir(parents=True)
+        path.write_text("(Wait 1)")
+
+        document = self.editor.open(path)
+        response = self.client.post(f"/editor/{self.editor.id}/run_test/{document.id}")
+        self.assertEqual(response.status_code, 202)
+
+        # the job is queued once the snapshot thread gets to it
+        snapshots.submit(lambda: None).result()
+        q = SQLPriorityQueue("test.db")
+        self.addCleanup(q.conn.close)
+        message = q.pop()
+        job = edn.read(message["message"])
+        self.assertEqual(job["body"], document.content)
+        self.assertEqual(job["path"], "BRA/run.rvt")
+        self.assertEqual(job["tree"], message["tree"])
+
+
+if __name__ == "__main__":
+    unittest.main()
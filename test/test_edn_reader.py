@@ -1,7 +1,7 @@
 import unittest
 import os
 
-from automationv3.framework.edn import read, read_all, Symbol, Keyword, List, Vector, Map, Set
+from automationv3.framework.edn import read, read_all, Symbol, Keyword, List, Vector, Map, Set, ReadError
 
 
 class TestEdnReader(unittest.TestCase):
@@ -111,6 +111,12 @@ class TestEdnReader(unittest.TestCase):
         with self.assertRaises(Exception) as c:
             read(r'\ ')
 
+    def test_unmatched_closing_delimiter(self):
+        with self.assertRaises(ReadError):
+            read_all('(Wait 1) }')
+        with self.assertRaises(ReadError):
+            read('(Wait 1]')
+
     # Keywords
     def test_keyword_basic(self):
         self.assertEqual(read(':abc'), Keyword('abc'))
@@ -122,6 +128,10 @@ class TestEdnReader(unittest.TestCase):
         with self.assertRaises(Exception) as c:
             read(r':')
     
+    def test_keyword_single_colon_at_end(self):
+        with self.assertRaises(ReadError):
+            read_all('(Wait 1) :')
+
     def test_keyword_alias_namespace_not_supported(self):
         with self.assertRaises(Exception) as c:
             read(r'::alias/my-keyword')
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+
+from automationv3 import editor
+from automationv3.database import db
+from automationv3.editor.gitlog import CommitCache, GitLog
+from automationv3.editor.views import commitlog
+from automationv3.editor.views.commitlog import PAGE_SIZE
+
+
+def git(root, *args):
+    return subprocess.check_output(["git", *args], cwd=root, stderr=subprocess.DEVNULL)
+
+
+def commit(root, files, message):
+    for name, content in files.items():
+        path = Path(root) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    git(root, "add", "--all")
+    git(root, "commit", "-q", "-m", message)
+    return git(root, "rev-parse", "HEAD").decode().strip()
+
+
+class TestGitLog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        git(self.root, "init", "-q")
+
+        self.first = commit(self.root, {"a.txt": "a", "dir/b c.txt": "b"}, "First")
+        self.second = commit(
+            self.root, {"a.txt": "changed"}, "Second ünïcode\n\nLonger\nbody"
+        )
+        self.log = GitLog(self.root)
+
+    def test_reads_all_fields(self):
+        commits = self.log.commits()
+
+        self.assertEqual([c["hash"] for c in commits], [self.second, self.first])
+        self.assertEqual(commits[0]["title"], "Second ünïcode")
+        self.assertEqual(commits[0]["message"], "Second ünïcode\n\nLonger\nbody")
+        self.assertEqual(commits[0]["files"], ["a.txt"])
+        self.assertEqual(commits[1]["files"], ["a.txt", "dir/b c.txt"])
+        self.assertTrue(commits[1]["author"])
+        self.assertTrue(commits[1]["date"])
+
+    def test_pagination(self):
+        self.assertEqual(
+            [c["hash"] for c in self.log.commits(skip=1, max_count=1)], [self.first]
+        )
+
+    def test_get_commit(self):
+        self.assertEqual(self.log.get_commit(self.first[:10])["title"], "First")
+        self.assertIsNone(self.log.get_commit("0" * 40))
+        self.assertIsNone(self.log.get_commit("--all"))
+
+
+class TestCommitCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        git(self.root, "init", "-q")
+        self.hashes = [commit(self.root, {"a.txt": str(i)}, f"C{i}") for i in range(3)]
+
+        self.conn = sqlite3.connect(":memory:")
+        self.addCleanup(self.conn.close)
+        CommitCache.ensure_db(self.conn)
+        self.log = GitLog(self.root)
+        self.cache = CommitCache(self.conn, self.log)
+
+    def titles(self, **kwargs):
+        return [c["title"] for c in self.cache.commits(**kwargs)]
+
+    def test_pages_from_cache(self):
+        self.assertEqual(self.titles(), ["C2", "C1", "C0"])
+        self.assertEqual(self.titles(skip=1, max_count=1), ["C1"])
+        self.assertEqual(self.cache.commits()[0]["files"], ["a.txt"])
+
+    def test_reads_only_new_commits(self):
+        self.cache.refresh()
+        commit(self.root, {"b.txt": "b"}, "C3")
+
+        with mock.patch.object(
+            self.log, "iter_commits", wraps=self.log.iter_commits
+        ) as iter_commits:
+            self.assertEqual(self.titles(max_count=2), ["C3", "C2"])
+            self.assertEqual(self.titles(max_count=2), ["C3", "C2"])
+
+        iter_commits.assert_called_once()
+        self.assertIn(f"^{self.hashes[-1]}", iter_commits.call_args.args)
+
+    def test_rebuilds_after_history_rewrite(self):
+        self.cache.refresh()
+        git(self.root, "reset", "-q", "--hard", self.hashes[0])
+        commit(self.root, {"c.txt": "c"}, "Rewritten")
+
+        self.assertEqual(self.titles(), ["Rewritten", "C0"])
+
+    def test_get_commit(self):
+        self.cache.refresh()
+        self.assertEqual(self.cache.get_commit(self.hashes[1][:8])["title"], "C1")
+        self.assertIsNone(self.cache.get_commit("0" * 40))
+
+
+class TestCommitLogHandler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        git(self.root, "init", "-q")
+        self.hashes = [
+            commit(self.root, {"a.txt": str(i)}, f"Commit {i}")
+            for i in range(PAGE_SIZE + 1)
+        ]
+
+        conn = sqlite3.connect(db.get_connection_str())
+        CommitCache.ensure_db(conn)
+        conn.close()
+        self.addCleanup(os.remove, db.get_connection_str())
+
+        app = Flask(
+            __name__, template_folder=Path(editor.__file__).parent / "templates"
+        )
+        app.register_blueprint(commitlog, url_prefix="/commitlog")
+        app.config["WORKSPACE_PATH"] = self.root
+        app.testing = True
+        self.client = app.test_client()
+
+    def test_pages(self):
+        response = self.client.get("/commitlog/")
+        self.assertIn(self.hashes[-1].encode(), response.data)
+        self.assertNotIn(self.hashes[0].encode(), response.data)
+        self.assertIn(b"page=1", response.data)
+
+        response = self.client.get("/commitlog/?page=1")
+        self.assertIn(self.hashes[0].encode(), response.data)
+
+    def test_details(self):
+        response = self.client.get(f"/commitlog/details/{self.hashes[3]}")
+        self.assertIn(b"Commit 3", response.data)
+        self.assertIn(b"a.txt", response.data)
+
+        response = self.client.get(f"/commitlog/details/{'0' * 40}")
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,264 @@
+import shutil
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+from werkzeug.serving import make_server
+
+from automationv3.database import db
+from automationv3.framework import edn
+from automationv3.jobqueue.aioqueue import WakeChannel
+from automationv3.jobqueue.scheduler import Requirements
+from automationv3.jobqueue.sqlqueue import SQLPriorityQueue, Status
+from automationv3.jobqueue.worker import JobPuller, WorkerPool
+
+from .data.jobqueue import create_app, remove_db
+
+
+def job_message(body):
+    return edn.writes({"body": body})
+
+
+class TestJobHandlers(unittest.TestCase):
+    def setUp(self):
+        self.q = SQLPriorityQueue(db.get_connection_str())
+        self.client = create_app().test_client()
+
+    def tearDown(self):
+        self.q.conn.close()
+        remove_db()
+
+    def test_claim_respects_max(self):
+        for i in range(3):
+            self.q.put(job_message(f"(Wait {i})"))
+
+        response = self.client.post(
+            "/runner/jobs/claim", json={"worker": "http://w1", "max": 2}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json["jobs"]), 2)
+
+    def test_claim_matches_capabilities(self):
+        requires = Requirements(tags=["lab1"]).dumps()
+        self.q.put(job_message("(Wait 1)"), requires=requires)
+
+        response = self.client.post(
+            "/runner/jobs/claim", json={"worker": "http://w1", "max": 1}
+        )
+        self.assertEqual(response.json["jobs"], [])
+
+        response = self.client.post(
+            "/runner/jobs/claim",
+            json={"worker": "http://w2", "max": 1, "capabilities": {"tags": ["lab1"]}},
+        )
+        self.assertEqual(len(response.json["jobs"]), 1)
+
+        # claims are recorded as keepalives
+        response = self.client.get("/runner/workers?show=all")
+        workers = {w["url"]: w for w in response.json}
+        self.assertEqual(workers["http://w2"]["capabilities"]["tags"], ["lab1"])
+        self.assertEqual(workers["http://w2"]["free"], 0)
+
+    def test_claim_requires_worker(self):
+        response = self.client.post("/runner/jobs/claim", json={"max": 2})
+        self.assertEqual(response.status_code, 400)
+
+    def test_claim_max(self):
+        self.q.put(job_message("(Wait 1)"))
+
+        response = self.client.post(
+            "/runner/jobs/claim", json={"worker": "http://w1", "max": 0}
+        )
+        self.assertEqual(response.json["jobs"], [])
+
+        response = self.client.post(
+            "/runner/jobs/claim", json={"worker": "http://w1", "max": -1}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("non-negative", response.json["error"])
+
+    def test_register_rejects_bool_capacity(self):
+        response = self.client.post(
+            "/runner/workers", json={"url": "http://w1", "capacity": True}
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            "/runner/workers", json={"url": "http://w1", "capacity": 2, "free": 1}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_complete_lost_lease(self):
+        message_id = self.q.put(job_message("(Wait 1)"))["message_id"]
+        self.q.claim("http://w1", 1)
+
+        response = self.client.post(
+            f"/runner/jobs/{message_id}/complete", json={"worker": "http://w2"}
+        )
+        self.assertEqual(response.status_code, 409)
+
+    @unittest.skipUnless(WakeChannel.supported(), "requires unix sockets")
+    def test_requeue_wakes_waiters(self):
+        self.q.put(job_message("(Wait 1)"))
+        self.q.claim("http://w1", 1)
+        self.q.conn.execute("UPDATE Queue SET heartbeat_time = 0")
+
+        waiter = WakeChannel.for_database(db.get_connection_str())
+        self.addCleanup(shutil.rmtree, waiter.directory, ignore_errors=True)
+        self.addCleanup(waiter.close)
+        waiter.open()
+
+        self.client.post("/runner/jobs/claim", json={"worker": "http://w2", "max": 0})
+        self.assertTrue(waiter.wait(1))
+
+    def test_heartbeat(self):
+        message_id = self.q.put(job_message("(Wait 1)"))["message_id"]
+        self.q.claim("http://w1", 1)
+
+        response = self.client.post(
+            "/runner/jobs/heartbeat",
+            json={"worker": "http://w1", "jobs": [message_id, "other"]},
+        )
+        self.assertEqual(response.json["jobs"], [message_id])
+
+    def test_heartbeat_validates_jobs(self):
+        for jobs in ["job1", {"id": "job1"}, [1], [["job1"]], None]:
+            response = self.client.post(
+                "/runner/jobs/heartbeat", json={"worker": "http://w1", "jobs": jobs}
+            )
+            self.assertEqual(response.status_code, 400, jobs)
+
+
+class FakeResponse:
+    def __init__(self, status_code, json=None):
+        self.status_code = status_code
+        self._json = json
+
+    def json(self):
+        return self._json
+
+
+class FakeSession:
+    """Answers posts from `responses`, a list of responses or exceptions"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.posts = []
+
+    def post(self, url, json=None, timeout=None):
+        self.posts.append((url, json))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class TestJobPullerReporting(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(slots=3)
+        self.addCleanup(self.pool.shutdown)
+
+    def finish(self, *job_ids):
+        for job_id in job_ids:
+            self.pool.submit(job_id, job_message("(Wait 1)"))
+        self.pool.executor.shutdown(wait=True)
+
+    def puller(self, responses):
+        return JobPuller(
+            self.pool, "http://server/jobs", "http://w1", FakeSession(responses)
+        )
+
+    def test_results_kept_until_reported(self):
+        self.finish("job1", "job2", "job3")
+
+        puller = self.puller(
+            [FakeResponse(200), requests.ConnectionError("server down")]
+        )
+        with self.assertRaises(requests.ConnectionError):
+            puller.report_results()
+        self.assertEqual(len(self.pool.finished_results()), 2)
+
+        puller.session = FakeSession([FakeResponse(500), FakeResponse(200)])
+        puller.report_results()
+        self.assertEqual(len(self.pool.finished_results()), 1)
+
+    def test_lost_lease_result_dropped(self):
+        self.finish("job1")
+
+        puller = self.puller([FakeResponse(409)])
+        puller.report_results()
+        self.assertEqual(self.pool.finished_results(), [])
+
+    def test_heartbeat_abandons_lost_leases(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with mock.patch("automationv3.jobqueue.worker.run_job") as run_job:
+            run_job.side_effect = lambda message: release.wait(5) and {}
+            self.pool.submit("job1", "msg")
+            self.pool.submit("job2", "msg")
+
+            puller = self.puller([FakeResponse(200, {"jobs": ["job2"]})])
+            puller.heartbeat()
+            release.set()
+            self.pool.executor.shutdown(wait=True)
+
+        self.assertEqual(
+            [job_id for job_id, _ in self.pool.finished_results()], ["job2"]
+        )
+
+
+class TestPullDispatch(unittest.TestCase):
+    """Workers pulling from a central server over real HTTP"""
+
+    def setUp(self):
+        self.q = SQLPriorityQueue(db.get_connection_str())
+        self.server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.jobs_url = f"http://127.0.0.1:{self.server.server_port}/runner/jobs"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.q.conn.close()
+        remove_db()
+
+    def test_workers_share_queue(self):
+        ids = [self.q.put(job_message("(Wait 1)"))["message_id"] for _ in range(10)]
+
+        pools = [WorkerPool(slots=2), WorkerPool(slots=3)]
+        pullers = [
+            JobPuller(pool, self.jobs_url, f"http://worker{i}", session=requests)
+            for i, pool in enumerate(pools)
+        ]
+
+        deadline = time.monotonic() + 10
+        while self.q.qsize() > 0 and time.monotonic() < deadline:
+            for puller in pullers:
+                puller.run_once()
+            time.sleep(0.01)
+
+        for pool in pools:
+            pool.shutdown()
+
+        jobs = [self.q.get(message_id=message_id) for message_id in ids]
+        self.assertTrue(all(job["status"] == Status.DONE for job in jobs))
+        self.assertEqual(
+            {job["worker"] for job in jobs}, {"http://worker0", "http://worker1"}
+        )
+        self.assertTrue(all('"passed": true' in job["result"] for job in jobs))
+
+    def test_batch_limited_by_free_slots(self):
+        for _ in range(5):
+            self.q.put(job_message("(Wait 1)"))
+
+        pool = WorkerPool(slots=2)
+        puller = JobPuller(pool, self.jobs_url, "http://worker0", session=requests)
+        self.assertEqual(puller.run_once(), 2)
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
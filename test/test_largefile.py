@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from automationv3 import editor as editor_package
+from automationv3.editor.largefile import LineIndex, get_line_index
+from automationv3.editor.models import Editor
+from automationv3.editor.views import editor
+
+
+class TestLineIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "log.txt"
+
+    def test_lines(self):
+        self.path.write_text("".join(f"line {i}\n" for i in range(1000)))
+        index = LineIndex(self.path)
+
+        self.assertEqual(index.line_count, 1000)
+        self.assertEqual(index.lines(998, 10), ["line 998", "line 999"])
+        self.assertEqual(index.lines(1000, 10), [])
+
+    def test_without_trailing_newline(self):
+        self.path.write_text("a\nb")
+        self.assertEqual(LineIndex(self.path).lines(0, 10), ["a", "b"])
+
+        self.path.write_text("")
+        self.assertEqual(LineIndex(self.path).line_count, 0)
+
+    def test_only_newlines_end_lines(self):
+        self.path.write_bytes(b"a\rb\x0cc\r\nd\xe2\x80\xa8e\nf\n")
+        index = LineIndex(self.path)
+
+        self.assertEqual(index.line_count, 3)
+        self.assertEqual(index.lines(0, 10), ["a\rb\x0cc", "d\u2028e", "f"])
+        self.assertEqual(index.lines(1, 1), ["d\u2028e"])
+
+    def test_rebuilt_when_file_changes(self):
+        self.path.write_text("a\n")
+        first = get_line_index(self.path)
+        self.assertIs(get_line_index(self.path), first)
+
+        self.path.write_text("a\nb\n")
+        st = self.path.stat()
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        self.assertEqual(get_line_index(self.path).line_count, 2)
+
+
+class TestLargeFileHandlers(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "log.txt"
+        self.path.write_text("".join(f"line {i}\n" for i in range(1000)))
+
+        self.conn = sqlite3.connect("test.db")
+        Editor.ensure_db(self.conn)
+        self.editor = Editor.create(self.conn)
+        self.document = self.editor.open(self.path)
+        self.editor.select_document(self.document)
+
+        app = Flask(
+            __name__,
+            template_folder=Path(editor_package.__file__).parent / "templates",
+        )
+        app.register_blueprint(editor, url_prefix="/editor")
+        engine = create_engine("sqlite:///test.db")
+        app.config["DB_SESSION_MAKER"] = sessionmaker(engine)
+        self.addCleanup(engine.dispose)
+        self.client = app.test_client()
+
+        patcher = mock.patch("automationv3.editor.largefile.LARGE_FILE_SIZE", 100)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove("test.db")
+
+    def test_content_shows_first_page(self):
+        response = self.client.get(f"/editor/{self.editor.id}/content")
+
+        self.assertIn("Read only, 1000 lines", response.text)
+        self.assertIn("line 499", response.text)
+        self.assertNotIn("line 500", response.text)
+        self.assertIn("start=500", response.text)
+
+    def test_lines_page(self):
+        response = self.client.get(
+            f"/editor/{self.editor.id}/lines/{self.document.id}?start=900"
+        )
+
+        self.assertIn("line 999", response.text)
+        self.assertNotIn("line 899", response.text)
+        # last page
+        self.assertNotIn("revealed", response.text)
+
+    def test_lines_bad_start(self):
+        response = self.client.get(
+            f"/editor/{self.editor.id}/lines/{self.document.id}?start=abc"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("line 0", response.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from automationv3.editor import mime
+from automationv3.editor.mime import guess_mime, sniff_mime
+
+
+class TestGuessMime(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        sniff_mime.cache_clear()
+
+    def write(self, name, content):
+        path = self.dir / name
+        if isinstance(content, str):
+            path.write_text(content)
+        else:
+            path.write_bytes(content)
+        return path
+
+    def test_rvt(self):
+        self.assertEqual(
+            guess_mime(self.write("a.rvt", '; comment\n"\nTitle\n"\n(Wait 1)')),
+            "application/rvt+edn",
+        )
+        self.assertEqual(
+            guess_mime(self.write("b.rvt", "(Wait 1)")), "application/rvt+edn"
+        )
+        self.assertEqual(
+            guess_mime(self.write("c.rvt", "{:rvt/title 1}")), "application/rvt"
+        )
+        self.assertEqual(
+            guess_mime(self.write("d.rvt", "10 (Wait)")), "application/rvt"
+        )
+
+    def test_large_rvt_reads_prefix_only(self):
+        # never closed within the prefix, the first token is enough
+        path = self.write("big.rvt", '"' + "x" * (mime.SNIFF_LENGTH * 4))
+        self.assertEqual(guess_mime(path), "application/rvt+edn")
+
+    def test_binary(self):
+        self.assertEqual(
+            guess_mime(self.write("a.txt", b"abc\0def")), "application/octet-stream"
+        )
+        self.assertEqual(
+            guess_mime(self.write("b.txt", b"\xff\xfe")), "application/octet-stream"
+        )
+        # a character cut off by the end of the prefix is still text
+        text = "a" + "é" * mime.SNIFF_LENGTH
+        self.assertEqual(guess_mime(self.write("c.txt", text)), "text/plain")
+
+    def test_cached_until_changed(self):
+        path = self.write("a.rvt", "(Wait 1)")
+        guess_mime(path)
+        guess_mime(path)
+        self.assertEqual(sniff_mime.cache_info().hits, 1)
+
+        path.write_text("{:changed true}")
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        self.assertEqual(guess_mime(path), "application/rvt")
+
+
+if __name__ == "__main__":
+    unittest.main()
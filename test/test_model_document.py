@@ -4,7 +4,9 @@ import sqlite3
 import os
 from pathlib import Path
 
-from automationv3.editor.models import Document 
+from automationv3.editor import patches
+from automationv3.editor.models import Document
+from automationv3.framework.testcase import EdnTestCase
 
 class TestDocument(unittest.TestCase):
     def setUp(self):
@@ -72,8 +74,62 @@ class TestDocument(unittest.TestCase):
         self.assertEqual(draft_text, document.content)
         self.assertNotEqual(draft_text, self.temp_file.read_text())
 
-
-
-
-
-
+    def patch(self, document, index, value):
+        testcase = EdnTestCase('temp', document.content)
+        old_hash = testcase.statement_hash(index)
+        testcase.update_statement(index, value)
+        document.save_patch(index, old_hash, value, testcase.text)
+        return testcase.text
+
+    def test_patch(self):
+        document = Document.open(self.conn, self.temp_file)
+        text = self.patch(document, 2, 'Preconditions\n-------------\nNone\n')
+
+        # only the edit is stored over the base, the patch log is replayed when read
+        self.assertEqual(self.conn.execute('SELECT draft FROM documents').fetchone()[0],
+                         self.temp_file.read_text())
+        patches._applied.clear()
+        reopened = Document(self.conn, document.id)
+        self.assertEqual(reopened.content, text)
+        self.assertTrue(reopened.is_modified())
+
+        self.assertTrue(reopened.undo())
+        self.assertEqual(reopened.content, self.temp_file.read_text())
+        self.assertFalse(reopened.is_modified())
+
+    def test_patch_file_changed(self):
+        document = Document.open(self.conn, self.temp_file)
+        text = self.patch(document, 2, 'Preconditions\n-------------\nNone\n')
+
+        patches._applied.clear()
+        self.temp_file.write_text('"changed on disk"')
+        reopened = Document(self.conn, document.id)
+        self.assertEqual(reopened.content, text)
+        self.assertEqual(reopened.patch_count, 1)
+
+    def test_patch_conflict(self):
+        document = Document.open(self.conn, self.temp_file)
+        self.patch(document, 2, 'Preconditions\n-------------\nNone\n')
+
+        # a log recorded over the file itself
+        self.conn.execute('UPDATE documents SET draft = NULL')
+        self.conn.commit()
+        patches._applied.clear()
+        self.temp_file.write_text('"changed on disk"')
+
+        reopened = Document(self.conn, document.id)
+        with self.assertLogs('automationv3.editor.document', 'WARNING'):
+            self.assertEqual(reopened.content, '"changed on disk"')
+        self.assertEqual(reopened.patch_count, 0)
+        self.assertFalse(reopened.is_modified())
+
+    def test_compact(self):
+        document = Document.open(self.conn, self.temp_file)
+        for i in range(patches.COMPACT_AFTER + 1):
+            text = self.patch(document, 2, f'Preconditions\n-------------\nStep {i}\n')
+
+        reopened = Document(self.conn, document.id)
+        self.assertEqual(reopened.patch_count, patches.UNDO_DEPTH)
+        self.assertEqual(reopened.content, text)
+        # the folded patches are in the stored base
+        self.assertIn('Step 30', reopened.base)
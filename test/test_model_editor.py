@@ -3,7 +3,9 @@ import sqlite3
 import os
 from pathlib import Path
 
-from automationv3.editor.models import Editor
+from flask import Flask
+
+from automationv3.editor.models import Editor, Document
 
 class TestEditor(unittest.TestCase):
     def setUp(self):
@@ -71,4 +73,29 @@ class TestEditor(unittest.TestCase):
         editor.close(document2)
         self.assertEqual(document1, editor.active_document)
 
+    def test_state_loaded_in_one_query(self):
+        editor = Editor.create(self.conn)
+        editor.select_document(editor.open(self.temp_file))
+        editor.open(self.temp_file2)
+
+        editor = Editor(self.conn, editor.id)
+        queries = []
+        self.conn.set_trace_callback(queries.append)
+        documents = editor.documents()
+        active = editor.active_document
+        [doc.path.name for doc in documents if doc.is_modified()]
+        self.conn.set_trace_callback(None)
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(documents), 2)
+        self.assertIs(active, documents[0])
+
+    def test_document_loaded_once_per_request(self):
+        editor = Editor.create(self.conn)
+        document = editor.open(self.temp_file)
 
+        with Flask(__name__).app_context():
+            first = Document.get(self.conn, document.id)
+            first.path
+            self.assertIs(Editor(self.conn, editor.id).documents()[0], first)
+            self.assertIs(Document.get(self.conn, document.id), first)
@@ -0,0 +1,186 @@
+import os
+import subprocess
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import requests
+from werkzeug.serving import make_server
+
+from automationv3.jobqueue.objectstore import (
+    PACK_CONTENT_TYPE,
+    ObjectStore,
+    ObjectStoreError,
+    TreeBuilder,
+    hash_object,
+    upload_tree,
+)
+
+from .data.jobqueue import create_app, make_tree, remove_db
+
+
+def stale_builder(workspace):
+    """Builder whose cached hash of a.txt no longer matches its content"""
+    make_tree(workspace, {"a.txt": "a", "sub/b.txt": "b"})
+    builder = TreeBuilder()
+    builder.build(workspace)
+
+    path = workspace / "a.txt"
+    st = path.stat()
+    path.write_text("x")
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return builder
+
+
+class TestObjectStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.workspace = Path(self.tmp.name) / "workspace"
+        self.store = ObjectStore(Path(self.tmp.name) / "store")
+
+    def test_blob_matches_git(self):
+        sha = self.store.write("blob", b"hello\n")
+
+        self.assertEqual(sha, "ce013625030ba8dba906f756967f9e9ca394464a")
+        self.assertEqual(self.store.read(sha), ("blob", b"hello\n"))
+
+    def test_tree_matches_git(self):
+        make_tree(self.workspace, {"a.txt": "a\n", "sub/b.txt": "b\n", "sub.c": "c\n"})
+        root = self.store.write_tree(self.workspace, TreeBuilder())
+
+        subprocess.check_call(["git", "init", "-q"], cwd=self.workspace)
+        subprocess.check_call(["git", "add", "."], cwd=self.workspace)
+        expected = subprocess.check_output(["git", "write-tree"], cwd=self.workspace)
+        self.assertEqual(root, expected.decode().strip())
+
+    def test_deduplicates(self):
+        make_tree(self.workspace, {"a.txt": "same", "b.txt": "same"})
+        builder = TreeBuilder()
+        root, objects = builder.build(self.workspace)
+
+        # one blob and one tree
+        self.assertEqual(len(objects), 2)
+        self.assertEqual(self.store.write_tree(self.workspace, builder), root)
+        self.assertEqual(self.store.missing(objects), [])
+
+    def test_rebuild_only_rehashes_changed_files(self):
+        make_tree(self.workspace, {"a.txt": "a", "b.txt": "b"})
+        builder = TreeBuilder()
+        first, _ = builder.build(self.workspace)
+
+        # same size and mtime means the cached hash is trusted
+        path = self.workspace / "a.txt"
+        st = path.stat()
+        path.write_text("x")
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(builder.build(self.workspace)[0], first)
+
+        path.write_text("changed")
+        self.assertNotEqual(builder.build(self.workspace)[0], first)
+
+    def test_file_changed_while_storing(self):
+        root = self.store.write_tree(self.workspace, stale_builder(self.workspace))
+
+        self.assertEqual(root, TreeBuilder().build(self.workspace)[0])
+        self.assertFalse(self.store.has(hash_object("blob", b"a")))
+        self.assertEqual(
+            self.store.read(hash_object("blob", b"x")), ("blob", b"x")
+        )
+
+    def test_rejects_corrupt_objects(self):
+        make_tree(self.workspace, {"a.txt": "a"})
+        _, objects = TreeBuilder().build(self.workspace)
+        blob = next(iter(objects))
+
+        with self.assertRaises(ObjectStoreError):
+            self.store.write_raw(
+                hash_object("blob", b"other"), objects.compressed(blob)
+            )
+        with self.assertRaises(ObjectStoreError):
+            self.store.write_raw(blob, b"not zlib")
+
+    def test_rejects_incomplete_trees(self):
+        make_tree(self.workspace, {"a.txt": "a", "sub/b.txt": "b"})
+        root, objects = TreeBuilder().build(self.workspace)
+
+        with self.assertRaises(ObjectStoreError):
+            self.store.add_pack(objects.pack([root]))
+        self.assertFalse(self.store.has(root))
+
+        # children first
+        self.store.add_pack(objects.pack(list(objects)))
+        self.assertTrue(self.store.has(root))
+
+    def test_rejects_invalid_ids(self):
+        with self.assertRaises(ObjectStoreError):
+            self.store.has("../../etc/passwd")
+
+
+class TestObjectHandlers(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.workspace = Path(self.tmp.name) / "workspace"
+
+        app = create_app()
+        app.config["OBJECT_STORE_PATH"] = Path(self.tmp.name) / "store"
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/runner/objects"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        remove_db()
+
+    def test_only_missing_objects_uploaded(self):
+        make_tree(self.workspace, {"a.txt": "a", "sub/b.txt": "b"})
+        builder = TreeBuilder()
+        root = upload_tree(self.workspace, self.url, builder)
+
+        response = requests.get(f"{self.url}/{root}")
+        self.assertEqual(response.status_code, 200)
+
+        make_tree(self.workspace, {"sub/b.txt": "changed"})
+        _, objects = builder.build(self.workspace)
+        response = requests.post(f"{self.url}/want", json={"objects": list(objects)})
+        # the new blob plus the two trees above it
+        self.assertEqual(len(response.json()["want"]), 3)
+
+    def test_known_tree_wants_nothing(self):
+        make_tree(self.workspace, {"a.txt": "a"})
+        root = upload_tree(self.workspace, self.url, TreeBuilder())
+
+        response = requests.post(
+            f"{self.url}/want", json={"tree": root, "objects": ["0" * 40]}
+        )
+        self.assertEqual(response.json()["want"], [])
+
+    def test_upload_rereads_changed_files(self):
+        builder = stale_builder(self.workspace)
+        root = upload_tree(self.workspace, self.url, builder)
+
+        self.assertEqual(root, TreeBuilder().build(self.workspace)[0])
+        response = requests.get(f"{self.url}/{root}")
+        self.assertEqual(response.status_code, 200)
+
+    def test_corrupt_pack_is_a_bad_request(self):
+        sha = hash_object("blob", b"a")
+        for pack in [f"{sha} 8\n".encode() + b"not zlib", b"garbage\n"]:
+            response = requests.post(
+                self.url, data=pack, headers={"Content-Type": PACK_CONTENT_TYPE}
+            )
+            self.assertEqual(response.status_code, 400, pack)
+
+    def test_upload_requires_pack(self):
+        response = requests.post(
+            self.url, data=b"", headers={"Content-Type": "text/plain"}
+        )
+        self.assertEqual(response.status_code, 415)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,11 +3,12 @@ import unittest
 import sqlite3
 from pathlib import Path
 from flask import Flask
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 
 from automationv3 import editor 
 from automationv3.requirements.views import requirements
+from automationv3.requirements import models
 from automationv3.requirements.models import Requirement
 
 class TestRequirementHandler(unittest.TestCase):
@@ -43,6 +44,21 @@ class TestRequirementHandler(unittest.TestCase):
         response = self.client.get('/requirements/R1')
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Test requirement 1', response.data)
+
+    def test_requirements_handler_not_modified(self):
+        response = self.client.get('/requirements/R1')
+        etag = response.headers['ETag']
+
+        response = self.client.get('/requirements/R1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        req1 = Requirement.find_by_id(self.session, 'R1')
+        req1.text = 'Test requirement 1 changed'
+        self.session.commit()
+
+        response = self.client.get('/requirements/R1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'changed', response.data)
     
     def test_requirements_by_subsystem_handler(self):
         response = self.client.get('/requirements/?subsystem=Test-subsystem-2')
@@ -60,5 +76,85 @@ class TestRequirementHandler(unittest.TestCase):
         self.assertNotIn(b'Test subsystem 1', response.data)
         self.assertNotIn(b'Test subsystem 2', response.data)
 
+
+class TestRequirementPages(unittest.TestCase):
+    def setUp(self):
+        self.db_file = "test_requirement_pages.db"
+        engine = create_engine(f"sqlite:///{self.db_file}")
+        self.sessionmaker = sessionmaker(engine)
+        self.session = self.sessionmaker()
+
+        Requirement.metadata.create_all(engine)
+        self.session.add_all(
+            Requirement(id=f"R{i:03d}",
+                        text=f"The {'radar' if i % 2 else 'sonar'} shall do {i}",
+                        subsystem=f"SUB{i % 3}")
+            for i in range(250)
+        )
+        self.session.commit()
+
+        app = Flask(__name__, template_folder=Path(editor.__file__).parent / 'templates')
+        app.register_blueprint(requirements, url_prefix='/requirements')
+        app.config['DB_SESSION_MAKER'] = self.sessionmaker
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.session.close()
+        os.remove(self.db_file)
+
+    def get_json(self, url):
+        return self.client.get(url, headers={'Accept': 'application/json'}).json
+
+    def test_keyset_pages(self):
+        ids = []
+        after = ''
+        while after is not None:
+            page = self.get_json(f'/requirements/?limit=100&after={after}')
+            ids += [r['id'] for r in page['requirements']]
+            after = page['next']
+
+        self.assertEqual(ids, [f"R{i:03d}" for i in range(250)])
+
+    def test_next_page_loads_when_revealed(self):
+        response = self.client.get('/requirements/?subsystem=SUB1&limit=50')
+        self.assertEqual(response.text.count('class="mb-2"'), 50)
+        self.assertIn('after=R148', response.text)
+
+        response = self.client.get('/requirements/?subsystem=SUB1&after=R148')
+        self.assertEqual(response.text.count('class="mb-2"'), 33)
+        self.assertNotIn('Loading...', response.text)
+
+    def test_search(self):
+        page = self.get_json('/requirements/?q=rad+shall&subsystem=SUB0')
+        ids = [r['id'] for r in page['requirements']]
+
+        self.assertEqual(ids, [f"R{i:03d}" for i in range(3, 250, 6)])
+
+        # kept in sync with the table
+        requirement = Requirement.find_by_id(self.session, 'R003')
+        requirement.text = 'The sonar shall do 3'
+        self.session.commit()
+        page = self.get_json('/requirements/?q=radar&subsystem=SUB0')
+        self.assertNotIn('R003', [r['id'] for r in page['requirements']])
+
+    def test_search_keeps_subsystem(self):
+        response = self.client.get('/requirements/?subsystem=SUB1&q=radar')
+
+        # the search sends the selected subsystem, a subsystem sends the search
+        self.assertIn('id="selected-subsystem"\n           value="SUB1"',
+                      response.text.replace('\r\n', '\n'))
+        self.assertIn('hx-include="#selected-subsystem"', response.text)
+        self.assertIn('hx-include="[name=\'q\']"', response.text)
+        self.assertIn('value="radar"', response.text)
+
+    def test_search_without_index(self):
+        self.session.execute(text(f'DROP TABLE {models.SEARCH_TABLE}'))
+        self.session.commit()
+
+        page = self.get_json('/requirements/?q=do 24')
+        ids = [r['id'] for r in page['requirements']]
+        self.assertEqual(ids, ['R024', 'R240', 'R241', 'R242', 'R243', 'R244',
+                               'R245', 'R246', 'R247', 'R248', 'R249'])
+
 if __name__ == '__main__':
     unittest.main()
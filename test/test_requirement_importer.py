@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+from automationv3.requirements.importer import (
+    ImportFileError,
+    import_file,
+    import_requirements,
+)
+from automationv3.requirements.models import Requirement
+
+SAMPLE_DATA = Path(__file__).resolve().parent / "data" / "sample_requirements.txt"
+
+
+class TestRequirementImporter(unittest.TestCase):
+    def setUp(self):
+        self.db_file = "test_importer.db"
+        Requirement.metadata.create_all(create_engine(f"sqlite:///{self.db_file}"))
+        self.conn = sqlite3.connect(self.db_file)
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove(self.db_file)
+
+    def write(self, name, content):
+        path = Path(self.tmp.name) / name
+        path.write_text(content)
+        return path
+
+    def rows(self):
+        return self.conn.execute(
+            "SELECT id, text, subsystem FROM Requirement ORDER BY id"
+        ).fetchall()
+
+    def test_text(self):
+        stats = import_file(self.conn, SAMPLE_DATA)
+
+        self.assertEqual((stats.read, stats.inserted, stats.errors), (64, 64, []))
+        self.assertIn(
+            (
+                "VMCCOMM00001",
+                "The software shall provide secure and reliable communication"
+                " between the vehicle and ground control",
+                "COMM",
+            ),
+            self.rows(),
+        )
+
+    def test_csv_and_edn(self):
+        csv_file = self.write(
+            "reqs.csv",
+            'id,text,subsystem\nR1,"The radar shall, always, track",RDR\n'
+            "R2,The sonar shall ping,SNR\n",
+        )
+        edn_file = self.write(
+            "reqs.edn",
+            '[{:id "R3" :text "The lidar shall scan" :subsystem "LDR"}]\n'
+            '{:id "VMCNAV00001" :text "The vehicle shall navigate"}\n',
+        )
+
+        import_file(self.conn, csv_file)
+        import_file(self.conn, edn_file)
+
+        self.assertEqual(
+            self.rows(),
+            [
+                ("R1", "The radar shall, always, track", "RDR"),
+                ("R2", "The sonar shall ping", "SNR"),
+                ("R3", "The lidar shall scan", "LDR"),
+                ("VMCNAV00001", "The vehicle shall navigate", "NAV"),
+            ],
+        )
+
+    def test_only_changes_are_written(self):
+        import_file(self.conn, SAMPLE_DATA)
+        versions = dict(self.conn.execute("SELECT id, version FROM Requirement"))
+        texts = dict(self.conn.execute("SELECT id, text FROM Requirement"))
+
+        rows = [
+            (1, {"id": "VMCCOMM00001", "text": "Changed", "subsystem": "COMM"}),
+            (2, {"id": "VMCCOMM00002", "text": texts["VMCCOMM00002"]}),
+            (3, {"id": "VMCNEW00001", "text": "New"}),
+        ]
+        stats = import_requirements(self.conn, rows)
+
+        self.assertEqual((stats.inserted, stats.updated, stats.unchanged), (1, 1, 1))
+        after = dict(self.conn.execute("SELECT id, version FROM Requirement"))
+        self.assertGreater(after["VMCCOMM00001"], versions["VMCCOMM00001"])
+        self.assertEqual(after["VMCCOMM00002"], versions["VMCCOMM00002"])
+
+    def test_invalid_rows_are_skipped(self):
+        path = self.write(
+            "reqs.txt",
+            "The radar shall track [VMCRDR00001].\n"
+            "no id here\n"
+            "The radar shall track again [VMCRDR00001].\n"
+            f"{'x' * 2000} [VMCRDR00002].\n"
+            "The thing shall work [R1].\n",
+        )
+
+        stats = import_file(self.conn, path)
+
+        self.assertEqual(self.rows()[0][0], "VMCRDR00001")
+        self.assertEqual(len(self.rows()), 1)
+        self.assertEqual([line for line, _ in stats.errors], [2, 3, 4, 5])
+        self.assertIn("duplicate id", stats.errors[1][1])
+        self.assertIn("missing subsystem", stats.errors[3][1])
+
+    def test_bad_file(self):
+        path = self.write("reqs.csv", "name,description\nR1,text\n")
+        with self.assertRaises(ImportFileError):
+            import_file(self.conn, path)
+
+    def test_missing_schema(self):
+        conn = sqlite3.connect(":memory:")
+        self.addCleanup(conn.close)
+        with self.assertRaisesRegex(ImportFileError, "no Requirement table"):
+            import_file(conn, SAMPLE_DATA)
+
+    def test_dry_run_and_progress(self):
+        reports = []
+        stats = import_file(
+            self.conn,
+            SAMPLE_DATA,
+            batch_size=10,
+            dry_run=True,
+            progress=lambda stats: reports.append(stats.read),
+        )
+
+        self.assertEqual(stats.inserted, 64)
+        self.assertEqual(self.rows(), [])
+        self.assertEqual(reports, [10, 20, 30, 40, 50, 60, 64])
+
+
+if __name__ == "__main__":
+    unittest.main()
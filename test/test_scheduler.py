@@ -0,0 +1,69 @@
+import unittest
+
+from automationv3.jobqueue.scheduler import Capabilities, Requirements, Scheduler
+from automationv3.jobqueue.sqlqueue import SQLPriorityQueue
+
+
+class TestRequirements(unittest.TestCase):
+    def test_for_testcase_collects_blocks(self):
+        requires = Requirements.for_testcase('"Docs"\n(Wait 1)\n(SetupSimulation)')
+        self.assertEqual(requires.blocks, {"Wait", "SetupSimulation"})
+
+    def test_satisfied_by(self):
+        caps = Capabilities(blocks=["Wait"], tags=["lab1", "fast"])
+
+        self.assertTrue(Requirements(blocks=["Wait"], tags=["lab1"]).satisfied_by(caps))
+        self.assertFalse(Requirements(blocks=["Other"]).satisfied_by(caps))
+        self.assertFalse(Requirements(simulators=["sim"]).satisfied_by(caps))
+
+    def test_round_trip(self):
+        requires = Requirements(blocks=["Wait"], simulators=["ins"])
+        self.assertEqual(
+            Requirements.loads(requires.dumps()).to_dict(), requires.to_dict()
+        )
+
+    def test_local_capabilities_include_plugins(self):
+        caps = Capabilities.local(tags=["lab1"])
+        self.assertIn("Wait", caps.blocks)
+        self.assertIn("automationv3.plugins.core", caps.plugins)
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.q = SQLPriorityQueue(memory=True)
+        self.scheduler = Scheduler(affinity_wait=30)
+
+    def claim(self, worker, caps, limit, peers=()):
+        def select(candidates, limit):
+            return self.scheduler.select(caps, candidates, limit, peers)
+
+        return [m["message"] for m in self.q.claim(worker, limit, select=select)]
+
+    def test_skips_unsatisfied_jobs(self):
+        self.q.put("needs sim", requires=Requirements(simulators=["ins"]).dumps())
+        self.q.put("plain")
+
+        self.assertEqual(self.claim("w1", Capabilities(), 2), ["plain"])
+        self.assertEqual(
+            self.claim("w2", Capabilities(simulators=["ins"]), 2), ["needs sim"]
+        )
+
+    def test_prefers_cached_tree(self):
+        self.q.put("tree a", tree="a")
+        self.q.put("tree b", tree="b")
+
+        self.assertEqual(self.claim("w1", Capabilities(trees=["b"]), 1), ["tree b"])
+
+    def test_leaves_job_for_peer_with_tree(self):
+        self.q.put("tree a", tree="a")
+        peers = [Capabilities(trees=["a"])]
+
+        self.assertEqual(self.claim("w1", Capabilities(), 1, peers), [])
+
+        # once the affinity window passes anyone may run it
+        self.q.conn.execute("UPDATE Queue SET in_time = in_time - 60")
+        self.assertEqual(self.claim("w1", Capabilities(), 1, peers), ["tree a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 import os
 
+from automationv3.jobqueue.scheduler import Capabilities, Requirements, Scheduler
 from automationv3.jobqueue.sqlqueue import *
 
 
@@ -76,3 +77,53 @@ class TestSqlPriorityQueue(unittest.TestCase):
         self.assertEqual(self.q.get(message_id=id1)['status'], Status.DONE)
 
 
+
+    def test_claim_batch(self):
+        id1 = self.q.put('Message 1')['message_id']
+        id2 = self.q.put('Message 2')['message_id']
+        self.q.put('Message 3')
+
+        claimed = self.q.claim('worker1', 2)
+        self.assertEqual([m['message_id'] for m in claimed], [id1, id2])
+        self.assertTrue(all(m['worker'] == 'worker1' for m in claimed))
+        self.assertEqual(len(self.q.claim('worker2', 5)), 1)
+        self.assertEqual(self.q.claim('worker2', 5), [])
+
+    def test_claim_looks_past_unrunnable_jobs(self):
+        lab = Requirements(tags=['lab1']).dumps()
+        for i in range(100):
+            self.q.put(f'Lab job {i}', requires=lab)
+        runnable = self.q.put('Any job', requires=Requirements().dumps())
+
+        def select(candidates, limit):
+            return Scheduler().select(Capabilities(), candidates, limit)
+
+        claimed = self.q.claim('worker1', 1, select=select)
+        self.assertEqual([m['message_id'] for m in claimed],
+                         [runnable['message_id']])
+        self.assertEqual(self.q.claim('worker1', 1, select=select), [])
+
+    def test_heartbeat_only_own_leases(self):
+        id1 = self.q.put('Message 1')['message_id']
+        self.q.claim('worker1', 1)
+
+        self.assertEqual(self.q.heartbeat('worker1', [id1]), [id1])
+        self.assertEqual(self.q.heartbeat('worker2', [id1]), [])
+
+    def test_complete_requires_lease(self):
+        id1 = self.q.put('Message 1')['message_id']
+        self.q.claim('worker1', 1)
+
+        self.assertFalse(self.q.complete('worker2', id1))
+        self.assertTrue(self.q.complete('worker1', id1, '{"passed": true}'))
+        self.assertEqual(self.q.get(message_id=id1)['status'], Status.DONE)
+        self.assertEqual(self.q.get(message_id=id1)['result'], '{"passed": true}')
+
+    def test_requeue_expired(self):
+        id1 = self.q.put('Message 1')['message_id']
+        self.q.claim('worker1', 1)
+        self.q.conn.execute('UPDATE Queue SET heartbeat_time = heartbeat_time - 100')
+
+        self.assertEqual(self.q.requeue_expired(50), 1)
+        self.assertEqual(self.q.claim('worker2', 1)[0]['message_id'], id1)
+        self.assertFalse(self.q.complete('worker1', id1))
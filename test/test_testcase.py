@@ -1,6 +1,8 @@
 import unittest
 from pathlib import Path
+from unittest import mock
 
+from automationv3.framework import testcase
 from automationv3.framework.testcase import EdnTestCase
 from automationv3.database import db
 from automationv3.requirements.models import Requirement
@@ -79,7 +81,8 @@ Title
 3. Three
 ''')
 
-        self.assertEqual(tc.text, '''\
+        # only the updated statement is rewritten
+        self.assertEqual(tc.text, '''
 "
 -----
 Title
@@ -92,3 +95,27 @@ Title
 3. Three
 "
 ''')
+
+    def test_update_keeps_other_statements_as_written(self):
+        text = '(Wait   1)\n;; comment\n(Wait 2)\n\n(Wait 3)\n'
+        tc = EdnTestCase('id1', text)
+
+        modified, shifted = tc.update_statement(1, '(Wait 4) (Wait 5)')
+
+        self.assertEqual(tc.text, '(Wait   1)\n;; comment\n(Wait 4)\n\n(Wait 5)\n\n(Wait 3)\n')
+        self.assertEqual(modified, [1, 2])
+        self.assertEqual(shifted, [(2, 3)])
+        self.assertEqual(
+            [tc.text[start:end] for start, end in tc.spans],
+            ['(Wait   1)', '(Wait 4)', '(Wait 5)', '(Wait 3)'])
+
+    def test_update_renders_only_changed_statements(self):
+        tc = EdnTestCase('id1', edn_text)
+        tc.update_statement(-1, '(Wait 2)')
+
+        with mock.patch.object(testcase, 'render_statements',
+                               wraps=testcase.render_statements) as render:
+            self.assertIn('2', tc.statement(3)._repr_html_())
+            tc.statement(3)
+        render.assert_called_once_with(mock.ANY, [3])
+        self.assertEqual(len(tc.statements), 4)
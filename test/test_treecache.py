@@ -0,0 +1,199 @@
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import requests
+from werkzeug.serving import make_server
+
+from automationv3.framework import edn, executor
+from automationv3.jobqueue import worker
+from automationv3.jobqueue.objectstore import (
+    MODE_FILE,
+    MODE_TREE,
+    ObjectStore,
+    ObjectStoreError,
+    TreeBuilder,
+    encode_tree,
+)
+from automationv3.jobqueue.treecache import TreeCache
+from automationv3.jobqueue.worker import WorkerPool
+
+from .data.jobqueue import create_app, make_tree, remove_db
+
+
+class CountingSession:
+    def __init__(self):
+        self.fetched = []
+
+    def post(self, url, json=None, **kwargs):
+        self.fetched.extend(json["objects"])
+        return requests.post(url, json=json, **kwargs)
+
+
+class TestTreeCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+        app = create_app()
+        app.config["OBJECT_STORE_PATH"] = self.dir / "store"
+        self.store = ObjectStore(self.dir / "store")
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/runner/objects"
+        self.session = CountingSession()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        remove_db()
+
+    def upload(self, files, workspace="workspace"):
+        workspace = self.dir / workspace
+        make_tree(workspace, files)
+        return self.store.write_tree(workspace, TreeBuilder())
+
+    def cache(self, **kwargs):
+        return TreeCache(self.dir / "cache", self.url, session=self.session, **kwargs)
+
+    def test_checkout_hardlinks_files(self):
+        tree = self.upload({"a.txt": "a", "sub/b.txt": "b"})
+        cache = self.cache()
+
+        first = cache.checkout(tree, self.dir / "job1")
+        second = cache.checkout(tree, self.dir / "job2")
+
+        self.assertEqual((second / "sub" / "b.txt").read_text(), "b")
+        self.assertEqual(
+            (first / "a.txt").stat().st_ino, (second / "a.txt").stat().st_ino
+        )
+        self.assertEqual(cache.roots(), [tree])
+
+    def test_fetches_only_missing_objects(self):
+        cache = self.cache()
+        cache.checkout(self.upload({"a.txt": "a", "sub/b.txt": "b"}), self.dir / "job1")
+
+        self.session.fetched.clear()
+        tree = self.upload({"sub/b.txt": "changed"})
+        cache.checkout(tree, self.dir / "job2")
+
+        # new root, new sub tree and the changed file
+        self.assertEqual(len(self.session.fetched), 3)
+
+    def test_evicts_least_recently_used(self):
+        first = self.upload({"a.txt": "a" * 100})
+        second = self.upload({"a.txt": "b" * 100})
+        cache = self.cache(max_bytes=150)
+
+        cache.checkout(first, self.dir / "job1")
+        cache.checkout(second, self.dir / "job2")
+
+        self.assertEqual(cache.roots(), [second])
+        self.assertEqual(cache.size, 100)
+        # the running job's files outlive the eviction
+        self.assertEqual((self.dir / "job1" / "a.txt").read_text(), "a" * 100)
+
+    def test_shared_files_survive_concurrent_eviction(self):
+        shared = {"a.txt": "s" * 100}
+        first = self.upload(shared, "first")
+        second = self.upload({**shared, "b.txt": "b"}, "second")
+        third = self.upload({"c.txt": "c" * 100}, "third")
+        cache = self.cache(max_bytes=150)
+        cache.checkout(first, self.dir / "job1")
+
+        fetch_blobs = cache.fetch_blobs
+
+        def fetch_during_other_checkout(files):
+            # evicts `first` while `second` is still being checked out
+            cache.fetch_blobs = fetch_blobs
+            cache.checkout(third, self.dir / "job3")
+            fetch_blobs(files)
+
+        cache.fetch_blobs = fetch_during_other_checkout
+        job = cache.checkout(second, self.dir / "job2")
+
+        self.assertEqual((job / "a.txt").read_text(), "s" * 100)
+        self.assertNotIn(first, cache.roots())
+
+    def test_rejects_escaping_names(self):
+        blob = self.store.write("blob", b"evil")
+        for name in ["..", "../evil", "a/b"]:
+            tree = self.store.write("tree", encode_tree([(MODE_FILE, name, blob)]))
+            with self.assertRaises(ObjectStoreError):
+                self.cache().checkout(tree, self.dir / "job")
+        self.assertFalse((self.dir / "evil").exists())
+
+        # a repeated name could be a symlink and a directory
+        sub = self.store.write("tree", encode_tree([(MODE_FILE, "f", blob)]))
+        tree = self.store.write(
+            "tree", encode_tree([(MODE_FILE, "x", blob), (MODE_TREE, "x", sub)])
+        )
+        with self.assertRaises(ObjectStoreError):
+            self.cache().checkout(tree, self.dir / "job")
+
+    def test_index_survives_restart(self):
+        tree = self.upload({"a.txt": "a"})
+        self.cache().checkout(tree, self.dir / "job1")
+
+        cache = self.cache()
+        self.assertEqual(cache.roots(), [tree])
+        self.session.fetched.clear()
+        cache.checkout(tree, self.dir / "job2")
+        self.assertEqual(self.session.fetched, [])
+
+
+class TestPoolCheckout(unittest.TestCase):
+    def test_job_runs_in_checkout(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        workdirs = []
+
+        def checkout(tree, dest):
+            workdirs.append(dest)
+            make_tree(dest, {"BRA/run.rvt": "(Wait 1)", "BRA/data.txt": "data"})
+
+        cache = mock.Mock(root=Path(tmp.name))
+        cache.checkout.side_effect = checkout
+
+        read = []
+        execute_forms = executor._execute_forms
+
+        def record(text, observer):
+            # what a block resolving files against the working directory sees
+            workdir = Path(executor.working_directory.get())
+            read.append((workdir / "BRA/data.txt").read_text())
+            return execute_forms(text, observer)
+
+        patcher = mock.patch.object(executor, "_execute_forms", record)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        pool = WorkerPool(slots=1, tree_cache=cache)
+        # the body was queued before the procedure was changed on disk
+        message = {"body": "(Missing)", "path": "BRA/run.rvt", "tree": "abc"}
+        pool.submit("job1", edn.writes(message))
+        pool.shutdown()
+
+        result = pool.results["job1"]
+        self.assertTrue(result["passed"], result)
+        self.assertEqual([step["block"] for step in result["steps"]], ["Wait"])
+        self.assertEqual(read, ["data"])
+        self.assertEqual(cache.checkout.call_args.args[0], "abc")
+        # the checkout is removed once the job finishes
+        self.assertFalse(os.path.exists(workdirs[0]))
+
+    def test_job_path_stays_in_checkout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                worker.run_job(
+                    edn.writes({"body": "", "path": "../outside.rvt"}), Path(tmp)
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
+import json
 import unittest
 import sqlite3
 import os
+import tempfile
 from pathlib import Path
 
 from automationv3.editor.models import Treeview, FilesystemTreeNode 
@@ -52,3 +54,46 @@ class TestTreeview(unittest.TestCase):
         treeview.toggle(node)
         self.assertFalse(node in treeview.opened)
 
+    def test_children_paged(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            for i in range(5):
+                (tmp / f'tc_{i}.rvt').write_text('')
+            (tmp / 'ZZZ').mkdir()
+
+            treeview = Treeview.create(self.conn, tmp, FilesystemTreeNode)
+            root = treeview.root
+
+            # directories first, then files by name
+            self.assertEqual([n.name for n in root.children(0, 3)],
+                             ['ZZZ', 'tc_0.rvt', 'tc_1.rvt'])
+            self.assertEqual([n.name for n in root.children(3, 3)],
+                             ['tc_2.rvt', 'tc_3.rvt', 'tc_4.rvt'])
+            self.assertEqual(root.child_count(), 6)
+
+            # listing is cached until the directory changes
+            (tmp / 'tc_5.rvt').write_text('')
+            os.utime(tmp, ns=(0, os.stat(tmp).st_mtime_ns + 1))
+            self.assertEqual(root.child_count(), 7)
+
+    def test_toggle_persists(self):
+        treeview = Treeview.create(self.conn, self.root, FilesystemTreeNode)
+        treeview.toggle(Path('BRA'))
+
+        treeview = Treeview(self.conn, treeview.id, FilesystemTreeNode)
+        self.assertTrue(treeview.node('BRA') in treeview.opened)
+        self.assertTrue(treeview.is_opened(self.root / 'BRA'))
+        self.assertFalse(treeview.is_opened('FUE'))
+
+    def test_migrates_json_opened(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE treeviews(id INTEGER PRIMARY KEY, opened TEXT, '
+                     'root TEXT, workspace_id TEXT)')
+        opened = [str(self.root / 'BRA'), 'FUE', '/elsewhere/XYZ']
+        conn.execute('INSERT INTO treeviews(opened, root) VALUES (?, ?)',
+                     (json.dumps(opened), str(self.root)))
+
+        Treeview.ensure_db(conn)
+
+        treeview = Treeview(conn, 1, FilesystemTreeNode)
+        self.assertEqual(treeview.opened, {'BRA', 'FUE'})
@@ -0,0 +1,167 @@
+import os
+import queue
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from flask import Flask
+
+from automationv3.editor.treeviews import FilesystemTreeNode
+from automationv3.editor.views.workspace import workspace
+from automationv3.editor.watcher import Inotify, WorkspaceWatcher
+
+
+class WatcherTests:
+    use_inotify = None
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        (self.root / "BRA").mkdir()
+        (self.root / "BRA" / "tc1.rvt").write_text("(Wait 1)")
+        (self.root / ".git").mkdir()
+
+        self.watcher = WorkspaceWatcher(
+            self.root, poll_interval=0.05, use_inotify=self.use_inotify
+        )
+        self.watcher.start()
+        self.addCleanup(self.watcher.stop)
+        self.events = self.watcher.subscribe()
+
+    def wait_for(self, type, path):
+        while True:
+            event = self.events.get(timeout=5)
+            if event["type"] == type and event["path"] == path:
+                return event
+
+    def test_indexes_tree(self):
+        self.assertEqual(self.watcher.children(), [("BRA", True)])
+        self.assertEqual(self.watcher.children("BRA"), [("tc1.rvt", False)])
+        self.assertEqual(
+            self.watcher.mtime(self.root / "BRA" / "tc1.rvt"),
+            (self.root / "BRA" / "tc1.rvt").stat().st_mtime,
+        )
+
+    def test_created_and_deleted(self):
+        (self.root / "NEW").mkdir()
+        self.wait_for("created", "NEW")
+        (self.root / "NEW" / "tc2.rvt").write_text("")
+        self.wait_for("created", "NEW/tc2.rvt")
+        self.assertEqual(self.watcher.children("NEW"), [("tc2.rvt", False)])
+
+        (self.root / "BRA" / "tc1.rvt").unlink()
+        self.wait_for("deleted", "BRA/tc1.rvt")
+        self.assertEqual(self.watcher.children("BRA"), [])
+
+    def test_modified(self):
+        path = self.root / "BRA" / "tc1.rvt"
+        st = path.stat()
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        self.wait_for("modified", "BRA/tc1.rvt")
+        self.assertEqual(self.watcher.mtime(path), path.stat().st_mtime)
+
+    def test_tree_nodes_served_from_index(self):
+        root = FilesystemTreeNode(self.root, None)
+        root.watcher = self.watcher
+
+        (bra,) = root.children()
+        self.assertTrue(bra.is_dir())
+        self.assertEqual([n.name for n in bra.children()], ["tc1.rvt"])
+        self.assertTrue(bra.children()[0].is_file())
+
+
+class TestInotifyWatcher(WatcherTests, unittest.TestCase):
+    use_inotify = True
+
+    def setUp(self):
+        super().setUp()
+        if self.watcher.backend != "inotify":
+            self.skipTest("inotify not available")
+
+
+class TestUnwatchableDirectory(unittest.TestCase):
+    def test_polled_when_watch_fails(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        (root / "BRA").mkdir()
+
+        add_watch = Inotify.add_watch
+
+        def refuse_bra(inotify, path):
+            if Path(path).name == "BRA":
+                raise OSError(28, "No space left on device")
+            return add_watch(inotify, path)
+
+        with mock.patch.object(Inotify, "add_watch", refuse_bra):
+            watcher = WorkspaceWatcher(root, poll_interval=0.05)
+            if watcher.backend != "inotify":
+                self.skipTest("inotify not available")
+            with self.assertLogs("automationv3.editor.watcher", "WARNING"):
+                watcher.start()
+        self.addCleanup(watcher.stop)
+        events = watcher.subscribe()
+
+        self.assertEqual(watcher.unwatched, {"BRA"})
+        (root / "BRA" / "tc2.rvt").write_text("")
+        event = events.get(timeout=5)
+        self.assertEqual((event["type"], event["path"]), ("created", "BRA/tc2.rvt"))
+
+
+class TestPollingWatcher(WatcherTests, unittest.TestCase):
+    use_inotify = False
+
+    def test_unsubscribed_get_nothing(self):
+        self.watcher.unsubscribe(self.events)
+        (self.root / "NEW").mkdir()
+        with self.assertRaises(queue.Empty):
+            self.events.get(timeout=0.3)
+
+
+class TestEventStream(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.watcher = WorkspaceWatcher(self.root, use_inotify=False)
+
+        app = Flask(__name__)
+        app.register_blueprint(workspace, url_prefix="/workspace")
+        self.client = app.test_client()
+
+        views = sys.modules["automationv3.editor.views.workspace"]
+        ws = SimpleNamespace(id="master", root=self.root)
+        for name, value in [
+            ("get_workspaces", lambda id: ws),
+            ("get_watcher", lambda root: self.watcher),
+            ("event_streams", threading.BoundedSemaphore(1)),
+        ]:
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_streams_are_bounded(self):
+        response = self.client.get("/workspace/master/events")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(next(response.response), b"retry: 10000\n\n")
+        self.assertEqual(len(self.watcher.subscribers), 1)
+
+        refused = self.client.get("/workspace/master/events")
+        self.assertEqual(refused.status_code, 503)
+        self.assertIn("Retry-After", refused.headers)
+
+        response.close()
+        self.assertEqual(self.watcher.subscribers, [])
+        response = self.client.get("/workspace/master/events")
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import threading
+import unittest
+from unittest import mock
+
+from automationv3.framework import edn
+from automationv3.jobqueue import worker
+from automationv3.jobqueue.worker import WorkerPool, run_job
+
+
+def job_message(body):
+    return edn.writes({"body": body})
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+        def blocking_job(message):
+            self.started.release()
+            self.release.wait(5)
+            return {"passed": True, "steps": []}
+
+        patcher = mock.patch.object(worker, "run_job", blocking_job)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pool = WorkerPool(slots=2)
+        self.addCleanup(self.pool.shutdown)
+        self.addCleanup(self.release.set)
+
+    def test_runs_jobs_concurrently(self):
+        self.assertTrue(self.pool.submit("job1", "msg"))
+        self.assertTrue(self.pool.submit("job2", "msg"))
+
+        self.assertTrue(self.started.acquire(timeout=1))
+        self.assertTrue(self.started.acquire(timeout=1))
+        self.assertEqual(self.pool.running_jobs(), ["job1", "job2"])
+
+    def test_rejects_when_full(self):
+        self.pool.submit("job1", "msg")
+        self.pool.submit("job2", "msg")
+
+        self.assertEqual(self.pool.free_slots, 0)
+        self.assertEqual(self.pool.status, "busy")
+        self.assertFalse(self.pool.submit("job3", "msg"))
+
+    def test_slot_freed_when_job_finishes(self):
+        self.pool.submit("job1", "msg")
+        self.release.set()
+        self.pool.executor.shutdown(wait=True)
+
+        self.assertEqual(self.pool.free_slots, 2)
+        self.assertTrue(self.pool.results["job1"]["passed"])
+
+    def test_keepalive_reports_capacity(self):
+        self.pool.submit("job1", "msg")
+        data = self.pool.keepalive_data()
+
+        self.assertEqual(data["capacity"], 2)
+        self.assertEqual(data["free"], 1)
+        self.assertEqual(data["status"], "available")
+
+
+class TestRunJob(unittest.TestCase):
+    def test_runs_blocks(self):
+        result = run_job(job_message('"Comment"\n(Wait 1)\n(Wait 2)'))
+
+        self.assertTrue(result["passed"])
+        self.assertEqual([s["block"] for s in result["steps"]], ["Wait", "Wait"])
+
+    def test_unknown_block_fails(self):
+        result = run_job(job_message("(NotABlock 1)"))
+
+        self.assertFalse(result["passed"])
+        self.assertIn("NotABlock", result["steps"][0]["stderr"])
+
+
+class TestStatusHandler(unittest.TestCase):
+    def setUp(self):
+        worker.init_pool(slots=1)
+        self.addCleanup(worker.pool.shutdown)
+        worker.app.testing = True
+        self.client = worker.app.test_client()
+
+    def test_status(self):
+        worker.pool.submit("job1", job_message("(Wait 1)"))
+        worker.pool.executor.shutdown(wait=True)
+
+        response = self.client.get("/status")
+        self.assertEqual(response.json["capacity"], 1)
+        self.assertEqual(response.json["free"], 1)
+        self.assertEqual(response.json["running"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 
 import os
+import sys
 import unittest
+from unittest import mock
 import sqlite3
 from pathlib import Path
 from flask import Flask, url_for
@@ -45,6 +47,21 @@ class TestWorkspaceHandler(unittest.TestCase):
     
 
 
+    def test_workspace_filesystem_tree_pages(self):
+        views = sys.modules['automationv3.editor.views.workspace']
+        with mock.patch.object(views, 'TREE_PAGE_SIZE', 1):
+            response = self.client.get(url_for('workspace.tree', workspace_id='master'))
+            self.assertIn(b'BRA', response.data)
+            self.assertNotIn(b'FUE', response.data)
+            self.assertIn(b'offset=1', response.data)
+
+            response = self.client.get(url_for('workspace.tree_children',
+                                               workspace_id='master',
+                                               offset=1))
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(b'BRA', response.data)
+            self.assertIn(b'FUE', response.data)
+
     #################
     # Fixture Setup #
     #################
@@ -0,0 +1,70 @@
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from automationv3.editor.workspace import WorktreeRegistry, parse_worktrees
+
+from .data import make_workspaces as gitutil
+
+
+class TestParseWorktrees(unittest.TestCase):
+    def test_skips_detached_and_bare(self):
+        output = (
+            "worktree /repo\nbare\n\n"
+            "worktree /repo/main\nHEAD abc\nbranch refs/heads/main\n\n"
+            "worktree /repo/detached\nHEAD def\ndetached\n\n"
+            "worktree /repo/feature\nHEAD 123\nbranch refs/heads/feature/x\nlocked\n"
+        )
+        self.assertEqual(
+            parse_worktrees(output),
+            {
+                "main": Path("/repo/main/rvts"),
+                "feature/x": Path("/repo/feature/rvts"),
+            },
+        )
+
+
+class TestWorktreeRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.gitdir = Path(self.tmp.name) / "master"
+        (self.gitdir / "rvts").mkdir(parents=True)
+        (self.gitdir / "rvts" / "tc.rvt").write_text("(Wait 1)")
+        gitutil.create_repo(self.gitdir)
+
+        self.registry = WorktreeRegistry(self.gitdir)
+        patcher = mock.patch("subprocess.check_output", wraps=subprocess.check_output)
+        self.check_output = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def worktree_lists(self):
+        return [
+            call
+            for call in self.check_output.call_args_list
+            if call.args[0][:2] == ["git", "worktree"]
+        ]
+
+    def test_lists_once_while_unchanged(self):
+        for _ in range(3):
+            self.assertEqual(list(self.registry.worktrees()), ["master"])
+        self.assertEqual(len(self.worktree_lists()), 1)
+
+    def test_new_worktree_invalidates(self):
+        self.registry.worktrees()
+        gitutil.create_worktree(self.gitdir, self.gitdir.parent / "branch1")
+
+        self.assertEqual(sorted(self.registry.worktrees()), ["branch1", "master"])
+        self.assertEqual(len(self.worktree_lists()), 2)
+
+    def test_ttl_expiry(self):
+        self.registry.ttl = 0
+        self.registry.worktrees()
+        self.registry.worktrees()
+        self.assertEqual(len(self.worktree_lists()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()